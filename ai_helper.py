@@ -8,6 +8,7 @@ import threading
 import time
 import json
 import requests
+from cooperative import run_blocking
 from dotenv import load_dotenv
 import logging
 
@@ -45,7 +46,7 @@ def initialize_ai_client():
             
         print(f"Initializing local AI fallback: {LOCAL_MODEL_NAME}")
         # Initialize GPT4All with a safer thread count
-        ai_client = GPT4All(LOCAL_MODEL_NAME, n_threads=4)
+        ai_client = run_blocking(GPT4All, LOCAL_MODEL_NAME, n_threads=4)
         print(f"Local AI module '{LOCAL_MODEL_NAME}' ready.")
         ai_provider = "local_gpt4all"
         return True
@@ -154,7 +155,9 @@ def generate_content(prompt, max_tokens=500):
         with ai_lock:
             start_gen = time.time()
             with ai_client.chat_session():
-                response = ai_client.generate(
+                # Local inference never yields; run it on a native thread
+                response = run_blocking(
+                    ai_client.generate,
                     prompt, 
                     max_tokens=max_tokens, 
                     temp=0.1
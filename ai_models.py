@@ -7,15 +7,32 @@ import logging
 import re
 from typing import Optional, Dict, List, Tuple
 from ai_helper import generate_content
+from code_detector import ContentCache
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Memoized detect_language() results (the AI fallback is expensive)
+language_cache = ContentCache()
+
+# Language names the AI fallback may answer with (lowercase, as the editor lists them)
+KNOWN_LANGUAGES = frozenset([
+    'c', 'c#', 'c++', 'cpp', 'clojure', 'css', 'dart', 'elixir', 'go', 'haskell', 'html',
+    'java', 'javascript', 'julia', 'kotlin', 'lua', 'matlab', 'nim', 'perl', 'php',
+    'python', 'r', 'ruby', 'rust', 'scala', 'shell', 'bash', 'sql', 'swift',
+    'typescript', 'vbnet', 'vb.net', 'zig',
+])
+
 def detect_language(code: str) -> str:
     """Detect programming language from code using heuristics or local AI"""
     if not code or len(code.strip()) < 5:
         return "python"
     
+    # Failed or unrecognized AI answers (None) are not cached, so they are retried
+    lang = language_cache.get_or_compute(code, _detect_language_uncached, cache_if=lambda value: value is not None)
+    return lang or "python"
+
+def _detect_language_uncached(code: str) -> Optional[str]:
     code_lower = code.lower()
     
     # Heuristics for basic languages
@@ -31,10 +48,12 @@ def detect_language(code: str) -> str:
     prompt = f"Identify the programming language of this code. Return ONLY the language name (e.g., python, javascript, cpp, java).\n\nCode:\n{code[:500]}"
     result = generate_content(prompt, max_tokens=10)
     if result:
-        lang = result.strip().lower().split('\n')[0].replace('.', '')
-        return lang
+        # generate_content returns error messages as text; only accept a language name
+        lang = result.strip().lower().split('\n')[0].strip().rstrip('.')
+        if lang in KNOWN_LANGUAGES:
+            return lang
     
-    return "python"
+    return None
 
 def generate_code(prompt: str, language: str = "python") -> str:
     """Generate the SMALLEST and SIMPLEST code using local AI"""
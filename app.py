@@ -53,7 +53,12 @@ app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0
 db.init_app(app)
 
 # Initialize SocketIO with proper configuration
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
+# SOCKETIO_MESSAGE_QUEUE attaches a pub/sub backplane so several workers can serve the same rooms
+# server.py selects gevent/eventlet through SOCKETIO_ASYNC_MODE
+import backplane
+import cooperative
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode=cooperative.SOCKETIO_ASYNC_MODE,
+                    **backplane.socketio_options())
 if Migrate is not None:
     migrate = Migrate(app, db)
 else:
@@ -279,17 +284,22 @@ def make_session_permanent():
 
 if __name__ == '__main__':
     import sys
-    port = 5000
+    # Use Render's PORT environment variable if available, else fallback to 5000
+    port = int(os.environ.get("PORT", 5000))
     if '--port' in sys.argv:
         try:
             port_index = sys.argv.index('--port') + 1
             if port_index < len(sys.argv):
                 port = int(sys.argv[port_index])
         except (ValueError, IndexError):
-            print("Invalid port specified, using default port 5000")
-    
+            print(f"Invalid port specified, using default port {port}")
+
+    # Workers started by main.py --workers share one terminal: no clearing, no reloader
+    worker_mode = '--worker' in sys.argv
+
     # Clear console
-    os.system('cls' if os.name == 'nt' else 'clear')
+    if not worker_mode:
+        os.system('cls' if os.name == 'nt' else 'clear')
     
     # Get local IP
     def get_local_ip():
@@ -304,48 +314,20 @@ if __name__ == '__main__':
     
     local_ip = get_local_ip()
     
-    print("\n" + "="*60)
-    print("SMARTFIXER CODE REVIEWER STARTING...")
-    print("="*60)
-    print("Server Status: Starting...")
-    print(f"Main URL: http://localhost:{port}")
-    print(f"Alternative URL: http://127.0.0.1:{port}")
-    print(f"Local Network: http://{local_ip}:{port}")
-    print("="*60)
-    print("Click on any URL above to access your SmartFixer!")
-    print("Press Ctrl+C to stop the server")
-    print("="*60 + "\n")
-    
-    # Final fix for SocketIO run configuration
-    if _name_ == '_main_':
-        import os
-        import socket
-
-    # Use Render's PORT environment variable if available, else fallback to 5000
-        port = int(os.environ.get("PORT", 5000))
-
-    # Clear console (optional)
-        os.system('cls' if os.name == 'nt' else 'clear')
-
-    # Optional: print startup info
-        def get_local_ip():
-            try:
-                s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-                s.connect(("8.8.8.8", 80))
-                local_ip = s.getsockname()[0]
-                s.close()
-                return local_ip
-            except:
-                return "127.0.0.1"
-
-        local_ip = get_local_ip()
+    if worker_mode:
+        print(f"Worker {os.getpid()} listening on port {port} (queue: {backplane.SOCKETIO_MESSAGE_QUEUE or 'none'})")
+    else:
         print("\n" + "="*60)
         print("SMARTFIXER CODE REVIEWER STARTING...")
         print("="*60)
-        print(f"Server Status: Starting on port {port}")
+        print("Server Status: Starting...")
         print(f"Main URL: http://localhost:{port}")
+        print(f"Alternative URL: http://127.0.0.1:{port}")
         print(f"Local Network: http://{local_ip}:{port}")
+        print("="*60)
+        print("Click on any URL above to access your SmartFixer!")
+        print("Press Ctrl+C to stop the server")
         print("="*60 + "\n")
 
     # Run SocketIO server with Render-compatible host/port
-        socketio.run(app, host='0.0.0.0', port=port, debug=True, allow_unsafe_werkzeug=True)
+    socketio.run(app, host='0.0.0.0', port=port, debug=not worker_mode, allow_unsafe_werkzeug=True)
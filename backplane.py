@@ -0,0 +1,262 @@
+"""
+Backplane - Cross-process Socket.IO message queue and shared socket state
+Lets several worker processes serve the same users: emits to a room such
+as user_<id> are published on a pub/sub channel and delivered by whichever
+worker holds the socket, and the sid -> user map plus per-user connection
+counts live in a store every worker can see.
+
+SOCKETIO_MESSAGE_QUEUE selects the backend:
+  (unset)            single process, no queue
+  redis://host/0     Redis pub/sub (any URL Flask-SocketIO accepts works)
+  memory://<name>    in-process broker, for tests that run several
+                     SocketIO servers in one interpreter
+"""
+
+import os
+import pickle
+import queue
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import socketio as python_socketio
+
+# Message queue URL shared by all workers ('' = single process)
+SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE', '')
+
+# Pub/sub channel, and key prefix for shared state in Redis
+SOCKETIO_CHANNEL = os.environ.get('SOCKETIO_CHANNEL', 'smartfixer')
+
+# Where shared socket state is kept; defaults to the message queue URL
+SHARED_STATE_URL = os.environ.get('SHARED_STATE_URL', SOCKETIO_MESSAGE_QUEUE)
+
+MEMORY_SCHEME = 'memory://'
+REDIS_SCHEMES = ('redis://', 'rediss://')
+
+
+class MemoryBroker:
+    """In-process pub/sub: every subscriber of a channel gets every message."""
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel: str) -> 'queue.Queue':
+        inbox = queue.Queue()
+        with self._lock:
+            self._subscribers.setdefault(channel, []).append(inbox)
+        return inbox
+
+    def publish(self, channel: str, message: bytes):
+        with self._lock:
+            inboxes = list(self._subscribers.get(channel, ()))
+        for inbox in inboxes:
+            inbox.put(message)
+
+
+_memory_brokers = {}
+_memory_brokers_lock = threading.Lock()
+
+
+def get_memory_broker(url: str) -> MemoryBroker:
+    """Broker shared by every manager created with the same memory:// URL."""
+    with _memory_brokers_lock:
+        broker = _memory_brokers.get(url)
+        if broker is None:
+            broker = _memory_brokers[url] = MemoryBroker()
+        return broker
+
+
+class MemoryManager(python_socketio.PubSubManager):
+    """
+    Socket.IO client manager backed by MemoryBroker. Messages are pickled
+    like RedisManager does, so payloads that would not survive a real
+    queue fail the same way here.
+    """
+    name = 'memory'
+
+    def __init__(self, url: str = 'memory://default', channel: str = 'socketio',
+                 write_only: bool = False, logger=None):
+        self.broker = get_memory_broker(url)
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+
+    def initialize(self):
+        # Subscribe before the listener thread starts so nothing published
+        # in between is lost
+        self._inbox = self.broker.subscribe(self.channel)
+        super().initialize()
+
+    def _publish(self, data):
+        self.broker.publish(self.channel, pickle.dumps(data))
+
+    def _listen(self):
+        while True:
+            yield self._inbox.get()
+
+
+def socketio_options(url: Optional[str] = None, channel: Optional[str] = None) -> Dict[str, Any]:
+    """Keyword arguments for SocketIO(...) that attach the configured backplane."""
+    url = SOCKETIO_MESSAGE_QUEUE if url is None else url
+    channel = channel or SOCKETIO_CHANNEL
+    if not url:
+        return {}
+    if url.startswith(MEMORY_SCHEME):
+        return {'client_manager': MemoryManager(url, channel=channel)}
+    return {'message_queue': url, 'channel': channel}
+
+
+class MemoryStateStore:
+    """Shared-state hashes for workers in one process."""
+
+    def __init__(self):
+        self._hashes = {}
+        self._lock = threading.Lock()
+
+    def hset(self, name: str, key: str, value: str):
+        with self._lock:
+            self._hashes.setdefault(name, {})[key] = str(value)
+
+    def hget(self, name: str, key: str) -> Optional[str]:
+        with self._lock:
+            return self._hashes.get(name, {}).get(key)
+
+    def hpop(self, name: str, key: str) -> Optional[str]:
+        with self._lock:
+            return self._hashes.get(name, {}).pop(key, None)
+
+    def hdel(self, name: str, key: str):
+        self.hpop(name, key)
+
+    def hgetall(self, name: str) -> Dict[str, str]:
+        with self._lock:
+            return dict(self._hashes.get(name, {}))
+
+    def hmget(self, name: str, keys: List[str]) -> List[Optional[str]]:
+        with self._lock:
+            values = self._hashes.get(name, {})
+            return [values.get(key) for key in keys]
+
+    def hincrby(self, name: str, key: str, amount: int = 1) -> int:
+        with self._lock:
+            values = self._hashes.setdefault(name, {})
+            value = int(values.get(key, 0)) + amount
+            values[key] = str(value)
+            return value
+
+
+class RedisStateStore:
+    """Shared-state hashes in Redis, namespaced by SOCKETIO_CHANNEL."""
+
+    def __init__(self, url: str, prefix: str = SOCKETIO_CHANNEL):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError(
+                'Redis shared state requires the redis package (pip install redis)'
+            )
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+
+    def _key(self, name: str) -> str:
+        return f'{self.prefix}:{name}'
+
+    def hset(self, name: str, key: str, value: str):
+        self._redis.hset(self._key(name), key, str(value))
+
+    def hget(self, name: str, key: str) -> Optional[str]:
+        return self._redis.hget(self._key(name), key)
+
+    def hpop(self, name: str, key: str) -> Optional[str]:
+        pipe = self._redis.pipeline()
+        pipe.hget(self._key(name), key)
+        pipe.hdel(self._key(name), key)
+        value, _ = pipe.execute()
+        return value
+
+    def hdel(self, name: str, key: str):
+        self._redis.hdel(self._key(name), key)
+
+    def hgetall(self, name: str) -> Dict[str, str]:
+        return self._redis.hgetall(self._key(name))
+
+    def hmget(self, name: str, keys: List[str]) -> List[Optional[str]]:
+        return self._redis.hmget(self._key(name), keys) if keys else []
+
+    def hincrby(self, name: str, key: str, amount: int = 1) -> int:
+        return int(self._redis.hincrby(self._key(name), key, amount))
+
+
+_memory_stores = {}
+_state_store = None
+_state_store_lock = threading.Lock()
+
+
+def make_state_store(url: str = ''):
+    """State store for url: Redis for redis:// URLs, otherwise in-process
+    (memory:// URLs with the same name share one store)."""
+    if url.startswith(REDIS_SCHEMES):
+        return RedisStateStore(url)
+    with _state_store_lock:
+        store = _memory_stores.get(url)
+        if store is None:
+            store = _memory_stores[url] = MemoryStateStore()
+        return store
+
+
+def get_state_store():
+    """Process-wide store for SHARED_STATE_URL."""
+    global _state_store
+    if _state_store is None:
+        if SOCKETIO_MESSAGE_QUEUE and not SOCKETIO_MESSAGE_QUEUE.startswith(MEMORY_SCHEME) \
+                and not SHARED_STATE_URL.startswith(REDIS_SCHEMES):
+            print("Warning: SHARED_STATE_URL is not a redis:// URL; socket state is per-process")
+        _state_store = make_state_store(SHARED_STATE_URL)
+    return _state_store
+
+
+class SocketRegistry:
+    """
+    Which user owns each socket, and how many sockets each user has open,
+    across all workers. A user is online while their count is above zero,
+    so closing one tab no longer marks them offline.
+    """
+
+    SOCKETS = 'socket_users'
+    CONNECTIONS = 'user_connections'
+
+    def __init__(self, store=None):
+        self.store = store
+
+    def _store(self):
+        return self.store if self.store is not None else get_state_store()
+
+    def connect(self, sid: str, user_id: str) -> int:
+        """Register a socket; returns the user's open connection count."""
+        store = self._store()
+        store.hset(self.SOCKETS, sid, str(user_id))
+        return store.hincrby(self.CONNECTIONS, str(user_id), 1)
+
+    def disconnect(self, sid: str):
+        """Forget a socket; returns (user_id, remaining connections) or (None, 0)."""
+        store = self._store()
+        user_id = store.hpop(self.SOCKETS, sid)
+        if user_id is None:
+            return None, 0
+        # The zero entry is left in place: deleting it could race with a
+        # connect on another worker and drop that increment
+        remaining = store.hincrby(self.CONNECTIONS, user_id, -1)
+        return user_id, max(remaining, 0)
+
+    def user_for(self, sid: str) -> Optional[str]:
+        return self._store().hget(self.SOCKETS, sid)
+
+    def connection_count(self, user_id: str) -> int:
+        return int(self._store().hget(self.CONNECTIONS, str(user_id)) or 0)
+
+    def online_user_ids(self):
+        return {user_id for user_id, count in self._store().hgetall(self.CONNECTIONS).items() if int(count) > 0}
+
+    def online_among(self, user_ids: Iterable[str]) -> Set[str]:
+        """The online subset of user_ids, reading only their counts (one HMGET)."""
+        user_ids = list({str(user_id) for user_id in user_ids})
+        counts = self._store().hmget(self.CONNECTIONS, user_ids)
+        return {user_id for user_id, count in zip(user_ids, counts) if count is not None and int(count) > 0}
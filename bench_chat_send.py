@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Load test for the chat send path (one worker process).
+
+Sends messages between pairs of users through the Socket.IO 'send_message'
+handler and through POST /api/send-message, and reports messages per
+second, SQL statements per message and Socket.IO events delivered per
+message. By default it runs against a throwaway SQLite database; set
+DATABASE_URL to measure against a real server's database (users and
+messages are added, nothing is dropped).
+
+Usage: python bench_chat_send.py [messages] [pairs] [threads]
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+if 'DATABASE_URL' not in os.environ:
+    _db_fd, _db_path = tempfile.mkstemp(suffix='.db', prefix='bench_chat_')
+    os.close(_db_fd)
+    os.environ['DATABASE_URL'] = f'sqlite:///{_db_path}'
+os.environ.setdefault('UNREAD_RECONCILE_INTERVAL', '0')
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import app as app_module
+
+from sqlalchemy import event
+
+from database import db
+from models import User
+
+app = app_module.app
+socketio = app_module.socketio
+PASSWORD = 'bench-password'
+# Keeps this run's users apart from existing ones (and from earlier runs)
+RUN_ID = uuid.uuid4().hex[:8]
+
+
+def username(index):
+    return f'bench_{RUN_ID}_{index}'
+
+
+def make_users(count):
+    with app.app_context():
+        db.create_all()
+        ids = []
+        for i in range(count):
+            user = User(username=username(i), email=f'{username(i)}@example.com', first_name=f'Bench{i}')
+            user.set_password(PASSWORD)
+            db.session.add(user)
+            db.session.flush()
+            ids.append(user.id)
+        db.session.commit()
+        return ids
+
+
+def login(index):
+    client = app.test_client()
+    response = client.post('/api/login', json={'email': username(index), 'password': PASSWORD})
+    assert response.get_json().get('success'), response.get_json()
+    return client
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, *args):
+        with self._lock:
+            self.count += 1
+
+
+def run(label, pairs, messages, threads, send):
+    """send(pair_index, n) sends one message; returns (elapsed, msgs/sec)."""
+    per_thread = messages // threads
+    start_barrier = threading.Barrier(threads)
+
+    def worker(t):
+        start_barrier.wait()
+        for n in range(per_thread):
+            send((t + n) % len(pairs), n)
+
+    workers = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+    return per_thread * threads, elapsed
+
+
+def main():
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    pair_count = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    threads = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+
+    user_ids = make_users(pair_count * 2)
+    counter = QueryCounter()
+    pairs = []
+    for p in range(pair_count):
+        sender_http = login(2 * p)
+        receiver_http = login(2 * p + 1)
+        pairs.append({
+            'sender_id': user_ids[2 * p],
+            'receiver_id': user_ids[2 * p + 1],
+            'http': sender_http,
+            'sender_socket': socketio.test_client(app, flask_test_client=sender_http),
+            'receiver_socket': socketio.test_client(app, flask_test_client=receiver_http),
+        })
+    socket_locks = [threading.Lock() for _ in pairs]
+
+    def drain():
+        events = 0
+        for pair in pairs:
+            for client in (pair['sender_socket'], pair['receiver_socket']):
+                events += sum(1 for e in client.get_received() if e['name'] in ('receive_message', 'new_message'))
+        return events
+
+    def send_socket(i, n):
+        pair = pairs[i]
+        with socket_locks[i]:
+            pair['sender_socket'].emit('send_message', {
+                'receiver_id': pair['receiver_id'], 'content': f'socket message {n}', 'temp_id': f'temp_{n}'
+            })
+
+    def send_http(i, n):
+        pair = pairs[i]
+        response = pair['http'].post('/api/send-message', json={
+            'receiver_id': pair['receiver_id'], 'content': f'http message {n}'
+        })
+        assert response.status_code == 200, response.get_json()
+
+    print(f"{messages} messages, {pair_count} pairs, {threads} thread(s), {app.config['SQLALCHEMY_DATABASE_URI'].split(':')[0]}\n")
+    print(f"{'path':<8} {'msgs':>6} {'time':>8} {'msgs/s':>8} {'queries/msg':>12} {'events/msg':>11}")
+    print('-' * 58)
+    for label, send in (('socket', send_socket), ('http', send_http)):
+        drain()
+        counter.count = 0
+        sent, elapsed = run(label, pairs, messages, threads, send)
+        events = drain()
+        print(
+            f"{label:<8} {sent:>6} {elapsed:>7.2f}s {sent / elapsed:>8.0f} "
+            f"{counter.count / sent:>12.1f} {events / sent:>11.1f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
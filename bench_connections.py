@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Connection capacity benchmark: threading vs event-loop server modes.
+
+For each mode, starts server.py against a throwaway SQLite database, opens
+N concurrent Socket.IO long-poll connections (raw Engine.IO v4 polling, so
+no client library is needed), and while they are held reports how many
+were established, the server's OS thread count and RSS, and the latency
+of fresh handshakes on top of the load.
+
+Usage: python bench_connections.py [connections] [mode ...]
+       (modes default to threading plus whichever of gevent/eventlet is installed)
+"""
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+POLL_PATH = '/socket.io/?EIO=4&transport=polling'
+HOST = '127.0.0.1'
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind((HOST, 0))
+        return s.getsockname()[1]
+
+
+def proc_status(pid):
+    """(threads, rss_mb) from /proc; (None, None) where unavailable."""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line)
+        return int(fields['Threads']), int(fields['VmRSS'].split()[0]) / 1024
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+def handshake(port, timeout=10.0):
+    conn = http.client.HTTPConnection(HOST, port, timeout=timeout)
+    conn.request('GET', POLL_PATH)
+    body = conn.getresponse().read().decode()
+    return conn, json.loads(body[1:])['sid']
+
+
+class LongPollClient(threading.Thread):
+    """One Socket.IO client that connects, then keeps a long-poll GET open."""
+
+    def __init__(self, port, stop):
+        super().__init__(daemon=True)
+        self.port = port
+        self.stop = stop
+        self.established = threading.Event()
+        self.error = None
+
+    def run(self):
+        try:
+            conn, sid = handshake(self.port, timeout=60)
+            path = f'{POLL_PATH}&sid={sid}'
+            conn.request('POST', path, body='40', headers={'Content-Type': 'text/plain'})
+            conn.getresponse().read()
+            while not self.stop.is_set():
+                conn.request('GET', path)
+                packets = conn.getresponse().read().decode().split('\x1e')
+                if any(p.startswith('40') for p in packets):
+                    self.established.set()
+                if '2' in packets:
+                    conn.request('POST', path, body='3', headers={'Content-Type': 'text/plain'})
+                    conn.getresponse().read()
+        except Exception as e:
+            if not self.stop.is_set():
+                self.error = e
+
+
+def start_server(mode, port, db_path):
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{db_path}', UNREAD_RECONCILE_INTERVAL='0')
+    env.pop('SOCKETIO_MESSAGE_QUEUE', None)
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, 'server.py'), '--mode', mode, '--host', HOST, '--port', str(port)],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            handshake(port, timeout=1)[0].close()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError(f'{mode} server did not start')
+
+
+def measure(mode, connections):
+    port = free_port()
+    db_fd, db_path = tempfile.mkstemp(suffix='.db', prefix='bench_conn_')
+    os.close(db_fd)
+    server = start_server(mode, port, db_path)
+    idle_threads, idle_rss = proc_status(server.pid)
+    stop = threading.Event()
+    clients = [LongPollClient(port, stop) for _ in range(connections)]
+    try:
+        start = time.perf_counter()
+        for client in clients:
+            client.start()
+        deadline = time.time() + 60
+        for client in clients:
+            client.established.wait(max(0.0, deadline - time.time()))
+        connect_time = time.perf_counter() - start
+        established = sum(1 for c in clients if c.established.is_set())
+        errors = sum(1 for c in clients if c.error is not None)
+
+        threads, rss = proc_status(server.pid)
+        latencies = []
+        for _ in range(20):
+            t0 = time.perf_counter()
+            try:
+                handshake(port, timeout=10)[0].close()
+                latencies.append((time.perf_counter() - t0) * 1000)
+            except OSError:
+                pass
+        return {
+            'mode': mode,
+            'established': established,
+            'errors': errors,
+            'connect_time': connect_time,
+            'idle_threads': idle_threads,
+            'threads': threads,
+            'idle_rss': idle_rss,
+            'rss': rss,
+            'p50': statistics.median(latencies) if latencies else None,
+            'p95': sorted(latencies)[int(len(latencies) * 0.95) - 1] if latencies else None,
+        }
+    finally:
+        stop.set()
+        server.kill()
+        server.wait()
+        os.remove(db_path)
+
+
+def available_modes():
+    modes = ['threading']
+    for mode in ('gevent', 'eventlet'):
+        try:
+            __import__(mode)
+            modes.append(mode)
+        except ImportError:
+            pass
+    return modes
+
+
+def main():
+    connections = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    modes = sys.argv[2:] or available_modes()
+
+    print(f"{connections} concurrent long-poll connections per mode\n")
+    print(f"{'mode':<10} {'open':>6} {'err':>4} {'connect':>8} {'threads':>13} {'rss MB':>13} {'hs p50':>8} {'hs p95':>8}")
+    print('-' * 78)
+    for mode in modes:
+        r = measure(mode, connections)
+        fmt = lambda v, spec: format(v, spec) if v is not None else '-'
+        print(
+            f"{r['mode']:<10} {r['established']:>6} {r['errors']:>4} {r['connect_time']:>7.1f}s "
+            f"{fmt(r['idle_threads'], 'd'):>5} -> {fmt(r['threads'], 'd'):>5} "
+            f"{fmt(r['idle_rss'], '.0f'):>5} -> {fmt(r['rss'], '.0f'):>5} "
+            f"{fmt(r['p50'], '.1f'):>6}ms {fmt(r['p95'], '.1f'):>6}ms"
+        )
+
+
+if __name__ == '__main__':
+    main()
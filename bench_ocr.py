@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Benchmark the OCR pipeline on the bundled sample screenshots.
+
+Compares the old full-frame preprocessing with ocr_preprocess (full
+frame rescaled to the target glyph height below
+OCR_REDUCED_DECODE_MIN_PIXELS; reduced decoding and parallel OCR of the
+rescaled text regions above it) and reports the decoded size, region
+count, latency, peak Python-tracked memory and accuracy against the .txt
+ground truth stored next to each sample. With tesseract installed it exits non-zero if the
+new pipeline is less accurate than the old one on any sample (beyond
+ACCURACY_TOLERANCE); without it only the preprocessing stages are
+measured.
+
+Usage: python bench_ocr.py [samples_dir]
+"""
+import difflib
+import glob
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import cv2
+import numpy as np
+
+import ocr_preprocess
+
+SAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'samples', 'ocr')
+
+# Accuracy the new pipeline may lose against the legacy one on a sample before the run fails
+ACCURACY_TOLERANCE = 0.01
+
+
+def tesseract_available():
+    try:
+        import pytesseract
+        pytesseract.get_tesseract_version()
+        return True
+    except Exception:
+        return False
+
+
+def legacy_preprocess(image_bytes):
+    """The original /api/extract-code-from-image preprocessing."""
+    img = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    return cv2.threshold(cv2.medianBlur(gray, 3), 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+
+
+def legacy_pipeline(image_bytes, with_ocr):
+    binary = legacy_preprocess(image_bytes)
+    if not with_ocr:
+        return None, binary.shape, 1
+    import pytesseract
+    return pytesseract.image_to_string(binary), binary.shape, 1
+
+
+def new_pipeline(image_bytes, with_ocr):
+    plan = ocr_preprocess.plan_regions(image_bytes)
+    if plan is None:
+        binary = ocr_preprocess.prepare_full_frame(image_bytes)
+        if not with_ocr:
+            return None, binary.shape, 1
+        import pytesseract
+        return pytesseract.image_to_string(binary), binary.shape, 1
+    gray, regions, scale = plan
+    if not with_ocr:
+        # Still do the per-crop rescale/binarize work so timings are comparable
+        for region in regions:
+            ocr_preprocess.prepare_region(gray, region, scale)
+        return None, gray.shape, len(regions)
+    return ocr_preprocess.ocr_regions(gray, regions, scale), gray.shape, len(regions)
+
+
+def measure(fn, image_bytes, with_ocr):
+    tracemalloc.start()
+    start = time.perf_counter()
+    text, shape, regions = fn(image_bytes, with_ocr)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return text, shape, regions, elapsed, peak
+
+
+def accuracy(text, expected):
+    """
+    Similarity (0-1) of OCR text to the ground truth, ignoring blank lines
+    and indentation (tesseract never reproduces leading whitespace).
+    """
+    if text is None:
+        return None
+    norm = lambda s: '\n'.join(' '.join(line.split()) for line in s.strip().splitlines() if line.strip())
+    # autojunk would treat common characters (spaces, e, t ...) as junk on texts over 200 chars
+    return difflib.SequenceMatcher(None, norm(text), norm(expected), autojunk=False).ratio()
+
+
+def main():
+    samples_dir = sys.argv[1] if len(sys.argv) > 1 else SAMPLES_DIR
+    with_ocr = tesseract_available()
+    if not with_ocr:
+        print("tesseract not found - measuring preprocessing only (no accuracy)\n")
+
+    # Warm-up: keep one-time imports and allocator growth out of the first sample's numbers
+    for path in glob.glob(os.path.join(samples_dir, '*.png'))[:1]:
+        with open(path, 'rb') as f:
+            new_pipeline(f.read(), False)
+
+    paths = sorted(p for p in glob.glob(os.path.join(samples_dir, '*')) if not p.endswith('.txt'))
+    print(f"{'sample':<24} {'pipeline':<8} {'size':>11} {'regions':>7} {'time':>8} {'peak MB':>8} {'accuracy':>8}")
+    print('-' * 80)
+    regressions = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            image_bytes = f.read()
+        truth_path = os.path.splitext(path)[0] + '.txt'
+        expected = open(truth_path).read() if os.path.exists(truth_path) else ''
+
+        scores = {}
+        for label, fn in (('legacy', legacy_pipeline), ('new', new_pipeline)):
+            text, shape, regions, elapsed, peak = measure(fn, image_bytes, with_ocr)
+            acc = scores[label] = accuracy(text, expected)
+            print(
+                f"{os.path.basename(path):<24} {label:<8} {shape[1]:>5}x{shape[0]:<5} {regions:>7} "
+                f"{elapsed * 1000:>6.0f}ms {peak / 1e6:>8.1f} {('%.3f' % acc) if acc is not None else '-':>8}"
+            )
+        if expected and with_ocr and scores['new'] < scores['legacy'] - ACCURACY_TOLERANCE:
+            regressions.append(os.path.basename(path))
+
+    if regressions:
+        print(f"\n[FAIL] new pipeline is less accurate on: {', '.join(regressions)}")
+        return 1
+    if with_ocr:
+        print("\n[OK] new pipeline is at least as accurate as legacy on every sample")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,213 @@
+"""
+Chat Service - Single-transaction send path for direct messages
+Resolves the conversation for a user pair from an in-process cache
+(creating it with an upsert on first contact), inserts the message and
+updates the conversation's last message and unread counter in one commit,
+then emits one 'receive_message' event per room.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import case, func
+from sqlalchemy.exc import IntegrityError
+
+from database import db
+from models import Conversation, Message, User
+import unread_counters
+from presence_fanout import interests as presence_interests
+
+# User pairs whose conversation id is kept in memory
+CONVERSATION_CACHE_SIZE = int(os.environ.get('CONVERSATION_CACHE_SIZE', 10000))
+
+
+class RecipientNotFound(Exception):
+    """Raised when the receiver of a message does not exist."""
+
+
+class ConversationIdCache:
+    """Thread-safe LRU of sorted (user_id, user_id) pair -> conversation id."""
+
+    def __init__(self, maxsize: int = CONVERSATION_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key_for(user_a: str, user_b: str) -> Tuple[str, str]:
+        return tuple(sorted([str(user_a), str(user_b)]))
+
+    def get(self, key: Tuple[str, str]) -> Optional[int]:
+        with self._lock:
+            conv_id = self._data.get(key)
+            if conv_id is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return conv_id
+
+    def put(self, key: Tuple[str, str], conv_id: int):
+        with self._lock:
+            self._data[key] = conv_id
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard(self, key: Tuple[str, str]):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+            }
+
+
+conversation_ids = ConversationIdCache()
+
+
+def resolve_conversation_id(user_a: str, user_b: str) -> Tuple[int, bool]:
+    """
+    Conversation id for a user pair, creating the conversation inside the
+    current transaction if there is none yet (the caller commits).
+
+    Returns:
+        (conversation id, whether it was created). Newly created ids are not
+        cached here, since the transaction may still roll back; the caller
+        caches them after committing.
+
+    Raises:
+        RecipientNotFound if the conversation is new and a user is missing.
+    """
+    key = ConversationIdCache.key_for(user_a, user_b)
+    conv_id = conversation_ids.get(key)
+    if conv_id is not None:
+        return conv_id, False
+
+    u1, u2 = key
+    conv_id = db.session.query(Conversation.id).filter_by(user1_id=u1, user2_id=u2).scalar()
+    if conv_id is not None:
+        conversation_ids.put(key, conv_id)
+        return conv_id, False
+
+    # First contact: both users must exist (one query for the pair)
+    if db.session.query(func.count(User.id)).filter(User.id.in_(set(key))).scalar() < len(set(key)):
+        raise RecipientNotFound('Receiver not found')
+
+    try:
+        with db.session.begin_nested():
+            conversation = Conversation(user1_id=u1, user2_id=u2)
+            db.session.add(conversation)
+        return conversation.id, True
+    except IntegrityError:
+        # A concurrent sender created it first (uq_conversation_pair)
+        conv_id = db.session.query(Conversation.id).filter_by(user1_id=u1, user2_id=u2).scalar()
+        conversation_ids.put(key, conv_id)
+        return conv_id, False
+
+
+def _record_last_message(conv_id: int, message: Message):
+    """Denormalize message onto its conversation and bump the receiver's unread count."""
+    table = Conversation.__table__
+    receiver_id = str(message.receiver_id)
+    db.session.execute(
+        table.update().where(table.c.id == conv_id).values(
+            last_message_id=message.id,
+            last_message_preview=(message.content or '')[:200],
+            last_message_type=message.message_type or 'text',
+            last_message_at=message.created_at,
+            updated_at=message.created_at,
+            user1_unread=case([(table.c.user1_id == receiver_id, table.c.user1_unread + 1)], else_=table.c.user1_unread),
+            user2_unread=case([(table.c.user2_id == receiver_id, table.c.user2_unread + 1)], else_=table.c.user2_unread),
+        )
+    )
+
+
+def send_message(sender, receiver_id: str, content: str = '', message_type: str = 'text',
+                 code_snippet: Optional[str] = None, file_attachment: Optional[str] = None,
+                 file_type: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Persist a direct message from sender (a User) to receiver_id in a single
+    transaction. The per-user unread counter is bumped by the flush hook in
+    unread_counters; the conversation's by _record_last_message.
+
+    Returns:
+        The message payload sent to clients.
+
+    Raises:
+        RecipientNotFound if the receiver does not exist.
+    """
+    receiver_id = str(receiver_id)
+    try:
+        conv_id, created = resolve_conversation_id(sender.id, receiver_id)
+
+        message = Message(
+            conversation_id=conv_id,
+            sender_id=sender.id,
+            receiver_id=receiver_id,
+            content=content,
+            message_type=message_type or 'text',
+            code_snippet=code_snippet,
+            file_attachment=file_attachment,
+            file_type=file_type,
+            is_read=False,
+            created_at=datetime.now(),
+        )
+        db.session.add(message)
+        db.session.flush()
+        _record_last_message(conv_id, message)
+
+        # Build the payload before commit expires message and sender
+        created_at = message.created_at.isoformat()
+        message_data = {
+            'id': message.id,
+            'conversation_id': conv_id,
+            'sender_id': sender.id,
+            'receiver_id': receiver_id,
+            'content': content,
+            'message': content,
+            'message_type': message.message_type,
+            'code_snippet': code_snippet,
+            'file_attachment': file_attachment,
+            'file_type': file_type,
+            'timestamp': created_at,
+            'created_at': created_at,
+            'sender_name': sender.full_name,
+            'sender_image': sender.profile_image_url,
+        }
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    if created:
+        conversation_ids.put(ConversationIdCache.key_for(message_data['sender_id'], receiver_id), conv_id)
+        # The two users now appear in each other's chat list
+        presence_interests.invalidate(message_data['sender_id'], receiver_id)
+    return message_data
+
+
+def emit_message(socket_io, message_data: Dict[str, Any], temp_id: Optional[str] = None):
+    """
+    One 'receive_message' per room. The receiver's copy carries its new
+    unread total (replacing the separate unread_count_update/badge events);
+    the sender's copy echoes temp_id so the optimistic bubble can be matched.
+    """
+    receiver_id = message_data['receiver_id']
+    sender_id = message_data['sender_id']
+    unread = unread_counters.get_counts(receiver_id)['messages']
+    socket_io.emit('receive_message', dict(message_data, unread_count=unread), room=f'user_{receiver_id}')
+    if str(sender_id) != str(receiver_id):
+        socket_io.emit('receive_message', dict(message_data, temp_id=temp_id), room=f'user_{sender_id}')
@@ -4,7 +4,13 @@ Detects if text content is likely programming code based on syntax patterns.
 """
 
 import re
-from typing import Tuple, Dict
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Tuple, Dict, Any, Callable, Optional
+
+# Number of distinct texts whose detection results are kept in memory
+DETECTION_CACHE_SIZE = 1024
 
 # Common English words that shouldn't appear frequently in code except in strings/comments
 PROSE_KEYWORDS = [
@@ -197,6 +203,106 @@ def calculate_code_score(text: str) -> Tuple[float, Dict[str, float]]:
     return overall_score, scores
 
 
+class ContentCache:
+    """
+    Thread-safe LRU cache keyed by the SHA-256 of a text's content.
+
+    Keeps hit/miss counters so the hit rate can be reported in metrics.
+    """
+
+    def __init__(self, maxsize: int = DETECTION_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key_for(text: str) -> str:
+        return hashlib.sha256(text.encode('utf-8', errors='replace')).hexdigest()
+
+    def get_or_compute(self, text: str, compute: Callable[[str], Any],
+                       cache_if: Optional[Callable[[Any], bool]] = None) -> Any:
+        """
+        Return the cached value for text, computing it on a miss. A computed
+        value is only stored when cache_if (if given) accepts it.
+        """
+        key = self.key_for(text)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        # Compute outside the lock so slow detectors don't serialize requests
+        value = compute(text)
+        if cache_if is not None and not cache_if(value):
+            return value
+
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+            }
+
+
+# Memoized results of analyze_code(), shared by every endpoint that validates code
+_analysis_cache = ContentCache()
+
+
+def _analyze_uncached(text: str) -> Dict[str, Any]:
+    score, breakdown = calculate_code_score(text)
+    return {
+        'score': score,
+        'breakdown': breakdown,
+        'language': detect_primary_language(text),
+    }
+
+
+def analyze_code(text: str) -> Dict[str, Any]:
+    """
+    Score the text and detect its language in a single memoized call.
+
+    Returns:
+        Dict with 'score' (0.0 to 1.0), 'breakdown' (per-signal scores)
+        and 'language' (same value as detect_primary_language).
+    """
+    if not text or not text.strip():
+        return {'score': 0.0, 'breakdown': {}, 'language': 'text'}
+
+    result = _analysis_cache.get_or_compute(text, _analyze_uncached)
+    # Copy the breakdown so callers can't mutate the cached entry
+    return {
+        'score': result['score'],
+        'breakdown': dict(result['breakdown']),
+        'language': result['language'],
+    }
+
+
+def get_cache_stats() -> Dict[str, Any]:
+    """Hit/miss statistics for the detection cache."""
+    return _analysis_cache.stats()
+
+
 def is_code(text: str, threshold: float = 0.6) -> Tuple[bool, float]:
     """
     Determine if the text content is programming code.
@@ -208,7 +314,7 @@ def is_code(text: str, threshold: float = 0.6) -> Tuple[bool, float]:
     Returns:
         Tuple of (is_code, confidence_score)
     """
-    score, _ = calculate_code_score(text)
+    score = analyze_code(text)['score']
     return score >= threshold, score
 
 
@@ -265,12 +371,12 @@ def extract_code_from_text(text: str, min_threshold: float = 0.6) -> Tuple[str,
     
     text = text.strip()
     
-    # Calculate code score
-    score, _ = calculate_code_score(text)
+    # Score and language come from one (cached) analysis pass
+    analysis = analyze_code(text)
+    score = analysis['score']
     
     if score >= min_threshold:
-        language = detect_primary_language(text)
-        return text, language, score
+        return text, analysis['language'], score
     else:
         return '', 'text', score
 
@@ -0,0 +1,120 @@
+"""
+Comment Threads - Threaded comments with paginated, lazily expanded replies
+A comment either belongs directly to a post (parent_id NULL, depth 0) or
+replies to another comment. Each row carries its depth and a
+denormalized count of direct replies, so a page of comments can show
+"View N replies" without counting. Top-level comments and the
+replies of one comment are both keyset-paginated on (created_at, id),
+oldest first, with authors loaded in a single query per page.
+"""
+
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, or_
+
+from database import db
+from models import Comment, User
+
+# Comments per page by default / at most
+COMMENT_PAGE_SIZE = int(os.environ.get('COMMENT_PAGE_SIZE', 20))
+COMMENT_MAX_PAGE_SIZE = 100
+
+# Deepest reply level; replies to a comment at this depth join its parent's replies
+COMMENT_MAX_DEPTH = int(os.environ.get('COMMENT_MAX_DEPTH', 4))
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def add_comment(post_id: int, user_id: str, content: str, parent: Optional[Comment] = None) -> Comment:
+    """
+    Add a comment (or a reply to parent) to the session and flush it; the
+    caller commits. Replies deeper than COMMENT_MAX_DEPTH are attached to
+    the parent's own parent instead.
+    """
+    while parent is not None and parent.depth >= COMMENT_MAX_DEPTH:
+        parent = parent.parent
+
+    comment = Comment(post_id=post_id, user_id=user_id, content=content)
+    if parent is not None:
+        comment.parent_id = parent.id
+        comment.depth = parent.depth + 1
+    db.session.add(comment)
+    db.session.flush()
+
+    if parent is not None:
+        comments = Comment.__table__
+        db.session.execute(
+            comments.update().where(comments.c.id == parent.id)
+            .values(reply_count=comments.c.reply_count + 1)
+        )
+    return comment
+
+
+def encode_cursor(comment: Comment) -> str:
+    return f"{comment.created_at.isoformat()}|{comment.id}"
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    parts = cursor.split('|')
+    if len(parts) != 2:
+        raise InvalidCursor(cursor)
+    try:
+        return datetime.fromisoformat(parts[0]), int(parts[1])
+    except ValueError:
+        raise InvalidCursor(cursor)
+
+
+def page(post_id: Optional[int] = None, parent_id: Optional[int] = None, cursor: Optional[str] = None,
+         limit: int = COMMENT_PAGE_SIZE) -> Tuple[List[Comment], Optional[str]]:
+    """
+    One page of a post's top-level comments (post_id) or of a comment's
+    direct replies (parent_id), oldest first.
+
+    Returns:
+        (comments, next_cursor); next_cursor is None on the last page.
+    """
+    limit = max(1, min(limit, COMMENT_MAX_PAGE_SIZE))
+    if parent_id is not None:
+        query = Comment.query.filter(Comment.parent_id == parent_id)
+    else:
+        query = Comment.query.filter(Comment.post_id == post_id, Comment.parent_id.is_(None))
+    if cursor:
+        created_at, comment_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            Comment.created_at > created_at,
+            and_(Comment.created_at == created_at, Comment.id > comment_id)
+        ))
+    comments = query.order_by(Comment.created_at, Comment.id).limit(limit + 1).all()
+    if len(comments) <= limit:
+        return comments, None
+    comments = comments[:limit]
+    return comments, encode_cursor(comments[-1])
+
+
+def serialize_comments(comments: List[Comment]) -> List[Dict[str, Any]]:
+    """JSON for comments, in order, with their authors loaded in one query."""
+    if not comments:
+        return []
+    authors = {
+        user.id: user for user in
+        User.query.filter(User.id.in_({comment.user_id for comment in comments})).all()
+    }
+    result = []
+    for comment in comments:
+        author = authors.get(comment.user_id)
+        result.append({
+            'id': comment.id,
+            'user_id': comment.user_id,
+            'author_name': author.full_name if author else 'User',
+            'user_image': author.profile_image_url if author else None,
+            'content': comment.content,
+            'created_at': comment.created_at.isoformat(),
+            'parent_id': comment.parent_id,
+            'depth': comment.depth,
+            'reply_count': comment.reply_count or 0,
+        })
+    return result
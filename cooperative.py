@@ -0,0 +1,82 @@
+"""
+Cooperative - Event-loop (gevent / eventlet) server support
+server.py monkey-patches the standard library before the app is imported,
+which makes sockets, subprocess pipes, time.sleep, locks and threads
+cooperative, so outbound HTTP (ai_helper), CodeRunner's pipe readers and
+PostgreSQL queries yield to the event loop by themselves. What is left is
+CPU-bound or C-extension work that never yields; run_blocking moves it to
+a pool of real OS threads so one slow call does not stall every connection.
+"""
+
+import os
+
+# Socket.IO async mode; server.py sets this before importing app
+SOCKETIO_ASYNC_MODE = os.environ.get('SOCKETIO_ASYNC_MODE', 'threading')
+
+# OS threads available to run_blocking in gevent/eventlet mode
+BLOCKING_POOL_SIZE = int(os.environ.get('BLOCKING_POOL_SIZE', 10))
+
+EVENT_LOOP_MODES = ('gevent', 'eventlet')
+
+
+def default_mode() -> str:
+    """Best available mode: gevent, then eventlet, then threading."""
+    for mode in EVENT_LOOP_MODES:
+        try:
+            __import__(mode)
+            return mode
+        except ImportError:
+            continue
+    return 'threading'
+
+
+def monkey_patch(mode: str):
+    """
+    Patch the standard library for mode. Must run before anything else is
+    imported; safe to call again (e.g. under a gunicorn worker that already
+    patched).
+    """
+    global SOCKETIO_ASYNC_MODE
+    SOCKETIO_ASYNC_MODE = mode
+    os.environ['SOCKETIO_ASYNC_MODE'] = mode
+
+    if mode == 'gevent':
+        from gevent import monkey
+        if not monkey.is_module_patched('socket'):
+            monkey.patch_all()
+        import gevent
+        gevent.get_hub().threadpool.maxsize = BLOCKING_POOL_SIZE
+        try:
+            # psycopg2 waits on its socket in C; psycogreen hands the wait to gevent
+            from psycogreen.gevent import patch_psycopg
+            patch_psycopg()
+        except ImportError:
+            if (os.environ.get('DATABASE_URL') or '').startswith('postgres'):
+                print("Warning: psycogreen not installed; PostgreSQL queries will block the event loop")
+    elif mode == 'eventlet':
+        os.environ.setdefault('EVENTLET_THREADPOOL_SIZE', str(BLOCKING_POOL_SIZE))
+        import eventlet
+        if not eventlet.patcher.is_monkey_patched('socket'):
+            # Also greens psycopg2 through its wait callback
+            eventlet.monkey_patch()
+    elif mode != 'threading':
+        raise ValueError(f"Unknown async mode '{mode}'")
+
+
+def is_event_loop() -> bool:
+    return SOCKETIO_ASYNC_MODE in EVENT_LOOP_MODES
+
+
+def run_blocking(fn, *args, **kwargs):
+    """
+    Call fn(*args, **kwargs) and return its result. Under gevent/eventlet
+    the call runs on a native thread while the calling greenlet waits; in
+    threading mode it is a plain call.
+    """
+    if SOCKETIO_ASYNC_MODE == 'gevent':
+        import gevent
+        return gevent.get_hub().threadpool.apply(fn, args, kwargs)
+    if SOCKETIO_ASYNC_MODE == 'eventlet':
+        from eventlet import tpool
+        return tpool.execute(fn, *args, **kwargs)
+    return fn(*args, **kwargs)
@@ -0,0 +1,160 @@
+"""
+Extraction Cache - On-disk cache of OCR/PDF extraction results
+Entries are keyed by the SHA-256 of the uploaded bytes plus the pipeline
+version, stored as JSON files, and evicted least-recently-used once the
+cache grows past its size limit. The cache's size is tracked as entries
+are written; the directory is only scanned on first use and when an
+eviction is due.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Optional
+
+EXTRACTION_CACHE_DIR = os.environ.get(
+    'EXTRACTION_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'extraction'),
+)
+EXTRACTION_CACHE_MAX_BYTES = int(os.environ.get('EXTRACTION_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+# Eviction trims the cache to this fraction of max_bytes so the next few puts don't evict again
+EXTRACTION_CACHE_LOW_WATER = 0.9
+# Temp files older than this (seconds) are leftovers of crashed writers and are removed during eviction
+EXTRACTION_CACHE_STALE_TMP_SECONDS = 3600
+
+
+def upload_digest(data: bytes) -> str:
+    """SHA-256 hex digest of an uploaded file's bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+
+class ExtractionCache:
+    """
+    Digest-keyed JSON cache on local disk.
+
+    File mtimes double as the LRU clock: a hit touches the entry, and
+    eviction removes the oldest entries first.
+    """
+
+    def __init__(self, directory: str = EXTRACTION_CACHE_DIR,
+                 max_bytes: int = EXTRACTION_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Bytes of entries on disk; None until the first scan
+        self._size = None
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(pipeline_version: str, digest: str) -> str:
+        """Combine the pipeline version and upload digest into a cache key."""
+        return hashlib.sha256(f"{pipeline_version}:{digest}".encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, pipeline_version: str, digest: str) -> Optional[Dict[str, Any]]:
+        path = self._path(self.make_key(pipeline_version, digest))
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                value = json.load(f)
+            os.utime(path, None)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def put(self, pipeline_version: str, digest: str, value: Dict[str, Any]):
+        path = self._path(self.make_key(pipeline_version, digest))
+        tmp_path = None
+        try:
+            # Write to a temp file and rename so readers never see partial JSON
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(value, f)
+            size = os.path.getsize(tmp_path)
+            try:
+                replaced = os.path.getsize(path)
+            except OSError:
+                replaced = 0
+            os.replace(tmp_path, path)
+            tmp_path = None
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Error writing extraction cache entry: {e}")
+            return
+        finally:
+            if tmp_path is not None:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+        with self._lock:
+            if self._size is not None:
+                self._size += size - replaced
+            due = self._size is None or self._size > self.max_bytes
+        if due:
+            self._evict()
+
+    def _evict(self):
+        """
+        Rescan the directory, resyncing the tracked size (other processes may
+        share it), and if the cache is over max_bytes delete least-recently-
+        used entries until it fits EXTRACTION_CACHE_LOW_WATER of it.
+        """
+        with self._lock:
+            entries = []
+            total = 0
+            stale_before = time.time() - EXTRACTION_CACHE_STALE_TMP_SECONDS
+            for entry in os.scandir(self.directory):
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                if entry.name.endswith('.tmp'):
+                    if st.st_mtime < stale_before:
+                        try:
+                            os.remove(entry.path)
+                        except OSError:
+                            pass
+                    continue
+                if not entry.name.endswith('.json'):
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+
+            if total > self.max_bytes:
+                target = self.max_bytes * EXTRACTION_CACHE_LOW_WATER
+                entries.sort()
+                for _, size, path in entries:
+                    if total <= target:
+                        break
+                    try:
+                        os.remove(path)
+                        total -= size
+                        self.evictions += 1
+                    except OSError:
+                        pass
+            self._size = total
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'directory': self.directory,
+                'max_bytes': self.max_bytes,
+                'size_bytes': self._size,
+                'evictions': self.evictions,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+            }
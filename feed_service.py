@@ -0,0 +1,214 @@
+"""
+Feed Service - Cursor-paginated explore feed
+The explore feed is posts from followed users (and the viewer's own),
+newest first, followed by suggested posts from everyone else. Pages are
+keyset-paginated on (created_at, id) and hydrated by post_serializer with
+a fixed number of queries. The ordered post ids of each page are cached
+per viewer until one of the authors they follow posts, their follows
+change, or the TTL expires.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from sqlalchemy import and_, or_
+
+from database import db
+from models import Follower, Post
+import post_serializer
+
+# Posts per explore page by default / at most
+FEED_PAGE_SIZE = int(os.environ.get('FEED_PAGE_SIZE', 20))
+FEED_MAX_PAGE_SIZE = 50
+
+# Seconds a viewer's cached pages are reused (bounds staleness of suggested posts)
+FEED_CACHE_TTL = float(os.environ.get('FEED_CACHE_TTL', 60))
+
+# Viewers whose feed pages are kept in memory
+FEED_CACHE_SIZE = int(os.environ.get('FEED_CACHE_SIZE', 5000))
+
+FOLLOWING = 'following'
+SUGGESTED = 'suggested'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(section: str, post: Optional[Tuple[datetime, int]] = None) -> str:
+    """Opaque-ish cursor: '<section>' or '<section>|<created_at iso>|<id>'."""
+    if post is None:
+        return section
+    created_at, post_id = post
+    return f"{section}|{created_at.isoformat()}|{post_id}"
+
+
+def decode_cursor(cursor: Optional[str]) -> Tuple[str, Optional[Tuple[datetime, int]]]:
+    if not cursor:
+        return FOLLOWING, None
+    parts = cursor.split('|')
+    if parts[0] not in (FOLLOWING, SUGGESTED) or len(parts) not in (1, 3):
+        raise InvalidCursor(cursor)
+    if len(parts) == 1:
+        return parts[0], None
+    try:
+        return parts[0], (datetime.fromisoformat(parts[1]), int(parts[2]))
+    except ValueError:
+        raise InvalidCursor(cursor)
+
+
+def load_following(user_id: str) -> FrozenSet[str]:
+    """Authors whose posts go in the viewer's following section (including the viewer)."""
+    rows = db.session.query(Follower.user_id).filter(Follower.follower_id == user_id).all()
+    return frozenset([str(user_id)] + [str(row[0]) for row in rows])
+
+
+def _keyset_page(section: str, following: FrozenSet[str], after, limit: int) -> List[Tuple[int, datetime]]:
+    """Up to limit (id, created_at) rows of a section, older than after."""
+    query = db.session.query(Post.id, Post.created_at)
+    if section == FOLLOWING:
+        query = query.filter(Post.user_id.in_(following))
+    else:
+        query = query.filter(~Post.user_id.in_(following))
+    if after is not None:
+        created_at, post_id = after
+        query = query.filter(or_(
+            Post.created_at < created_at,
+            and_(Post.created_at == created_at, Post.id < post_id)
+        ))
+    return query.order_by(Post.created_at.desc(), Post.id.desc()).limit(limit).all()
+
+
+def build_page(following: FrozenSet[str], cursor: Optional[str], limit: int) -> Dict[str, Any]:
+    """
+    Post ids for one page. A page that exhausts the following section is
+    topped up from the start of the suggested section.
+
+    Returns:
+        Dict with 'following' and 'suggested' id lists, 'next_cursor' and 'has_more'.
+    """
+    section, after = decode_cursor(cursor)
+    page = {FOLLOWING: [], SUGGESTED: [], 'next_cursor': None, 'has_more': False}
+    remaining = limit
+
+    if section == FOLLOWING:
+        rows = _keyset_page(FOLLOWING, following, after, limit + 1)
+        if len(rows) > limit:
+            rows = rows[:limit]
+            page[FOLLOWING] = [row[0] for row in rows]
+            page['next_cursor'] = encode_cursor(FOLLOWING, (rows[-1][1], rows[-1][0]))
+            page['has_more'] = True
+            return page
+        page[FOLLOWING] = [row[0] for row in rows]
+        remaining -= len(rows)
+        section, after = SUGGESTED, None
+
+    # With remaining == 0 this only checks whether suggested posts exist
+    rows = _keyset_page(SUGGESTED, following, after, remaining + 1)
+    page['has_more'] = len(rows) > remaining
+    rows = rows[:remaining]
+    page[SUGGESTED] = [row[0] for row in rows]
+    if page['has_more']:
+        page['next_cursor'] = encode_cursor(SUGGESTED, (rows[-1][1], rows[-1][0]) if rows else after)
+    return page
+
+
+class FeedCache:
+    """Thread-safe LRU of viewer -> (following set, cached pages) with a TTL."""
+
+    def __init__(self, maxsize: int = FEED_CACHE_SIZE, ttl: float = FEED_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # viewer id -> {'expires', 'following', 'pages': {(cursor, limit): page}}
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _entry(self, user_id: str) -> Dict[str, Any]:
+        """Live entry for user_id, loading the following set on a miss (caller holds no lock)."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(user_id)
+            if entry is not None and entry['expires'] > now:
+                self._data.move_to_end(user_id)
+                return entry
+
+        entry = {'expires': now + self.ttl, 'following': load_following(user_id), 'pages': {}}
+        with self._lock:
+            self._data[user_id] = entry
+            self._data.move_to_end(user_id)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return entry
+
+    def page(self, user_id: str, cursor: Optional[str], limit: int) -> Tuple[FrozenSet[str], Dict[str, Any]]:
+        """(following set, page ids) for a viewer, building the page on a miss."""
+        user_id = str(user_id)
+        entry = self._entry(user_id)
+        key = (cursor or '', limit)
+        with self._lock:
+            page = entry['pages'].get(key)
+            if page is not None:
+                self.hits += 1
+                return entry['following'], page
+            self.misses += 1
+
+        page = build_page(entry['following'], cursor, limit)
+        with self._lock:
+            entry['pages'][key] = page
+        return entry['following'], page
+
+    def invalidate_user(self, *user_ids: str):
+        """Drop viewers' feeds, e.g. after their follows change."""
+        with self._lock:
+            for user_id in user_ids:
+                if self._data.pop(str(user_id), None) is not None:
+                    self.invalidations += 1
+
+    def invalidate_author(self, author_id: str):
+        """Drop the feed of every cached viewer who follows author_id (and the author's own)."""
+        author_id = str(author_id)
+        with self._lock:
+            stale = [user_id for user_id, entry in self._data.items() if author_id in entry['following']]
+            for user_id in stale:
+                del self._data[user_id]
+            self.invalidations += len(stale)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+                'invalidations': self.invalidations,
+            }
+
+
+feed_cache = FeedCache()
+
+
+def get_explore_page(viewer_id: str, cursor: Optional[str] = None, limit: int = FEED_PAGE_SIZE,
+                     pending: Optional[post_serializer.PendingLikes] = None) -> Dict[str, Any]:
+    """One explore page: {'following_posts', 'suggested_posts', 'next_cursor', 'has_more'}."""
+    limit = max(1, min(limit, FEED_MAX_PAGE_SIZE))
+    following, page = feed_cache.page(viewer_id, cursor, limit)
+    posts = post_serializer.serialize_posts(
+        post_serializer.load_posts(page[FOLLOWING] + page[SUGGESTED]), viewer_id, following, pending
+    )
+    split = len([post for post in posts if post['is_friend_post']])
+    return {
+        'following_posts': posts[:split],
+        'suggested_posts': posts[split:],
+        'next_cursor': page['next_cursor'],
+        'has_more': page['has_more'],
+    }
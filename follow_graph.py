@@ -0,0 +1,184 @@
+"""
+Follow Graph - In-memory index of follow relationships
+Answers "does A follow B", "which of these users does A follow" and "has A
+asked to follow B" from per-user sets held in memory instead of a query per
+check. Each set is a frozenset of user ids, so membership is O(1). A
+user's following and pending-request sets are loaded together with one
+query the first time they are needed, their followers set separately (it
+can be large and is needed less often); users are evicted
+least-recently-used, dropped whenever a follow request is sent, accepted or
+rejected, and expire after a TTL to bound staleness from writes made by
+other processes. A load that overlaps an invalidation of the same user is
+answered from but not stored, so it cannot put back pre-write sets.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Iterable, Set
+
+from sqlalchemy import literal, union_all
+
+from database import db
+from models import Follower, FollowRequest
+
+# Users whose relationship sets are kept in memory
+FOLLOW_GRAPH_CACHE_SIZE = int(os.environ.get('FOLLOW_GRAPH_CACHE_SIZE', 20000))
+
+# Seconds a user's sets are reused before they are reloaded
+FOLLOW_GRAPH_TTL = float(os.environ.get('FOLLOW_GRAPH_TTL', 600))
+
+FOLLOWING = 'following'
+FOLLOWERS = 'followers'
+REQUESTED = 'requested'
+
+
+class FollowGraph:
+    """Thread-safe LRU of user id -> {following, requested, followers} sets with a TTL."""
+
+    def __init__(self, maxsize: int = FOLLOW_GRAPH_CACHE_SIZE, ttl: float = FOLLOW_GRAPH_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # user id -> {'expires', FOLLOWING, REQUESTED, FOLLOWERS (once loaded)}
+        self._data = OrderedDict()
+        # Bumped by every invalidate(); loads compare it before storing
+        self._generation = 0
+        # user id -> loads in progress, and the generation of the user's last
+        # invalidation while any were (both only hold users being loaded)
+        self._loading = {}
+        self._invalidated = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.stale_loads = 0
+
+    def _load_outgoing(self, user_id: str) -> Dict[str, Set[str]]:
+        """Users user_id follows and has pending requests to (one query)."""
+        followers = Follower.__table__
+        requests = FollowRequest.__table__
+        query = union_all(
+            db.select([literal(FOLLOWING), followers.c.user_id]).where(followers.c.follower_id == user_id),
+            db.select([literal(REQUESTED), requests.c.to_user_id]).where(
+                (requests.c.from_user_id == user_id) & (requests.c.status == 'pending')
+            ),
+        )
+        sets = {FOLLOWING: set(), REQUESTED: set()}
+        for kind, other_id in db.session.execute(query):
+            sets[kind].add(str(other_id))
+        return sets
+
+    def _entry(self, user_id: str, kind: str) -> FrozenSet[str]:
+        """A user's set of the given kind, loading it on a miss (caller holds no lock)."""
+        user_id = str(user_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(user_id)
+            if entry is not None and entry['expires'] <= now:
+                entry = None
+            if entry is not None and kind in entry:
+                self._data.move_to_end(user_id)
+                self.hits += 1
+                return entry[kind]
+            self.misses += 1
+            generation = self._generation
+            self._loading[user_id] = self._loading.get(user_id, 0) + 1
+
+        try:
+            if kind == FOLLOWERS:
+                rows = db.session.query(Follower.follower_id).filter(Follower.user_id == user_id).all()
+                loaded = {FOLLOWERS: frozenset(str(row[0]) for row in rows)}
+            else:
+                loaded = {loaded_kind: frozenset(ids) for loaded_kind, ids in self._load_outgoing(user_id).items()}
+        except Exception:
+            with self._lock:
+                self._finish_load(user_id, generation)
+            raise
+
+        with self._lock:
+            if self._finish_load(user_id, generation):
+                # Invalidated while loading: the sets may predate that write
+                self.stale_loads += 1
+                return loaded[kind]
+            current = self._data.get(user_id)
+            if current is None or current['expires'] <= now or entry is None:
+                current = self._data[user_id] = {'expires': now + self.ttl}
+            current.update(loaded)
+            self._data.move_to_end(user_id)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            return current[kind]
+
+    def _finish_load(self, user_id: str, generation: int) -> bool:
+        """End a load started at generation; whether the user was invalidated since (caller holds the lock)."""
+        stale = self._invalidated.get(user_id, -1) > generation
+        self._loading[user_id] -= 1
+        if not self._loading[user_id]:
+            del self._loading[user_id]
+            self._invalidated.pop(user_id, None)
+        return stale
+
+    def follows(self, user_id: str, other_id: str) -> bool:
+        """Whether user_id follows other_id."""
+        return str(other_id) in self._entry(user_id, FOLLOWING)
+
+    def requested(self, user_id: str, other_id: str) -> bool:
+        """Whether user_id has a pending follow request to other_id."""
+        return str(other_id) in self._entry(user_id, REQUESTED)
+
+    def following_among(self, user_id: str, user_ids: Iterable[str]) -> Set[str]:
+        """The subset of user_ids that user_id follows."""
+        following = self._entry(user_id, FOLLOWING)
+        return {str(other_id) for other_id in user_ids if str(other_id) in following}
+
+    def statuses(self, user_id: str, user_ids: Iterable[str]) -> Dict[str, str]:
+        """user_id's relationship to each of user_ids: 'following', 'pending' or 'none'."""
+        user_ids = [str(other_id) for other_id in user_ids]
+        following = self._entry(user_id, FOLLOWING)
+        requested = self._entry(user_id, REQUESTED)
+        result = {}
+        for other_id in user_ids:
+            if other_id in following:
+                result[other_id] = 'following'
+            elif other_id in requested:
+                result[other_id] = 'pending'
+            else:
+                result[other_id] = 'none'
+        return result
+
+    def following(self, user_id: str) -> FrozenSet[str]:
+        """Everyone user_id follows."""
+        return self._entry(user_id, FOLLOWING)
+
+    def followers(self, user_id: str) -> FrozenSet[str]:
+        """Everyone who follows user_id."""
+        return self._entry(user_id, FOLLOWERS)
+
+    def invalidate(self, *user_ids: str):
+        """Drop users' sets, e.g. after a follow request between them is sent, accepted or rejected."""
+        with self._lock:
+            self._generation += 1
+            for user_id in user_ids:
+                user_id = str(user_id)
+                if user_id in self._loading:
+                    self._invalidated[user_id] = self._generation
+                if self._data.pop(user_id, None) is not None:
+                    self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+                'invalidations': self.invalidations,
+                'stale_loads': self.stale_loads,
+            }
+
+
+graph = FollowGraph()
@@ -0,0 +1,252 @@
+"""
+Like Buffer - Write-behind buffer for like/unlike toggles
+A toggle only flips the desired state of (user, post) in memory and answers
+straight away; every LIKE_BUFFER_WINDOW seconds the net changes are written
+in one transaction (likes that ended where they started write nothing),
+owners of newly liked posts get their grouped like notification, and each
+user gets a single 'post_liked' event per post with the final state and
+count. Pending state overlays the database: the toggling user sees their
+own state, and post listings add the unwritten likes to the counts.
+
+The buffer lives in one process. Workers sharing a message queue would
+each show their own pending likes until a flush, so there the window
+defaults to 0 (write-through: each toggle is written before it returns).
+A crash loses at most one window of toggles; nothing is half-written,
+since each flush is a single transaction.
+"""
+
+import atexit
+import os
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import inspect
+
+from backplane import MEMORY_SCHEME, SOCKETIO_MESSAGE_QUEUE
+from database import db
+from models import Post, PostLike, User
+import notification_aggregation
+
+# Several worker processes share the socket message queue (memory:// is in-process)
+_MULTI_WORKER = bool(SOCKETIO_MESSAGE_QUEUE) and not SOCKETIO_MESSAGE_QUEUE.startswith(MEMORY_SCHEME)
+
+# Seconds toggles are collected before their net effect is written (0 = write-through)
+LIKE_BUFFER_WINDOW = float(os.environ.get('LIKE_BUFFER_WINDOW', 0 if _MULTI_WORKER else 2.0))
+
+# Seconds before a failed write-through flush is retried
+LIKE_BUFFER_RETRY_DELAY = 2.0
+
+
+class LikeBuffer:
+    """
+    Holds (user_id, post_id) -> [stored state, desired state] until the next
+    flush. The stored state is read once, on the first toggle in a window,
+    and only used for what the user sees; flushes compare the desired state
+    with the rows themselves.
+    """
+
+    def __init__(self, app, socket_io, pushes=None, window: float = LIKE_BUFFER_WINDOW):
+        self.app = app
+        self.socketio = socket_io
+        self.pushes = pushes
+        self.window = window
+        self._pending = {}
+        # Entries of the batch being written right now
+        self._inflight = {}
+        self._timer = None
+        self._lock = threading.Lock()
+        # Held for a whole flush; concurrent flushes (write-through toggles each run one) queue up
+        self._write_lock = threading.Lock()
+        self.toggles = 0
+        self.flushes = 0
+        self.rows_written = 0
+        self.cancelled = 0
+        self.failed = 0
+        atexit.register(self.flush)
+
+    def toggle(self, user_id: str, post_id: int) -> Tuple[bool, int]:
+        """
+        Flip the user's like on a post (needs an app context on the first
+        toggle of a window).
+
+        Returns:
+            (liked, likes) as the user should see them now.
+        """
+        key = (str(user_id), int(post_id))
+        stored = None
+        while True:
+            with self._lock:
+                entry = self._pending.get(key)
+                if entry is None and key in self._inflight:
+                    # Being written right now: its desired state is what is stored
+                    stored = self._inflight[key][1]
+                if entry is None and stored is not None:
+                    entry = self._pending[key] = [stored, stored]
+                if entry is not None:
+                    entry[1] = not entry[1]
+                    liked = entry[1]
+                    delta = self._post_delta(key[1])
+                    self.toggles += 1
+                    flush_now = self.window <= 0
+                    if not flush_now and self._timer is None:
+                        self._timer = threading.Timer(self.window, self.flush)
+                        self._timer.daemon = True
+                        self._timer.start()
+                    break
+            stored = PostLike.query.filter_by(post_id=key[1], user_id=key[0]).first() is not None
+        if flush_now:
+            # On its own thread so the flush gets its own session
+            flusher = threading.Thread(target=self.flush)
+            flusher.start()
+            flusher.join()
+            delta = 0
+
+        likes = db.session.query(Post.likes).filter(Post.id == key[1]).scalar() or 0
+        return liked, max(0, likes + delta)
+
+    def _post_delta(self, post_id: int) -> int:
+        """Net likes on post_id not yet written (caller holds the lock)."""
+        return sum(
+            int(desired) - int(stored)
+            for (_, pid), (stored, desired) in self._pending.items() if pid == post_id
+        )
+
+    def pending_deltas(self, post_ids) -> Dict[int, int]:
+        """Net likes not yet written for each of post_ids that has any."""
+        post_ids = set(post_ids)
+        deltas = {}
+        with self._lock:
+            for (_, post_id), (stored, desired) in self._pending.items():
+                if post_id in post_ids and stored != desired:
+                    deltas[post_id] = deltas.get(post_id, 0) + int(desired) - int(stored)
+        return deltas
+
+    def is_liked(self, user_id: str, post_id: int) -> Optional[bool]:
+        """Pending state for (user, post), or None when nothing is buffered."""
+        with self._lock:
+            entry = self._pending.get((str(user_id), int(post_id)))
+        return entry[1] if entry is not None else None
+
+    def flush(self):
+        """Write every toggle made before the call (waits for a flush already writing)."""
+        with self._write_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._inflight = pending
+                self._timer = None
+            if not pending:
+                return
+            self._flush_batch(pending)
+
+    def _flush_batch(self, pending):
+        with self.app.app_context():
+            try:
+                written, notifications = self._write({key: entry[1] for key, entry in pending.items()})
+                counts = dict(
+                    db.session.query(Post.id, Post.likes)
+                    .filter(Post.id.in_({post_id for _, post_id in pending})).all()
+                )
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error flushing like buffer: {e}")
+                self._requeue(pending)
+                return
+            finally:
+                db.session.remove()
+                with self._lock:
+                    self._inflight = {}
+
+        self.flushes += 1
+        self.rows_written += written
+        self.cancelled += len(pending) - written
+        if self.pushes is not None:
+            for payload in notifications:
+                self.pushes.push(payload)
+        for (user_id, post_id), (_, liked) in pending.items():
+            self.socketio.emit('post_liked', {
+                'post_id': post_id,
+                'user_id': user_id,
+                'liked': liked,
+                'likes': counts.get(post_id) or 0,
+            }, room=f'user_{user_id}')
+
+    def _write(self, desired: Dict[Tuple[str, int], bool]):
+        """
+        Bring post_likes in line with the desired states in one transaction.
+        The posts are locked (SELECT ... FOR UPDATE) before their likes are
+        read and compared against, so a retried batch or one written by
+        another worker never double-applies.
+
+        Returns:
+            (rows inserted or deleted, notification payloads to push)
+        """
+        post_ids = {post_id for _, post_id in desired}
+        user_ids = {user_id for user_id, _ in desired}
+        owners = dict(
+            db.session.query(Post.id, Post.user_id).filter(Post.id.in_(post_ids))
+            .order_by(Post.id).with_for_update().all()
+        )
+        existing = {
+            (like.user_id, like.post_id): like for like in PostLike.query.filter(
+                PostLike.post_id.in_(post_ids), PostLike.user_id.in_(user_ids)
+            ).all()
+        }
+        changed = [
+            (key, liked) for key, liked in desired.items()
+            if key[1] in owners and liked != (key in existing)
+        ]
+        if not changed:
+            return 0, []
+        actors = {
+            user.id: user for user in
+            User.query.filter(User.id.in_({user_id for (user_id, _), liked in changed if liked})).all()
+        }
+
+        # notification id -> (notification, actor); a group's latest change wins
+        notifications = {}
+        for (user_id, post_id), liked in changed:
+            owner_id = owners[post_id]
+            if not liked:
+                db.session.delete(existing[(user_id, post_id)])
+                if owner_id != user_id:
+                    # An unlike takes the user back out of the owner's like group
+                    notification = notification_aggregation.retract(owner_id, user_id, post_id, 'like')
+                    if notification is not None:
+                        notifications[notification.id] = (notification, None)
+                continue
+            db.session.add(PostLike(post_id=post_id, user_id=user_id))
+            if owner_id != user_id and user_id in actors:
+                notification = notification_aggregation.record(owner_id, actors[user_id], post_id, 'like')
+                notifications[notification.id] = (notification, actors[user_id])
+        db.session.flush()
+        # Built before the commit expires them; groups a later unlike emptied are gone
+        payloads = [
+            notification_aggregation.push_payload(n, actor or n.from_user)
+            for n, actor in notifications.values() if not inspect(n).was_deleted
+        ]
+        db.session.commit()
+        return len(changed), payloads
+
+    def _requeue(self, pending):
+        """Put a failed batch back unless newer toggles arrived meanwhile."""
+        with self._lock:
+            self.failed += 1
+            for key, entry in pending.items():
+                self._pending.setdefault(key, entry)
+            if self._pending and self._timer is None:
+                self._timer = threading.Timer(self.window if self.window > 0 else LIKE_BUFFER_RETRY_DELAY, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            'window': self.window,
+            'pending': pending,
+            'toggles': self.toggles,
+            'flushes': self.flushes,
+            'rows_written': self.rows_written,
+            'cancelled': self.cancelled,
+            'failed': self.failed,
+        }
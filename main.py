@@ -7,6 +7,37 @@ def signal_handler(sig, frame):
     print("\n👋 Server stopped gracefully.")
     sys.exit(0)
 
+def run_workers(app_py, port, workers):
+    """Start one app.py process per port (port, port+1, ...) sharing the Socket.IO queue."""
+    queue_url = os.environ.get("SOCKETIO_MESSAGE_QUEUE", "")
+    if not queue_url or queue_url.startswith("memory://"):
+        print("❌ --workers needs SOCKETIO_MESSAGE_QUEUE set to a shared queue, e.g. redis://localhost:6379/0")
+        return
+
+    ports = [int(port) + i for i in range(workers)]
+    print(f"🔧 Launching {workers} workers on ports {', '.join(map(str, ports))}")
+    print(f"📡 Message queue: {queue_url}")
+    print("⚠️  Put a load balancer with sticky sessions (e.g. nginx ip_hash) in front of these ports")
+    print("🛑 Press Ctrl+C to stop")
+    print("=" * 50)
+
+    processes = [
+        subprocess.Popen([sys.executable, app_py, "--port", str(p), "--worker"])
+        for p in ports
+    ]
+    try:
+        for process in processes:
+            process.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            if process.poll() is None:
+                process.terminate()
+        for process in processes:
+            process.wait()
+        print("\n👋 Workers stopped.")
+
 def main():
     print("🚀 Starting SmartFixer Application...")
     print("=" * 50)
@@ -14,10 +45,22 @@ def main():
     # Get the directory of this script
     script_dir = os.path.dirname(os.path.abspath(__file__))
     
+    # Usage: python main.py [port] [--workers N]
+    args = sys.argv[1:]
+    workers = 1
+    if "--workers" in args:
+        index = args.index("--workers")
+        try:
+            workers = int(args[index + 1])
+        except (ValueError, IndexError):
+            print("❌ --workers expects a number")
+            return
+        del args[index:index + 2]
+
     # Check if a port was specified as command line argument
     port = "5000"  # Default port
-    if len(sys.argv) > 1:
-        port = sys.argv[1]
+    if args:
+        port = args[0]
     
     # Run app.py with port argument directly using system Python
     app_py = os.path.join(script_dir, "app.py")
@@ -25,6 +68,10 @@ def main():
     if not os.path.exists(app_py):
         print("❌ app.py not found!")
         return
+
+    if workers > 1:
+        run_workers(app_py, port, workers)
+        return
     
     print("🔧 Launching application...")
     print(f"🌐 URL: http://localhost:{port}")
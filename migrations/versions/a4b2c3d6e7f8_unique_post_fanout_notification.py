@@ -0,0 +1,37 @@
+"""unique new-post notification per follower
+
+Revision ID: a4b2c3d6e7f8
+Revises: f3a1b2c5d6e7
+Create Date: 2026-10-19 23:05:41.392871
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4b2c3d6e7f8'
+down_revision = 'f3a1b2c5d6e7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Drop duplicates left by concurrent fan-out jobs, keeping the oldest
+    op.execute("""
+        DELETE FROM notifications WHERE type = 'post' AND id NOT IN (
+            SELECT min(id) FROM notifications WHERE type = 'post' GROUP BY user_id, post_id
+        )
+    """)
+    # Counters of users who lost an unread duplicate are repaired by unread_counters.reconcile()
+
+    with op.batch_alter_table('notifications', schema=None) as batch_op:
+        batch_op.create_index(
+            'uq_notifications_post_fanout', ['user_id', 'post_id'], unique=True,
+            sqlite_where=sa.text("type = 'post'"), postgresql_where=sa.text("type = 'post'")
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('notifications', schema=None) as batch_op:
+        batch_op.drop_index('uq_notifications_post_fanout')
@@ -0,0 +1,34 @@
+"""notification aggregation
+
+Revision ID: a8b6c7d0e1f2
+Revises: f7a5b6c9d0e1
+Create Date: 2026-10-19 16:40:52.113904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8b6c7d0e1f2'
+down_revision = 'f7a5b6c9d0e1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('notifications', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('actor_count', sa.Integer(), server_default='1', nullable=False))
+        batch_op.add_column(sa.Column('aggregated_since', sa.DateTime(), nullable=True))
+        batch_op.create_index(
+            'ix_notifications_user_post_type',
+            ['user_id', 'post_id', 'type'],
+            unique=False
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('notifications', schema=None) as batch_op:
+        batch_op.drop_index('ix_notifications_user_post_type')
+        batch_op.drop_column('aggregated_since')
+        batch_op.drop_column('actor_count')
@@ -0,0 +1,30 @@
+"""messages keyset pagination index
+
+Revision ID: b3c1d2e4f5a6
+Revises: 6447cb759011
+Create Date: 2026-10-19 10:12:41.220815
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3c1d2e4f5a6'
+down_revision = '6447cb759011'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('messages', schema=None) as batch_op:
+        batch_op.create_index(
+            'ix_messages_conversation_created_id',
+            ['conversation_id', 'created_at', 'id'],
+            unique=False
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('messages', schema=None) as batch_op:
+        batch_op.drop_index('ix_messages_conversation_created_id')
@@ -0,0 +1,74 @@
+"""distinct actors, open-group key and updated_at for notifications
+
+Revision ID: b5c3d4e7f8a9
+Revises: a4b2c3d6e7f8
+Create Date: 2026-10-19 23:31:07.518246
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5c3d4e7f8a9'
+down_revision = 'a4b2c3d6e7f8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'notification_actors',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('notification_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.String(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['notification_id'], ['notifications.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('notification_id', 'user_id', name='uq_notification_actor')
+    )
+
+    with op.batch_alter_table('notifications', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('group_key', sa.String(length=120), nullable=True))
+        batch_op.create_unique_constraint('uq_notifications_group_key', ['group_key'])
+
+    # Sort position is unchanged for existing rows. Their groups carry no
+    # key or actor list, so they stay closed and new activity opens new groups.
+    op.execute("UPDATE notifications SET updated_at = created_at")
+
+    with op.batch_alter_table('notifications', schema=None) as batch_op:
+        batch_op.drop_index('ix_notifications_user_read_created_id')
+        batch_op.drop_index('ix_notifications_user_created_id')
+        batch_op.create_index(
+            'ix_notifications_user_updated_id',
+            ['user_id', 'updated_at', 'id'],
+            unique=False
+        )
+        batch_op.create_index(
+            'ix_notifications_user_read_updated_id',
+            ['user_id', 'read_status', 'updated_at', 'id'],
+            unique=False
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('notifications', schema=None) as batch_op:
+        batch_op.drop_index('ix_notifications_user_read_updated_id')
+        batch_op.drop_index('ix_notifications_user_updated_id')
+        batch_op.create_index(
+            'ix_notifications_user_created_id',
+            ['user_id', 'created_at', 'id'],
+            unique=False
+        )
+        batch_op.create_index(
+            'ix_notifications_user_read_created_id',
+            ['user_id', 'read_status', 'created_at', 'id'],
+            unique=False
+        )
+        batch_op.drop_constraint('uq_notifications_group_key', type_='unique')
+        batch_op.drop_column('group_key')
+        batch_op.drop_column('updated_at')
+
+    op.drop_table('notification_actors')
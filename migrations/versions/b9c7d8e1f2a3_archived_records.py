@@ -0,0 +1,43 @@
+"""archived records
+
+Revision ID: b9c7d8e1f2a3
+Revises: a8b6c7d0e1f2
+Create Date: 2026-10-19 17:25:09.640117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b9c7d8e1f2a3'
+down_revision = 'a8b6c7d0e1f2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'archived_records',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('source', sa.String(length=32), nullable=False),
+        sa.Column('source_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('archived_at', sa.DateTime(), nullable=True),
+        sa.Column('payload', sa.LargeBinary(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('source', 'source_id', name='uq_archived_source_record')
+    )
+    with op.batch_alter_table('archived_records', schema=None) as batch_op:
+        batch_op.create_index(
+            'ix_archived_source_user_created',
+            ['source', 'user_id', 'created_at'],
+            unique=False
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('archived_records', schema=None) as batch_op:
+        batch_op.drop_index('ix_archived_source_user_created')
+    op.drop_table('archived_records')
@@ -0,0 +1,35 @@
+"""post comments count and feed indexes
+
+Revision ID: c0d8e9f2a3b4
+Revises: b9c7d8e1f2a3
+Create Date: 2026-10-19 18:12:44.271530
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c0d8e9f2a3b4'
+down_revision = 'b9c7d8e1f2a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('posts', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('comments_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.create_index('ix_posts_user_created_id', ['user_id', 'created_at', 'id'], unique=False)
+        batch_op.create_index('ix_posts_created_id', ['created_at', 'id'], unique=False)
+
+    op.execute(
+        "UPDATE posts SET comments_count = "
+        "(SELECT COUNT(*) FROM comments WHERE comments.post_id = posts.id)"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('posts', schema=None) as batch_op:
+        batch_op.drop_index('ix_posts_created_id')
+        batch_op.drop_index('ix_posts_user_created_id')
+        batch_op.drop_column('comments_count')
@@ -0,0 +1,58 @@
+"""conversation last message and unread counters
+
+Revision ID: c4d2e3f6a7b8
+Revises: b3c1d2e4f5a6
+Create Date: 2026-10-19 11:03:27.904113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d2e3f6a7b8'
+down_revision = 'b3c1d2e4f5a6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('conversations', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('last_message_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('last_message_preview', sa.String(length=200), nullable=True))
+        batch_op.add_column(sa.Column('last_message_type', sa.String(length=50), nullable=True))
+        batch_op.add_column(sa.Column('last_message_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('user1_unread', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('user2_unread', sa.Integer(), nullable=False, server_default='0'))
+
+    # Backfill from existing messages
+    op.execute("""
+        UPDATE conversations SET last_message_id = (
+            SELECT m.id FROM messages m WHERE m.conversation_id = conversations.id
+            ORDER BY m.created_at DESC, m.id DESC LIMIT 1
+        )
+    """)
+    op.execute("""
+        UPDATE conversations SET
+            last_message_preview = (SELECT substr(coalesce(m.content, ''), 1, 200) FROM messages m WHERE m.id = conversations.last_message_id),
+            last_message_type = (SELECT m.message_type FROM messages m WHERE m.id = conversations.last_message_id),
+            last_message_at = (SELECT m.created_at FROM messages m WHERE m.id = conversations.last_message_id),
+            user1_unread = (
+                SELECT count(*) FROM messages m WHERE m.conversation_id = conversations.id
+                AND m.receiver_id = conversations.user1_id AND m.is_read = false
+            ),
+            user2_unread = (
+                SELECT count(*) FROM messages m WHERE m.conversation_id = conversations.id
+                AND m.receiver_id = conversations.user2_id AND m.is_read = false
+            )
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('conversations', schema=None) as batch_op:
+        batch_op.drop_column('user2_unread')
+        batch_op.drop_column('user1_unread')
+        batch_op.drop_column('last_message_at')
+        batch_op.drop_column('last_message_type')
+        batch_op.drop_column('last_message_preview')
+        batch_op.drop_column('last_message_id')
@@ -0,0 +1,33 @@
+"""post saves count
+
+Revision ID: d1e9f0a3b4c5
+Revises: c0d8e9f2a3b4
+Create Date: 2026-10-19 19:03:38.915262
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd1e9f0a3b4c5'
+down_revision = 'c0d8e9f2a3b4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('posts', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('saves_count', sa.Integer(), server_default='0', nullable=False))
+
+    # Counters are maintained incrementally from here on; start from exact values
+    op.execute(
+        "UPDATE posts SET "
+        "likes = (SELECT COUNT(*) FROM post_likes WHERE post_likes.post_id = posts.id), "
+        "saves_count = (SELECT COUNT(*) FROM post_saves WHERE post_saves.post_id = posts.id)"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('posts', schema=None) as batch_op:
+        batch_op.drop_column('saves_count')
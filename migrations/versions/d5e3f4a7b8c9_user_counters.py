@@ -0,0 +1,42 @@
+"""per-user unread counters
+
+Revision ID: d5e3f4a7b8c9
+Revises: c4d2e3f6a7b8
+Create Date: 2026-10-19 12:18:05.441927
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5e3f4a7b8c9'
+down_revision = 'c4d2e3f6a7b8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'user_counters',
+        sa.Column('user_id', sa.String(), nullable=False),
+        sa.Column('unread_messages', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('unread_notifications', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id')
+    )
+
+    # Backfill from existing rows
+    op.execute("""
+        INSERT INTO user_counters (user_id, unread_messages, unread_notifications, updated_at)
+        SELECT u.id,
+            (SELECT count(*) FROM messages m WHERE m.receiver_id = u.id AND m.is_read = false),
+            (SELECT count(*) FROM notifications n WHERE n.user_id = u.id AND n.read_status = false),
+            CURRENT_TIMESTAMP
+        FROM users u
+    """)
+
+
+def downgrade():
+    op.drop_table('user_counters')
@@ -0,0 +1,38 @@
+"""profile grid indexes
+
+Revision ID: e2f0a1b4c5d6
+Revises: d1e9f0a3b4c5
+Create Date: 2026-10-19 20:41:07.226418
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2f0a1b4c5d6'
+down_revision = 'd1e9f0a3b4c5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('post_likes', schema=None) as batch_op:
+        batch_op.create_index('ix_post_likes_user_id_id', ['user_id', 'id'], unique=False)
+
+    with op.batch_alter_table('post_saves', schema=None) as batch_op:
+        batch_op.create_index('ix_post_saves_user_id_id', ['user_id', 'id'], unique=False)
+
+    with op.batch_alter_table('followers', schema=None) as batch_op:
+        batch_op.create_index('ix_followers_follower_id', ['follower_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('followers', schema=None) as batch_op:
+        batch_op.drop_index('ix_followers_follower_id')
+
+    with op.batch_alter_table('post_saves', schema=None) as batch_op:
+        batch_op.drop_index('ix_post_saves_user_id_id')
+
+    with op.batch_alter_table('post_likes', schema=None) as batch_op:
+        batch_op.drop_index('ix_post_likes_user_id_id')
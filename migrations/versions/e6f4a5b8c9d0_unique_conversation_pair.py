@@ -0,0 +1,64 @@
+"""unique conversation per user pair
+
+Revision ID: e6f4a5b8c9d0
+Revises: d5e3f4a7b8c9
+Create Date: 2026-10-19 13:36:52.117340
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6f4a5b8c9d0'
+down_revision = 'd5e3f4a7b8c9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Fold duplicate conversations (created by the old get-or-create race)
+    # into the oldest one before adding the constraint
+    op.execute("""
+        UPDATE messages SET conversation_id = (
+            SELECT min(c2.id) FROM conversations c1
+            JOIN conversations c2 ON c2.user1_id = c1.user1_id AND c2.user2_id = c1.user2_id
+            WHERE c1.id = messages.conversation_id
+        )
+        WHERE conversation_id IS NOT NULL
+    """)
+    op.execute("""
+        DELETE FROM conversations WHERE id NOT IN (
+            SELECT min(id) FROM conversations GROUP BY user1_id, user2_id
+        )
+    """)
+
+    # Recompute the denormalized fields of the surviving conversations
+    op.execute("""
+        UPDATE conversations SET last_message_id = (
+            SELECT m.id FROM messages m WHERE m.conversation_id = conversations.id
+            ORDER BY m.created_at DESC, m.id DESC LIMIT 1
+        )
+    """)
+    op.execute("""
+        UPDATE conversations SET
+            last_message_preview = (SELECT substr(coalesce(m.content, ''), 1, 200) FROM messages m WHERE m.id = conversations.last_message_id),
+            last_message_type = (SELECT m.message_type FROM messages m WHERE m.id = conversations.last_message_id),
+            last_message_at = (SELECT m.created_at FROM messages m WHERE m.id = conversations.last_message_id),
+            user1_unread = (
+                SELECT count(*) FROM messages m WHERE m.conversation_id = conversations.id
+                AND m.receiver_id = conversations.user1_id AND m.is_read = false
+            ),
+            user2_unread = (
+                SELECT count(*) FROM messages m WHERE m.conversation_id = conversations.id
+                AND m.receiver_id = conversations.user2_id AND m.is_read = false
+            )
+    """)
+
+    with op.batch_alter_table('conversations', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_conversation_pair', ['user1_id', 'user2_id'])
+
+
+def downgrade():
+    with op.batch_alter_table('conversations', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_conversation_pair', type_='unique')
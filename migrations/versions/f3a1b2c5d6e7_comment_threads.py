@@ -0,0 +1,37 @@
+"""comment threads
+
+Revision ID: f3a1b2c5d6e7
+Revises: e2f0a1b4c5d6
+Create Date: 2026-10-19 21:26:52.804113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a1b2c5d6e7'
+down_revision = 'e2f0a1b4c5d6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing comments are all top-level: parent NULL, depth 0, no replies
+    with op.batch_alter_table('comments', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('parent_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('depth', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('reply_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.create_foreign_key('fk_comments_parent_id', 'comments', ['parent_id'], ['id'])
+        batch_op.create_index('ix_comments_post_created_id', ['post_id', 'created_at', 'id'], unique=False)
+        batch_op.create_index('ix_comments_parent_created_id', ['parent_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('comments', schema=None) as batch_op:
+        batch_op.drop_index('ix_comments_parent_created_id')
+        batch_op.drop_index('ix_comments_post_created_id')
+        batch_op.drop_constraint('fk_comments_parent_id', type_='foreignkey')
+        batch_op.drop_column('reply_count')
+        batch_op.drop_column('depth')
+        batch_op.drop_column('parent_id')
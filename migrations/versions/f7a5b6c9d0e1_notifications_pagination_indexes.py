@@ -0,0 +1,36 @@
+"""notifications pagination indexes
+
+Revision ID: f7a5b6c9d0e1
+Revises: e6f4a5b8c9d0
+Create Date: 2026-10-19 15:02:17.508362
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f7a5b6c9d0e1'
+down_revision = 'e6f4a5b8c9d0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('notifications', schema=None) as batch_op:
+        batch_op.create_index(
+            'ix_notifications_user_created_id',
+            ['user_id', 'created_at', 'id'],
+            unique=False
+        )
+        batch_op.create_index(
+            'ix_notifications_user_read_created_id',
+            ['user_id', 'read_status', 'created_at', 'id'],
+            unique=False
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('notifications', schema=None) as batch_op:
+        batch_op.drop_index('ix_notifications_user_read_created_id')
+        batch_op.drop_index('ix_notifications_user_created_id')
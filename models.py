@@ -2,8 +2,9 @@ from datetime import datetime
 from database import db
 from flask_dance.consumer.storage.sqla import OAuthConsumerMixin
 from flask_login import UserMixin
-from sqlalchemy import UniqueConstraint
+from sqlalchemy import UniqueConstraint, Index, text
 from werkzeug.security import generate_password_hash, check_password_hash
+from cooperative import run_blocking
 from datetime import datetime
 import uuid
 
@@ -44,13 +45,14 @@ class User(UserMixin, db.Model):
     
     def set_password(self, password):
         """Hash and set the user's password"""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = run_blocking(generate_password_hash, password)
     
     def check_password(self, password):
         """Check if the provided password matches the user's password"""
         if not self.password_hash:
             return False
-        return check_password_hash(self.password_hash, password)
+        # Key stretching is CPU-bound; keep it off the event loop
+        return run_blocking(check_password_hash, self.password_hash, password)
     
     @property
     def full_name(self):
@@ -81,10 +83,18 @@ class Post(db.Model):
     language = db.Column(db.String, nullable=False)
     description = db.Column(db.Text, nullable=True)
     likes = db.Column(db.Integer, default=0)
+    # likes, comments_count and saves_count are maintained by post_counters.py
+    comments_count = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    saves_count = db.Column(db.Integer, default=0, nullable=False, server_default='0')
     created_at = db.Column(db.DateTime, default=datetime.now)
     
     comments = db.relationship('Comment', backref='post', lazy=True, cascade='all, delete-orphan')
     liked_by = db.relationship('PostLike', backref='post', lazy=True, cascade='all, delete-orphan')
+    # Keyset pagination of the explore feed (per author, and globally)
+    __table_args__ = (
+        Index('ix_posts_user_created_id', 'user_id', 'created_at', 'id'),
+        Index('ix_posts_created_id', 'created_at', 'id'),
+    )
 
 class PostLike(db.Model):
     __tablename__ = 'post_likes'
@@ -92,7 +102,11 @@ class PostLike(db.Model):
     post_id = db.Column(db.Integer, db.ForeignKey('posts.id'), nullable=False)
     user_id = db.Column(db.String, db.ForeignKey('users.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.now)
-    __table_args__ = (UniqueConstraint('post_id', 'user_id', name='uq_post_user_like'),)
+    # (user_id, id) pages a user's liked posts on their profile
+    __table_args__ = (
+        UniqueConstraint('post_id', 'user_id', name='uq_post_user_like'),
+        Index('ix_post_likes_user_id_id', 'user_id', 'id'),
+    )
 
 class PostSave(db.Model):
     __tablename__ = 'post_saves'
@@ -100,7 +114,11 @@ class PostSave(db.Model):
     post_id = db.Column(db.Integer, db.ForeignKey('posts.id'), nullable=False)
     user_id = db.Column(db.String, db.ForeignKey('users.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.now)
-    __table_args__ = (UniqueConstraint('post_id', 'user_id', name='uq_post_user_save'),)
+    # (user_id, id) pages a user's saved posts on their profile
+    __table_args__ = (
+        UniqueConstraint('post_id', 'user_id', name='uq_post_user_save'),
+        Index('ix_post_saves_user_id_id', 'user_id', 'id'),
+    )
 
 class Comment(db.Model):
     __tablename__ = 'comments'
@@ -109,8 +127,18 @@ class Comment(db.Model):
     user_id = db.Column(db.String, db.ForeignKey('users.id'), nullable=False)
     content = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.now)
+    # Threading (see comment_threads.py): replies point at their parent
+    parent_id = db.Column(db.Integer, db.ForeignKey('comments.id'), nullable=True)
+    depth = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    reply_count = db.Column(db.Integer, default=0, nullable=False, server_default='0')
     
     user = db.relationship('User', backref='comments')
+    parent = db.relationship('Comment', remote_side=[id], backref='replies')
+    # Keyset pages of a post's top-level comments and of a comment's replies
+    __table_args__ = (
+        Index('ix_comments_post_created_id', 'post_id', 'created_at', 'id'),
+        Index('ix_comments_parent_created_id', 'parent_id', 'created_at', 'id'),
+    )
 
 class FollowRequest(db.Model):
     __tablename__ = 'follow_requests'
@@ -134,7 +162,11 @@ class Follower(db.Model):
     
     user = db.relationship('User', foreign_keys=[user_id], backref='followers_list')
     follower = db.relationship('User', foreign_keys=[follower_id], backref='following_list')
-    __table_args__ = (UniqueConstraint('user_id', 'follower_id', name='uq_follower'),)
+    # uq_follower serves lookups by user_id; follower_id counts "following"
+    __table_args__ = (
+        UniqueConstraint('user_id', 'follower_id', name='uq_follower'),
+        Index('ix_followers_follower_id', 'follower_id'),
+    )
 
 class Friendship(db.Model):
     __tablename__ = 'friendships'
@@ -154,10 +186,30 @@ class Conversation(db.Model):
     user1_id = db.Column(db.String, db.ForeignKey('users.id'), nullable=False)
     user2_id = db.Column(db.String, db.ForeignKey('users.id'), nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+    
+    # Denormalized latest message so the conversation list needs no per-row queries
+    # (plain integer, not a foreign key, to avoid a messages <-> conversations cycle)
+    last_message_id = db.Column(db.Integer, nullable=True)
+    last_message_preview = db.Column(db.String(200), nullable=True)
+    last_message_type = db.Column(db.String(50), nullable=True)
+    last_message_at = db.Column(db.DateTime, nullable=True)
+    # Unread messages addressed to each participant
+    user1_unread = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    user2_unread = db.Column(db.Integer, default=0, nullable=False, server_default='0')
 
     user1 = db.relationship('User', foreign_keys=[user1_id])
     user2 = db.relationship('User', foreign_keys=[user2_id])
     messages = db.relationship('Message', backref='conversation', lazy=True, cascade='all, delete-orphan')
+    # One conversation per (sorted) user pair; lets concurrent senders upsert safely
+    __table_args__ = (UniqueConstraint('user1_id', 'user2_id', name='uq_conversation_pair'),)
+    
+    def other_user_id(self, user_id):
+        """Id of the participant that isn't user_id"""
+        return self.user2_id if str(self.user1_id) == str(user_id) else self.user1_id
+    
+    def unread_for(self, user_id):
+        """Unread message count for one participant"""
+        return (self.user1_unread if str(self.user1_id) == str(user_id) else self.user2_unread) or 0
 
 class Message(db.Model):
     __tablename__ = 'messages'
@@ -175,6 +227,8 @@ class Message(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.now)
     
     receiver = db.relationship('User', foreign_keys=[receiver_id], backref='received_messages')
+    # Keyset pagination of a conversation's history (newest first)
+    __table_args__ = (Index('ix_messages_conversation_created_id', 'conversation_id', 'created_at', 'id'),)
 
 class Group(db.Model):
     __tablename__ = 'groups'
@@ -205,10 +259,36 @@ class Notification(db.Model):
     post_id = db.Column(db.Integer, db.ForeignKey('posts.id'), nullable=True) # Link to post
     read_status = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.now)
+    # Last activity; the list is sorted on it (a grouped like/comment moves its row up)
+    updated_at = db.Column(db.DateTime, default=datetime.now, nullable=True)
+    # Like/comment grouping (notification_aggregation.py): distinct actors so far,
+    # when the group was opened, and its identity while it is open (NULL once closed)
+    actor_count = db.Column(db.Integer, default=1, server_default='1', nullable=False)
+    aggregated_since = db.Column(db.DateTime, nullable=True)
+    group_key = db.Column(db.String(120), nullable=True)
     
     from_user = db.relationship('User', foreign_keys=[from_user_id])
     follow_request = db.relationship('FollowRequest', foreign_keys=[follow_request_id])
     post = db.relationship('Post', foreign_keys=[post_id])
+    __table_args__ = (
+        Index('ix_notifications_user_updated_id', 'user_id', 'updated_at', 'id'),
+        Index('ix_notifications_user_read_updated_id', 'user_id', 'read_status', 'updated_at', 'id'),
+        Index('ix_notifications_user_post_type', 'user_id', 'post_id', 'type'),
+        # At most one open group per (recipient, post, type); NULLs (closed groups) don't collide
+        UniqueConstraint('group_key', name='uq_notifications_group_key'),
+        # One new-post notification per follower and post, so fan-out retries can't duplicate
+        Index('uq_notifications_post_fanout', 'user_id', 'post_id', unique=True,
+              sqlite_where=text("type = 'post'"), postgresql_where=text("type = 'post'")),
+    )
+
+class NotificationActor(db.Model):
+    """One distinct user in a grouped like/comment notification"""
+    __tablename__ = 'notification_actors'
+    id = db.Column(db.Integer, primary_key=True)
+    notification_id = db.Column(db.Integer, db.ForeignKey('notifications.id', ondelete='CASCADE'), nullable=False)
+    user_id = db.Column(db.String, db.ForeignKey('users.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    __table_args__ = (UniqueConstraint('notification_id', 'user_id', name='uq_notification_actor'),)
 
 class CodeHistory(db.Model):
     __tablename__ = 'code_history'
@@ -228,4 +308,28 @@ class TimeSpent(db.Model):
     minutes = db.Column(db.Integer, default=0)
     total_seconds = db.Column(db.Integer, default=0)
     last_updated = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
-    __table_args__ = (UniqueConstraint('user_id', 'date', name='uq_user_date'),)
\ No newline at end of file
+    __table_args__ = (UniqueConstraint('user_id', 'date', name='uq_user_date'),)
+
+
+class UserCounter(db.Model):
+    """Materialized unread counts per user (maintained by unread_counters.py)"""
+    __tablename__ = 'user_counters'
+    user_id = db.Column(db.String, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    unread_messages = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    unread_notifications = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+
+class ArchivedRecord(db.Model):
+    """Cold storage for rows moved out of hot tables by retention.py"""
+    __tablename__ = 'archived_records'
+    id = db.Column(db.Integer, primary_key=True)
+    source = db.Column(db.String(32), nullable=False)  # notifications, messages, code_history
+    source_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.String, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=True)  # of the original row
+    archived_at = db.Column(db.DateTime, default=datetime.now)
+    payload = db.Column(db.LargeBinary, nullable=False)  # zlib-compressed JSON of the row
+    __table_args__ = (
+        UniqueConstraint('source', 'source_id', name='uq_archived_source_record'),
+        Index('ix_archived_source_user_created', 'source', 'user_id', 'created_at'),
+    )
@@ -0,0 +1,239 @@
+"""
+Notification Aggregation - One row and a throttled push per activity burst
+Likes and comments on the same post are grouped per (recipient, post, type):
+while the group's notification is unread and younger than
+NOTIFICATION_AGGREGATE_WINDOW, a new like or comment updates that row in
+place ("Alice and 48 others liked your post") instead of inserting another.
+The open group is found by its unique group_key, so concurrent writers
+can't open two; its distinct actors are rows in notification_actors, so
+a user who likes twice counts once and an unlike takes them back out. The
+row keeps its created_at; updated_at records the latest activity and is
+what the notification list sorts on. Real-time pushes for a group go out at most once per
+NOTIFICATION_PUSH_INTERVAL; changes in between are folded into a single
+trailing push carrying the latest state.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from sqlalchemy.exc import IntegrityError
+
+from database import db
+from models import Notification, NotificationActor, User
+
+# Seconds a notification keeps absorbing new likes/comments on the same post
+NOTIFICATION_AGGREGATE_WINDOW = int(os.environ.get('NOTIFICATION_AGGREGATE_WINDOW', 3600))
+
+# Minimum seconds between real-time pushes for one notification group
+NOTIFICATION_PUSH_INTERVAL = float(os.environ.get('NOTIFICATION_PUSH_INTERVAL', 5))
+
+
+def aggregate_message(actor_name: str, actor_count: int, type_: str, detail: str = '') -> str:
+    """Notification text for actor_name plus actor_count - 1 others."""
+    others = actor_count - 1
+    who = actor_name
+    if others == 1:
+        who = f"{actor_name} and 1 other"
+    elif others > 1:
+        who = f"{actor_name} and {others} others"
+    if type_ == 'like':
+        return f"{who} liked your post"
+    message = f"{who} commented on your post"
+    if detail:
+        message += f": '{detail[:50]}{'...' if len(detail) > 50 else ''}'"
+    return message
+
+
+def group_key(recipient_id: str, post_id: int, type_: str) -> str:
+    """Identity of a recipient's open like/comment group for a post."""
+    return f"{type_}:{post_id}:{recipient_id}"
+
+
+def _open_group(key: str, window: int, now: datetime) -> Optional[Notification]:
+    """
+    The open group with this key, locked, or None. A group that was read or
+    has outlived the window is closed here (its key cleared) so a new one
+    can take the key.
+    """
+    notification = Notification.query.filter(Notification.group_key == key).with_for_update().first()
+    if notification is None:
+        return None
+    if notification.read_status or notification.aggregated_since < now - timedelta(seconds=window):
+        notification.group_key = None
+        db.session.flush()
+        return None
+    return notification
+
+
+def record(recipient_id: str, actor, post_id: int, type_: str, detail: str = '',
+           window: int = NOTIFICATION_AGGREGATE_WINDOW) -> Notification:
+    """
+    Add actor's like/comment to the recipient's open group for this post,
+    or start a new group. The change is left in the session for the caller
+    to commit with the like/comment itself.
+    """
+    now = datetime.now()
+    key = group_key(recipient_id, post_id, type_)
+    notification = _open_group(key, window, now)
+
+    if notification is None:
+        notification = Notification(
+            user_id=recipient_id, type=type_, post_id=post_id, group_key=key,
+            actor_count=0, aggregated_since=now, created_at=now, message='',
+        )
+        try:
+            with db.session.begin_nested():
+                db.session.add(notification)
+        except IntegrityError:
+            # Another writer opened the group first; join it
+            notification = _open_group(key, window, now)
+
+    try:
+        with db.session.begin_nested():
+            db.session.add(NotificationActor(notification_id=notification.id, user_id=actor.id, created_at=now))
+        notification.actor_count = (notification.actor_count or 0) + 1
+    except IntegrityError:
+        # Already one of this group's actors
+        pass
+
+    notification.from_user_id = actor.id
+    notification.message = aggregate_message(actor.full_name, notification.actor_count, type_, detail)
+    notification.updated_at = now
+    return notification
+
+
+def retract(recipient_id: str, actor_id: str, post_id: int, type_: str,
+            window: int = NOTIFICATION_AGGREGATE_WINDOW) -> Optional[Notification]:
+    """
+    Take actor back out of the recipient's open group (e.g. on unlike). A
+    group left without actors is deleted. Changes are left in the session
+    for the caller to commit.
+
+    Returns:
+        The updated notification, or None if nothing is left to show.
+    """
+    notification = _open_group(group_key(recipient_id, post_id, type_), window, datetime.now())
+    if notification is None:
+        return None
+    actors = NotificationActor.__table__
+    removed = db.session.execute(actors.delete().where(
+        (actors.c.notification_id == notification.id) & (actors.c.user_id == str(actor_id))
+    )).rowcount
+    if not removed:
+        return None
+
+    notification.actor_count = max(0, (notification.actor_count or 1) - 1)
+    latest = (
+        db.session.query(User).join(NotificationActor, NotificationActor.user_id == User.id)
+        .filter(NotificationActor.notification_id == notification.id)
+        .order_by(NotificationActor.created_at.desc(), NotificationActor.id.desc()).first()
+    )
+    if latest is None or not notification.actor_count:
+        db.session.delete(notification)
+        return None
+    # The message names the most recent remaining actor
+    notification.from_user_id = latest.id
+    notification.message = aggregate_message(latest.full_name, notification.actor_count, type_)
+    return notification
+
+
+def push_payload(notification: Notification, actor) -> Dict[str, Any]:
+    """new_notification event body for an aggregated notification."""
+    return {
+        'id': notification.id,
+        'user_id': notification.user_id,
+        'from_user': {
+            'id': actor.id,
+            'first_name': actor.first_name,
+            'last_name': actor.last_name,
+            'username': actor.username,
+            'profile_image_url': actor.profile_image_url,
+        },
+        'message': notification.message,
+        'type': notification.type,
+        'post_id': notification.post_id,
+        'link': f'/post/{notification.post_id}',
+        'created_at': notification.created_at.isoformat(),
+        'updated_at': notification.updated_at.isoformat(),
+        'read_status': False,
+        'actor_count': notification.actor_count,
+        # Updates an item the client already has rather than adding one
+        'aggregated': notification.updated_at > notification.created_at,
+    }
+
+
+class NotificationPushThrottle:
+    """
+    Leading-edge push per notification group, then at most one trailing
+    push per interval with the newest payload.
+    """
+
+    def __init__(self, socket_io, interval: float = NOTIFICATION_PUSH_INTERVAL):
+        self.socketio = socket_io
+        self.interval = interval
+        # group key -> monotonic time of the last push
+        self._last_push = {}
+        # group key -> newest payload waiting for its trailing push
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.pushed = 0
+        self.suppressed = 0
+
+    @staticmethod
+    def key_for(payload: Dict[str, Any]):
+        return payload['user_id'], payload['post_id'], payload['type']
+
+    def push(self, payload: Dict[str, Any]):
+        key = self.key_for(payload)
+        now = time.monotonic()
+        with self._lock:
+            self.submitted += 1
+            if key in self._pending:
+                # A trailing push is already scheduled; it will carry this
+                self._pending[key] = payload
+                self.suppressed += 1
+                return
+            last = self._last_push.get(key)
+            send_now = self.interval <= 0 or last is None or now - last >= self.interval
+            if send_now:
+                self._last_push[key] = now
+            else:
+                self._pending[key] = payload
+                timer = threading.Timer(self.interval - (now - last), self._flush, args=(key,))
+                timer.daemon = True
+                timer.start()
+            if len(self._last_push) > 10000:
+                self._prune(now)
+        if send_now:
+            self._emit(payload)
+
+    def _flush(self, key):
+        with self._lock:
+            payload = self._pending.pop(key, None)
+            if payload is None:
+                return
+            self._last_push[key] = time.monotonic()
+        self._emit(payload)
+
+    def _emit(self, payload: Dict[str, Any]):
+        self.socketio.emit('new_notification', payload, room=f"user_{payload['user_id']}")
+        self.pushed += 1
+
+    def _prune(self, now: float):
+        for key in [k for k, t in self._last_push.items() if now - t >= self.interval and k not in self._pending]:
+            del self._last_push[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'submitted': self.submitted,
+                'pushed': self.pushed,
+                'suppressed': self.suppressed,
+                'pending': len(self._pending),
+                'push_interval': self.interval,
+                'aggregate_window': NOTIFICATION_AGGREGATE_WINDOW,
+            }
@@ -0,0 +1,218 @@
+"""
+Notification Fanout - Background delivery of "new post" notifications
+Creating a post only commits the post and queues a job. A worker thread
+then walks the author's followers in chunks: each chunk is one executemany
+INSERT plus a counter UPDATE (and one INSERT ... SELECT seeding missing
+counter rows), committed on its own, followed by a single new_notification
+emit addressed to the rooms of the recipients that are online. Followers
+who already have the post's notification are skipped, and a unique index
+(uq_notifications_post_fanout) stops concurrent jobs from duplicating
+rows, so a job can be retried or re-submitted safely.
+"""
+
+import os
+import queue
+import threading
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy.exc import IntegrityError
+
+from database import db
+from models import Follower, Notification, Post, User
+import unread_counters
+
+# Followers notified per INSERT/commit
+NOTIFICATION_FANOUT_CHUNK = int(os.environ.get('NOTIFICATION_FANOUT_CHUNK', 1000))
+# Attempts per post before the job is dropped
+NOTIFICATION_FANOUT_ATTEMPTS = int(os.environ.get('NOTIFICATION_FANOUT_ATTEMPTS', 3))
+# Seconds before the first retry (doubled on each further attempt)
+NOTIFICATION_FANOUT_RETRY_DELAY = float(os.environ.get('NOTIFICATION_FANOUT_RETRY_DELAY', 2))
+
+
+def fan_out_post(post_id: int, socket_io=None, online_ids=None,
+                 chunk_size: int = NOTIFICATION_FANOUT_CHUNK) -> Dict[str, int]:
+    """
+    Notify every follower of the post's author. Idempotent: followers who
+    already have a 'post' notification for post_id are skipped.
+
+    The socket payload is shared by every recipient in a chunk, so it has
+    no per-recipient notification id or user_id; the room identifies the
+    recipient.
+
+    Returns:
+        Dict with 'inserted', 'skipped' and 'emitted' counts.
+    """
+    stats = {'inserted': 0, 'skipped': 0, 'emitted': 0}
+    post = db.session.query(Post.id, Post.user_id).filter(Post.id == post_id).first()
+    if post is None:
+        return stats
+    author = User.query.get(post.user_id)
+    if author is None:
+        return stats
+
+    message = f"{author.full_name} created a new post"
+    payload = {
+        'from_user': {
+            'id': author.id,
+            'first_name': author.first_name,
+            'last_name': author.last_name,
+            'username': author.username,
+            'profile_image_url': author.profile_image_url,
+        },
+        'message': message,
+        'type': 'post',
+        'post_id': post.id,
+        'link': f'/post/{post.id}',
+        'read_status': False,
+    }
+    last_follow_id = 0
+
+    while True:
+        rows = db.session.query(Follower.id, Follower.follower_id).filter(
+            Follower.user_id == post.user_id, Follower.id > last_follow_id
+        ).order_by(Follower.id).limit(chunk_size).all()
+        if not rows:
+            break
+        last_follow_id = rows[-1][0]
+
+        follower_ids = {str(follower_id) for _, follower_id in rows}
+        recipients = _notify_chunk(post, author.id, message, follower_ids, stats)
+        if socket_io is None or not recipients:
+            continue
+        online = [user_id for user_id in recipients if online_ids is None or user_id in online_ids]
+        if not online:
+            continue
+        socket_io.emit('new_notification', dict(payload, created_at=datetime.now().isoformat()),
+                       room=[f'user_{user_id}' for user_id in online])
+        stats['emitted'] += len(online)
+
+    return stats
+
+
+def _notify_chunk(post, author_id: str, message: str, follower_ids, stats: Dict[str, int]):
+    """
+    Insert the post's notification for the followers that don't have it yet
+    and bump their counters, in one committed transaction. A concurrent job
+    for the same post trips the unique index; the chunk is then redone
+    without the rows that job committed. Returns the followers notified.
+    """
+    notifications = Notification.__table__
+    for attempt in (1, 2):
+        already = {
+            row[0] for row in db.session.execute(
+                db.select([notifications.c.user_id]).where(
+                    (notifications.c.post_id == post.id) & (notifications.c.type == 'post')
+                    & notifications.c.user_id.in_(follower_ids)
+                )
+            )
+        }
+        recipients = sorted(follower_ids - already)
+        if not recipients:
+            stats['skipped'] += len(already)
+            return []
+
+        created_at = datetime.now()
+        try:
+            db.session.execute(notifications.insert(), [
+                {
+                    'user_id': user_id,
+                    'from_user_id': author_id,
+                    'message': message,
+                    'type': 'post',
+                    'post_id': post.id,
+                    'read_status': False,
+                    'created_at': created_at,
+                }
+                for user_id in recipients
+            ])
+            unread_counters.bump_notifications(recipients)
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            if attempt == 2:
+                raise
+            continue
+        stats['skipped'] += len(already)
+        stats['inserted'] += len(recipients)
+        return recipients
+
+
+class NotificationFanoutQueue:
+    """
+    Single worker thread draining post fan-out jobs. A post already queued
+    is not queued twice; failed jobs are retried with exponential backoff.
+    """
+
+    def __init__(self, app, socket_io, presence=None,
+                 max_attempts: int = NOTIFICATION_FANOUT_ATTEMPTS,
+                 retry_delay: float = NOTIFICATION_FANOUT_RETRY_DELAY):
+        self.app = app
+        self.socketio = socket_io
+        self.presence = presence
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._jobs = queue.Queue()
+        self._queued = set()
+        self._lock = threading.Lock()
+        self._worker = None
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+        self.notifications = 0
+
+    def submit(self, post_id: int, attempt: int = 1):
+        with self._lock:
+            if attempt == 1 and post_id in self._queued:
+                return
+            self._queued.add(post_id)
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, daemon=True)
+                self._worker.start()
+        self._jobs.put((post_id, attempt))
+
+    def _online_ids(self) -> Optional[set]:
+        if self.presence is None:
+            return None
+        return self.presence.sockets.online_user_ids()
+
+    def _run(self):
+        while True:
+            post_id, attempt = self._jobs.get()
+            with self.app.app_context():
+                try:
+                    result = fan_out_post(post_id, self.socketio, self._online_ids())
+                    self.completed += 1
+                    self.notifications += result['inserted']
+                    with self._lock:
+                        self._queued.discard(post_id)
+                except Exception as e:
+                    db.session.rollback()
+                    self._retry(post_id, attempt, e)
+                finally:
+                    db.session.remove()
+
+    def _retry(self, post_id: int, attempt: int, error: Exception):
+        if attempt >= self.max_attempts:
+            self.failed += 1
+            with self._lock:
+                self._queued.discard(post_id)
+            print(f"Giving up on notification fan-out for post {post_id} after {attempt} attempts: {error}")
+            return
+        self.retried += 1
+        delay = self.retry_delay * (2 ** (attempt - 1))
+        print(f"Notification fan-out for post {post_id} failed ({error}); retrying in {delay:.0f}s")
+        timer = threading.Timer(delay, self.submit, args=(post_id, attempt + 1))
+        timer.daemon = True
+        timer.start()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            queued = len(self._queued)
+        return {
+            'queued': queued,
+            'completed': self.completed,
+            'failed': self.failed,
+            'retried': self.retried,
+            'notifications': self.notifications,
+        }
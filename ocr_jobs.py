@@ -0,0 +1,362 @@
+"""
+OCR Job Queue - Runs image OCR outside the request thread
+Uploads are queued into a bounded process pool. Clients get a job id back
+immediately and follow progress by polling or via 'ocr_job_update' events;
+workers report each pipeline stage back over a queue, so a job's status
+and progress move while it runs. Images already in the extraction cache
+finish without reaching the pool. If a worker dies (e.g. out of memory on
+a huge image) the pool is rebuilt: the jobs that were running fail, the
+ones still waiting are resubmitted.
+"""
+
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, Optional
+
+# Worker processes running tesseract at the same time
+OCR_MAX_WORKERS = int(os.environ.get('OCR_MAX_WORKERS', 2))
+# Jobs allowed to wait (queued + running) before new uploads are rejected
+OCR_MAX_PENDING = int(os.environ.get('OCR_MAX_PENDING', 16))
+# How long finished jobs stay available to the poll endpoint
+OCR_JOB_TTL_SECONDS = 600
+
+# OCR output is noisy, so accept a lower code score than for PDFs
+OCR_CODE_THRESHOLD = 0.45
+
+FINISHED_STATUSES = ('done', 'failed', 'cancelled')
+
+
+class QueueFullError(Exception):
+    """Raised when the OCR queue already holds OCR_MAX_PENDING jobs."""
+
+
+# Set in each pool worker by _init_worker: where progress messages go
+_progress_queue = None
+
+
+def _init_worker(progress_queue):
+    global _progress_queue
+    _progress_queue = progress_queue
+
+
+def run_ocr(job_id: str, image_bytes: bytes) -> str:
+    """
+    Preprocess and OCR one image. Runs inside a pool worker process and
+    reports (job_id, percent) on the progress queue as stages complete.
+
+    Raises ValueError if the bytes are not a decodable image.
+    """
+    from ocr_preprocess import extract_text
+
+    def report(percent):
+        if _progress_queue is not None:
+            _progress_queue.put((job_id, percent))
+
+    report(1)
+    return extract_text(image_bytes, progress=report)
+
+
+def build_ocr_result(extracted_text: str) -> Dict[str, Any]:
+    """Turn raw OCR text into the extract-code response payload."""
+    from code_detector import analyze_code
+
+    if not extracted_text or not extracted_text.strip():
+        return {
+            'success': False,
+            'error': 'No text could be extracted from the image. Please use a clearer image.'
+        }
+
+    extracted_text = extracted_text.strip()
+    analysis = analyze_code(extracted_text)
+    confidence = analysis['score']
+
+    if confidence < OCR_CODE_THRESHOLD:
+        print(f"OCR Detection Fail. Text: {extracted_text[:100]}... Score: {confidence:.2f}, Breakdown: {analysis['breakdown']}")
+        return {
+            'success': False,
+            'error': 'Recognizable code was not found in this image. Ensure the code is clear and not blurry.',
+            'confidence': confidence
+        }
+
+    return {
+        'success': True,
+        'code': extracted_text,
+        'language': analysis['language'],
+        'confidence': confidence
+    }
+
+
+class OcrJobQueue:
+    """
+    Tracks OCR jobs and feeds them to a lazily started process pool.
+
+    A job moves queued -> running -> done/failed, or to cancelled. Running
+    jobs can't be interrupted inside the worker; cancelling one discards its
+    result when it finishes, and it keeps counting toward max_pending until
+    then because it still holds a worker.
+    """
+
+    def __init__(self, socket_io=None, max_workers: int = OCR_MAX_WORKERS,
+                 max_pending: int = OCR_MAX_PENDING, cache=None):
+        self.socketio = socket_io
+        self.cache = cache
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.jobs = {}
+        # job id -> future, until the future completes (including cancelled jobs still running)
+        self._futures = {}
+        # job id -> image bytes, kept while queued so a broken pool can resubmit it
+        self._images = {}
+        self._executor = None
+        self._progress = None
+        self._lock = threading.Lock()
+        self.pool_restarts = 0
+
+    def _get_executor(self):
+        """The process pool, started on first use (caller holds the lock)."""
+        if self._executor is None:
+            if self._progress is None:
+                self._progress = multiprocessing.Queue()
+                threading.Thread(target=self._progress_loop, daemon=True).start()
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, initializer=_init_worker, initargs=(self._progress,)
+            )
+        return self._executor
+
+    def _submit_to_pool(self, job, image_bytes: bytes):
+        """
+        Submit one job, rebuilding the pool if it is broken (caller holds the
+        lock). The caller passes the returned future to _watch once the lock
+        is released.
+        """
+        job['attempts'] += 1
+        try:
+            future = self._get_executor().submit(run_ocr, job['id'], image_bytes)
+        except BrokenProcessPool:
+            self._reset_pool()
+            future = self._get_executor().submit(run_ocr, job['id'], image_bytes)
+        self._futures[job['id']] = future
+        self._images[job['id']] = image_bytes
+        return future
+
+    def _watch(self, job_id: str, future):
+        future.add_done_callback(lambda f: self._on_done(job_id, f))
+
+    def _reset_pool(self):
+        """Drop a broken pool so the next submit starts a fresh one (caller holds the lock)."""
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            self.pool_restarts += 1
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, user_id: str, image_bytes: bytes) -> Dict[str, Any]:
+        """
+        Queue an image for OCR and return the new job's public state.
+
+        If the extraction cache already holds OCR text for these bytes the
+        job is returned already done and no worker is used.
+        """
+        from extraction_cache import upload_digest
+        from ocr_preprocess import OCR_PIPELINE_VERSION
+
+        digest = upload_digest(image_bytes)
+        cached = self.cache.get(OCR_PIPELINE_VERSION, digest) if self.cache is not None else None
+
+        with self._lock:
+            self._prune()
+            if cached is None and len(self._futures) >= self.max_pending:
+                raise QueueFullError('OCR queue is full, please try again shortly')
+
+            job_id = str(uuid.uuid4())
+            job = {
+                'id': job_id,
+                'user_id': str(user_id),
+                'status': 'queued',
+                'progress': 0,
+                'result': None,
+                'error': None,
+                'digest': digest,
+                'attempts': 0,
+                'created_at': time.time(),
+                'finished_at': None,
+            }
+            self.jobs[job_id] = job
+            if cached is not None:
+                self._finish(job, 'done', result=build_ocr_result(cached['text']))
+                return self._public(job)
+            future = self._submit_to_pool(job, image_bytes)
+            public = self._public(job)
+        self._watch(job_id, future)
+        return public
+
+    def get(self, job_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """Return job state if it exists and belongs to user_id."""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if not job or job['user_id'] != str(user_id):
+                return None
+            return self._public(job)
+
+    def cancel(self, job_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """Cancel a job. Returns the job state, or None if not found."""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if not job or job['user_id'] != str(user_id):
+                return None
+            if job['status'] in FINISHED_STATUSES:
+                return self._public(job)
+            # A job that already reached a worker can't be cancelled; its
+            # future stays tracked (and counted) until the worker is done
+            future = self._futures.get(job_id)
+            if future is not None and future.cancel():
+                self._futures.pop(job_id, None)
+                self._images.pop(job_id, None)
+            self._finish(job, 'cancelled', error='Cancelled by user')
+            public = self._public(job)
+        self._emit(public)
+        return public
+
+    def _progress_loop(self):
+        """Apply progress reported by workers and push it to the job's owner."""
+        while True:
+            try:
+                job_id, percent = self._progress.get(timeout=1)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                return
+            with self._lock:
+                job = self.jobs.get(job_id)
+                if not job or job['status'] in FINISHED_STATUSES or percent <= job['progress']:
+                    continue
+                job['status'] = 'running'
+                job['progress'] = min(99, percent)
+                # Started: a pool rebuild must not resubmit it
+                self._images.pop(job_id, None)
+                public = self._public(job)
+            self._emit(public)
+
+    def _on_done(self, job_id: str, future):
+        if future.cancelled():
+            return
+
+        if isinstance(future.exception(), BrokenProcessPool):
+            self._on_pool_broken(job_id, future)
+            return
+
+        error = None
+        result = None
+        try:
+            text = future.result()
+            result = build_ocr_result(text)
+            self._store(job_id, text)
+        except ImportError as e:
+            print(f"Import error in OCR: {e}")
+            error = 'OCR dependencies not installed. Please install pytesseract and Pillow.'
+        except Exception as e:
+            print(f"Error extracting code from image: {e}")
+            error = str(e)
+
+        with self._lock:
+            self._futures.pop(job_id, None)
+            self._images.pop(job_id, None)
+            job = self.jobs.get(job_id)
+            if not job or job['status'] in FINISHED_STATUSES:
+                return
+            if error:
+                self._finish(job, 'failed', error=error)
+            else:
+                self._finish(job, 'done', result=result)
+            public = self._public(job)
+        self._emit(public)
+
+    def _on_pool_broken(self, job_id: str, future):
+        """
+        A worker died and took the pool down with it. Jobs that never started
+        are resubmitted (once) to a fresh pool; a job that was running,
+        possibly the one that killed the worker, fails.
+        """
+        with self._lock:
+            if self._futures.get(job_id) is not future:
+                return
+            del self._futures[job_id]
+            image_bytes = self._images.pop(job_id, None)
+            job = self.jobs.get(job_id)
+            if not job or job['status'] in FINISHED_STATUSES:
+                return
+            if image_bytes is not None and job['status'] == 'queued' and job['attempts'] < 2:
+                retry = self._submit_to_pool(job, image_bytes)
+            else:
+                retry = None
+                self._finish(job, 'failed', error='The OCR worker stopped unexpectedly; please try a smaller image.')
+                public = self._public(job)
+        if retry is not None:
+            self._watch(job_id, retry)
+        else:
+            self._emit(public)
+
+    def _store(self, job_id: str, text: str):
+        """Save OCR text in the extraction cache so repeat uploads skip the pool."""
+        if self.cache is None:
+            return
+        from ocr_preprocess import OCR_PIPELINE_VERSION
+        with self._lock:
+            job = self.jobs.get(job_id)
+            digest = job['digest'] if job else None
+        if digest:
+            self.cache.put(OCR_PIPELINE_VERSION, digest, {'text': text})
+
+    def _finish(self, job, status, result=None, error=None):
+        job['status'] = status
+        job['progress'] = 100
+        job['result'] = result
+        job['error'] = error
+        job['finished_at'] = time.time()
+
+    def _prune(self):
+        """Drop finished jobs older than OCR_JOB_TTL_SECONDS (caller holds the lock)."""
+        cutoff = time.time() - OCR_JOB_TTL_SECONDS
+        expired = [
+            job_id for job_id, job in self.jobs.items()
+            if job['finished_at'] is not None and job['finished_at'] < cutoff
+        ]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+    def _emit(self, public_job):
+        if self.socketio is None:
+            return
+        try:
+            self.socketio.emit('ocr_job_update', public_job, room=f"user_{public_job['user_id']}")
+        except Exception as e:
+            print(f"Error emitting OCR job update: {e}")
+
+    @staticmethod
+    def _public(job):
+        return {
+            'job_id': job['id'],
+            'user_id': job['user_id'],
+            'status': job['status'],
+            'progress': job['progress'],
+            'result': job['result'],
+            'error': job['error'],
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = {}
+            for job in self.jobs.values():
+                counts[job['status']] = counts.get(job['status'], 0) + 1
+            return {
+                'max_workers': self.max_workers,
+                'max_pending': self.max_pending,
+                'in_pool': len(self._futures),
+                'pool_restarts': self.pool_restarts,
+                'jobs': counts,
+            }
@@ -0,0 +1,175 @@
+"""
+PDF Extraction - Page-parallel text extraction for code uploads
+Uploads are spooled to a temp file, pages are extracted in a process pool
+and fed to the code detector in page order as they finish. Extraction
+stops early once enough code is found or the page budget is spent; the
+temp file is removed once the last worker still reading it is done.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Any, List, Tuple
+
+from cooperative import run_blocking
+
+# Worker processes running pdfplumber at the same time
+PDF_MAX_WORKERS = int(os.environ.get('PDF_MAX_WORKERS', 2))
+# Never extract more than this many pages from one upload
+PDF_MAX_PAGES = int(os.environ.get('PDF_MAX_PAGES', 50))
+# Pages handled per worker task (each task opens the PDF once)
+PDF_PAGES_PER_TASK = 4
+# Stop once this many characters of code pages have been collected
+PDF_ENOUGH_CODE_CHARS = 20000
+# Same 60% threshold the endpoint applies to the final text
+PDF_CODE_THRESHOLD = 0.6
+# Copy buffer used when spooling the upload to disk
+SPOOL_CHUNK_SIZE = 1024 * 1024
+# Bump whenever extract_code's output changes so cached results are not reused
+PDF_PIPELINE_VERSION = 'pdf-2'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=PDF_MAX_WORKERS)
+        return _executor
+
+
+def spool_upload(file_storage) -> Tuple[str, str]:
+    """
+    Copy an uploaded file to a temp file in chunks, hashing it on the way.
+
+    Returns:
+        (path, SHA-256 hex digest of the uploaded bytes)
+    """
+    digest = hashlib.sha256()
+    fd, path = tempfile.mkstemp(suffix='.pdf', prefix='upload_')
+    with os.fdopen(fd, 'wb') as out:
+        while True:
+            chunk = file_storage.stream.read(SPOOL_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            out.write(chunk)
+    return path, digest.hexdigest()
+
+
+def remove_file(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def remove_when_done(path: str, futures) -> None:
+    """Delete path once every one of futures has finished (now, if none is running)."""
+    running = [future for future in futures if not future.done()]
+    if not running:
+        remove_file(path)
+        return
+    remaining = [len(running)]
+    lock = threading.Lock()
+
+    def finished(_):
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            remove_file(path)
+
+    for future in running:
+        future.add_done_callback(finished)
+
+
+def count_pages(path: str) -> int:
+    import pdfplumber
+    with pdfplumber.open(path) as pdf:
+        return len(pdf.pages)
+
+
+def extract_pages(path: str, page_numbers: List[int]) -> List[Tuple[int, str]]:
+    """Extract text for the given 0-based pages. Runs inside a pool worker process."""
+    import pdfplumber
+    with pdfplumber.open(path) as pdf:
+        return [(n, pdf.pages[n].extract_text() or '') for n in page_numbers]
+
+
+def extract_code(path: str) -> Dict[str, Any]:
+    """
+    Extract code from the PDF at path, which this takes ownership of: the
+    file is removed once no worker needs it, possibly after this returns
+    (tasks a worker has started can't be cancelled when extraction stops
+    early).
+
+    Pages scoring as code are collected in page order; if none do, the text
+    of every page read is scored as a whole (the pre-streaming behaviour).
+
+    Returns:
+        Dict with 'text' (empty if nothing was extracted), 'language',
+        'confidence', 'breakdown', 'pages_read', 'page_count' and
+        'stopped_early'.
+    """
+    from code_detector import analyze_code
+
+    futures = set()
+    try:
+        page_count = run_blocking(count_pages, path)
+        budget = min(page_count, PDF_MAX_PAGES)
+        executor = _get_executor()
+        futures.update(
+            executor.submit(extract_pages, path, list(range(start, min(start + PDF_PAGES_PER_TASK, budget))))
+            for start in range(0, budget, PDF_PAGES_PER_TASK)
+        )
+        pending = set(futures)
+
+        finished = {}
+        next_page = 0
+        page_texts = []
+        code_pages = []
+        code_chars = 0
+        stopped_early = False
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                for page_number, text in future.result():
+                    finished[page_number] = text
+
+            # Feed pages to the detector in order as soon as the prefix is complete
+            while next_page in finished:
+                text = finished.pop(next_page).strip()
+                next_page += 1
+                if not text:
+                    continue
+                page_texts.append(text)
+                if analyze_code(text)['score'] >= PDF_CODE_THRESHOLD:
+                    code_pages.append(text)
+                    code_chars += len(text)
+
+            if code_chars >= PDF_ENOUGH_CODE_CHARS:
+                stopped_early = True
+                break
+    finally:
+        # Tasks already running finish in the background (their output is
+        # dropped) and may still be opening the file
+        for future in futures:
+            future.cancel()
+        remove_when_done(path, futures)
+
+    text = '\n'.join(code_pages or page_texts)
+    analysis = analyze_code(text)
+    return {
+        'text': text,
+        'language': analysis['language'],
+        'confidence': analysis['score'],
+        'breakdown': analysis['breakdown'],
+        'pages_read': next_page,
+        'page_count': page_count,
+        'stopped_early': stopped_early or budget < page_count,
+    }
@@ -0,0 +1,146 @@
+"""
+Post Counters - Denormalized like/comment/save counts on posts
+posts.likes, posts.comments_count and posts.saves_count are adjusted inside
+the same flush (and therefore transaction) that inserts or deletes a
+PostLike, Comment or PostSave, as relative UPDATEs (likes = likes + 1), so
+concurrent requests never overwrite each other's increments and nothing
+recounts on write. A periodic reconciliation job repairs any drift, e.g.
+from bulk statements that bypass the ORM.
+"""
+
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Dict
+
+from sqlalchemy import event, func
+
+from database import db
+from models import Comment, Post, PostLike, PostSave
+
+# Seconds between reconciliation passes (0 disables the background job)
+POST_COUNTER_RECONCILE_INTERVAL = int(os.environ.get('POST_COUNTER_RECONCILE_INTERVAL', 3600))
+# Posts recounted per reconciliation query
+POST_COUNTER_RECONCILE_BATCH = 500
+
+# Child model -> posts column it is counted in
+COUNTED = (
+    (PostLike, 'likes'),
+    (Comment, 'comments_count'),
+    (PostSave, 'saves_count'),
+)
+
+_reconciler_started = False
+_reconciler_lock = threading.Lock()
+
+
+def _column_for(obj):
+    for model, column in COUNTED:
+        if isinstance(obj, model):
+            return column
+    return None
+
+
+def _collect_deltas(session) -> Dict[int, Dict[str, int]]:
+    """Per-post counter deltas implied by the objects in this flush."""
+    deltas = defaultdict(lambda: defaultdict(int))
+    for objects, step in ((session.new, 1), (session.deleted, -1)):
+        for obj in objects:
+            column = _column_for(obj)
+            if column and obj.post_id:
+                deltas[obj.post_id][column] += step
+    return {
+        post_id: {column: delta for column, delta in d.items() if delta}
+        for post_id, d in deltas.items() if any(d.values())
+    }
+
+
+def _after_flush(session, flush_context):
+    deltas = _collect_deltas(session)
+    if not deltas:
+        return
+    posts = Post.__table__
+    connection = session.connection()
+    for post_id, delta in deltas.items():
+        connection.execute(
+            posts.update().where(posts.c.id == post_id).values({
+                posts.c[column]: func.coalesce(posts.c[column], 0) + amount
+                for column, amount in delta.items()
+            })
+        )
+
+
+def reconcile(batch_size: int = POST_COUNTER_RECONCILE_BATCH) -> Dict[str, int]:
+    """
+    Recount likes, comments and saves for every post and fix counters that
+    drifted. Works through posts in id order, one batch per transaction, so
+    it is safe to run against live traffic: a batch's post rows are locked
+    (SELECT ... FOR UPDATE) before their likes, comments and saves are
+    counted, so a concurrent like either commits before the count (and is
+    included in it) or waits for the batch to commit and applies its delta
+    on top of the fixed value.
+
+    Returns:
+        Dict with 'posts' checked and 'fixed' posts.
+    """
+    posts = Post.__table__
+    checked = fixed = 0
+    last_id = 0
+
+    while True:
+        rows = db.session.execute(
+            db.select([posts.c.id] + [posts.c[column] for _, column in COUNTED])
+            .where(posts.c.id > last_id).order_by(posts.c.id).limit(batch_size)
+            .with_for_update()
+        ).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        post_ids = [row[0] for row in rows]
+
+        actual = {}
+        for model, column in COUNTED:
+            table = model.__table__
+            actual[column] = dict(db.session.execute(
+                db.select([table.c.post_id, func.count()])
+                .where(table.c.post_id.in_(post_ids))
+                .group_by(table.c.post_id)
+            ).fetchall())
+
+        for row in rows:
+            expected = {column: actual[column].get(row[0], 0) for _, column in COUNTED}
+            if any(row[column] != value for column, value in expected.items()):
+                db.session.execute(posts.update().where(posts.c.id == row[0]).values(**expected))
+                fixed += 1
+        db.session.commit()
+        checked += len(rows)
+
+    return {'posts': checked, 'fixed': fixed}
+
+
+def _reconcile_loop(app, interval):
+    while True:
+        time.sleep(interval)
+        with app.app_context():
+            try:
+                result = reconcile()
+                if result['fixed']:
+                    print(f"[Post counters] Reconciled {result['fixed']} of {result['posts']} posts")
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error reconciling post counters: {e}")
+            finally:
+                db.session.remove()
+
+
+def init_app(app, interval: int = POST_COUNTER_RECONCILE_INTERVAL):
+    """Hook counter maintenance into the session and start the reconciler."""
+    global _reconciler_started
+    if not event.contains(db.session, 'after_flush', _after_flush):
+        event.listen(db.session, 'after_flush', _after_flush)
+
+    with _reconciler_lock:
+        if interval > 0 and not _reconciler_started:
+            _reconciler_started = True
+            threading.Thread(target=_reconcile_loop, args=(app, interval), daemon=True).start()
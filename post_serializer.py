@@ -0,0 +1,91 @@
+"""
+Post Serializer - One JSON shape for posts, built with a fixed number of queries
+Every post listing (own posts, a user's posts, saved, liked, explore) goes
+through serialize_posts(): authors come from one IN query, the viewer's
+likes and saves from one IN query each, and counts from the denormalized
+columns on posts (plus likes still held by the like buffer), so a page costs the same number of queries whether it
+holds one post or a hundred.
+"""
+
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional
+
+from database import db
+from models import Post, PostLike, PostSave, User
+
+# Likes not yet written (like_buffer.LikeBuffer): anything with
+#   is_liked(viewer_id, post_id) -> True/False for a buffered toggle, else None
+#   pending_deltas(post_ids) -> {post_id: net likes not yet written}
+PendingLikes = Any
+
+
+def load_posts(post_ids: List[int]) -> List[Post]:
+    """Posts for ids in the given order (one query); missing ids are skipped."""
+    if not post_ids:
+        return []
+    posts = {post.id: post for post in Post.query.filter(Post.id.in_(post_ids)).all()}
+    return [posts[post_id] for post_id in post_ids if post_id in posts]
+
+
+def viewer_flags(post_ids: Iterable[int], viewer_id: str, pending: Optional[PendingLikes] = None):
+    """(liked ids, saved ids) of the viewer among post_ids: one IN query each."""
+    post_ids = list(post_ids)
+    liked = {
+        row[0] for row in db.session.query(PostLike.post_id)
+        .filter(PostLike.user_id == viewer_id, PostLike.post_id.in_(post_ids)).all()
+    }
+    saved = {
+        row[0] for row in db.session.query(PostSave.post_id)
+        .filter(PostSave.user_id == viewer_id, PostSave.post_id.in_(post_ids)).all()
+    }
+    if pending is not None:
+        for post_id in post_ids:
+            state = pending.is_liked(viewer_id, post_id)
+            if state is True:
+                liked.add(post_id)
+            elif state is False:
+                liked.discard(post_id)
+    return liked, saved
+
+
+def serialize_posts(posts: List[Post], viewer_id: str, following: Optional[FrozenSet[str]] = None,
+                    pending: Optional[PendingLikes] = None) -> List[Dict[str, Any]]:
+    """
+    JSON for posts, in order, as seen by viewer_id: three queries in total
+    (authors, likes, saves).
+
+    following: when given, adds 'is_friend_post'/'is_following_author'
+    (author in the set). pending: the like buffer, whose toggles override
+    the viewer's stored like state and whose unwritten likes (from every
+    user) are added to the counts.
+    """
+    if not posts:
+        return []
+    post_ids = [post.id for post in posts]
+    author_ids = {post.user_id for post in posts}
+    authors = {user.id: user for user in User.query.filter(User.id.in_(author_ids)).all()}
+    liked, saved = viewer_flags(post_ids, viewer_id, pending)
+    like_deltas = pending.pending_deltas(post_ids) if pending is not None else {}
+
+    result = []
+    for post in posts:
+        author = authors.get(post.user_id)
+        data = {
+            'id': post.id,
+            'user_id': post.user_id,
+            'author_name': author.full_name if author else 'Unknown',
+            'author_image': author.profile_image_url if author else None,
+            'code': post.code,
+            'language': post.language,
+            'description': post.description or '',
+            'likes': max(0, (post.likes or 0) + like_deltas.get(post.id, 0)),
+            'comments_count': post.comments_count or 0,
+            'created_at': post.created_at.isoformat(),
+            'liked': post.id in liked,
+            'saved': post.id in saved,
+        }
+        if following is not None:
+            data['is_friend_post'] = str(post.user_id) in following
+            data['is_following_author'] = str(post.user_id) in following
+        result.append(data)
+    return result
+
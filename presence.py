@@ -0,0 +1,171 @@
+"""
+Presence - In-memory online registry with batched last_seen persistence
+A user is online while any of their sockets is connected (connection counts
+are kept in the shared backplane store, so this holds across workers).
+State changes and heartbeats only touch memory; a background flusher writes
+the latest is_online/last_seen of every changed user to the database in
+one batch every PRESENCE_FLUSH_INTERVAL seconds.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import bindparam
+
+from backplane import SocketRegistry
+from database import db
+from models import User
+
+# Seconds between batched last_seen/is_online writes
+PRESENCE_FLUSH_INTERVAL = float(os.environ.get('PRESENCE_FLUSH_INTERVAL', 5))
+
+
+class PresenceService:
+    """
+    Online state from socket connection counts, last_seen from memory until
+    it has been flushed. Rapid reconnects (several tabs, page navigation)
+    collapse into a single pending row per user.
+    """
+
+    def __init__(self, app=None, sockets: Optional[SocketRegistry] = None,
+                 interval: float = PRESENCE_FLUSH_INTERVAL):
+        self.app = app
+        self.sockets = sockets or SocketRegistry()
+        self.interval = interval
+        # user_id -> (is_online, last_seen or None) awaiting flush
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flusher_started = False
+        self.flushes = 0
+        self.rows_written = 0
+
+    def start(self):
+        """Start the background flusher (once)."""
+        with self._lock:
+            if self.app is None or self.interval <= 0 or self._flusher_started:
+                return
+            self._flusher_started = True
+        threading.Thread(target=self._flush_loop, daemon=True).start()
+
+    def _queue(self, user_id: str, is_online: bool, last_seen: Optional[datetime] = None):
+        with self._lock:
+            previous = self._pending.get(user_id)
+            if last_seen is None and previous is not None:
+                last_seen = previous[1]
+            self._pending[user_id] = (is_online, last_seen)
+
+    def connect(self, sid: str, user_id: str) -> bool:
+        """Register a socket; True when this made the user come online."""
+        user_id = str(user_id)
+        came_online = self.sockets.connect(sid, user_id) == 1
+        if came_online:
+            self._queue(user_id, True)
+        return came_online
+
+    def disconnect(self, sid: str, user_id: Optional[str] = None) -> Tuple[Optional[str], bool, Optional[datetime]]:
+        """
+        Forget a socket. user_id is the fallback owner when the sid was never
+        registered (e.g. the session expired before connect).
+
+        Returns:
+            (user_id, whether the user went offline, their new last_seen).
+        """
+        owner, remaining = self.sockets.disconnect(sid)
+        if owner is None:
+            if user_id is None:
+                return None, False, None
+            owner = str(user_id)
+            remaining = self.sockets.connection_count(owner)
+        if remaining > 0:
+            return owner, False, None
+        now = datetime.utcnow()
+        self._queue(owner, False, now)
+        return owner, True, now
+
+    def touch(self, user_id: str):
+        """Heartbeat: refresh last_seen in memory without a database write."""
+        user_id = str(user_id)
+        self._queue(user_id, self.is_online(user_id), datetime.utcnow())
+
+    def is_online(self, user_id: str) -> bool:
+        return self.sockets.connection_count(str(user_id)) > 0
+
+    def last_seen(self, user_id: str, default: Optional[datetime] = None) -> Optional[datetime]:
+        """Unflushed last_seen if there is one, else default (the stored value)."""
+        with self._lock:
+            pending = self._pending.get(str(user_id))
+        if pending is not None and pending[1] is not None:
+            return pending[1]
+        return default
+
+    def status(self, user) -> Dict[str, Any]:
+        """Presence of a loaded User: {'is_online': bool, 'last_seen': datetime or None}."""
+        return {
+            'is_online': self.is_online(user.id),
+            'last_seen': self.last_seen(user.id, getattr(user, 'last_seen', None)),
+        }
+
+    def flush(self) -> int:
+        """Write pending presence in at most two executemany UPDATEs; returns rows queued."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        table = User.__table__
+        with_seen = [
+            {'uid': uid, 'online': online, 'seen': seen}
+            for uid, (online, seen) in pending.items() if seen is not None
+        ]
+        online_only = [
+            {'uid': uid, 'online': online}
+            for uid, (online, seen) in pending.items() if seen is None
+        ]
+        try:
+            if with_seen:
+                db.session.execute(
+                    table.update().where(table.c.id == bindparam('uid'))
+                    .values(is_online=bindparam('online'), last_seen=bindparam('seen')),
+                    with_seen
+                )
+            if online_only:
+                db.session.execute(
+                    table.update().where(table.c.id == bindparam('uid'))
+                    .values(is_online=bindparam('online')),
+                    online_only
+                )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            # Put the batch back unless newer state arrived meanwhile
+            with self._lock:
+                for uid, value in pending.items():
+                    self._pending.setdefault(uid, value)
+            raise
+        self.flushes += 1
+        self.rows_written += len(pending)
+        return len(pending)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.interval)
+            with self.app.app_context():
+                try:
+                    self.flush()
+                except Exception as e:
+                    print(f"Error flushing presence: {e}")
+                finally:
+                    db.session.remove()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            'pending': pending,
+            'flushes': self.flushes,
+            'rows_written': self.rows_written,
+            'flush_interval': self.interval,
+        }
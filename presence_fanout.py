@@ -0,0 +1,213 @@
+"""
+Presence Fanout - Targeted delivery of online/offline changes
+A user's presence only matters to people who can see them in a chat list:
+their conversation partners, followers and the users they follow. That
+interest set is loaded with one query and cached; changes are held for a
+short debounce window so a reconnect or a tab switch that ends where it
+started sends nothing, and each surviving change is one emit addressed to
+the interested users that are online (looked up for those users only).
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Optional
+
+from sqlalchemy import case, union
+
+from database import db
+from models import Conversation, Follower
+
+# Seconds a user's interest set is reused before it is reloaded
+PRESENCE_INTEREST_TTL = float(os.environ.get('PRESENCE_INTEREST_TTL', 300))
+
+# Users whose interest sets are kept in memory
+PRESENCE_INTEREST_CACHE_SIZE = int(os.environ.get('PRESENCE_INTEREST_CACHE_SIZE', 10000))
+
+# Seconds presence changes are held so flaps can cancel out
+PRESENCE_DEBOUNCE = float(os.environ.get('PRESENCE_DEBOUNCE', 1.0))
+
+# Users whose last sent state is remembered; forgetting one only risks a repeated update
+PRESENCE_LAST_SENT_SIZE = int(os.environ.get('PRESENCE_LAST_SENT_SIZE', 100000))
+
+# Seconds before changes are retried when their recipients could not be resolved
+PRESENCE_RETRY_DELAY = 5.0
+
+
+def load_interest_set(user_id: str) -> FrozenSet[str]:
+    """Users who follow, are followed by, or have a conversation with user_id (one query)."""
+    user_id = str(user_id)
+    conversations = Conversation.__table__
+    followers = Follower.__table__
+    partner = case(
+        [(conversations.c.user1_id == user_id, conversations.c.user2_id)],
+        else_=conversations.c.user1_id
+    )
+    query = union(
+        db.select([followers.c.follower_id]).where(followers.c.user_id == user_id),
+        db.select([followers.c.user_id]).where(followers.c.follower_id == user_id),
+        db.select([partner]).where(
+            (conversations.c.user1_id == user_id) | (conversations.c.user2_id == user_id)
+        ),
+    )
+    return frozenset(str(row[0]) for row in db.session.execute(query) if str(row[0]) != user_id)
+
+
+class InterestCache:
+    """Thread-safe LRU of user_id -> interest set with a TTL."""
+
+    def __init__(self, maxsize: int = PRESENCE_INTEREST_CACHE_SIZE, ttl: float = PRESENCE_INTEREST_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: str) -> FrozenSet[str]:
+        """Cached interest set, loading it (needs an app context) on a miss."""
+        user_id = str(user_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._data.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        interested = load_interest_set(user_id)
+        with self._lock:
+            self._data[user_id] = (now + self.ttl, interested)
+            self._data.move_to_end(user_id)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return interested
+
+    def invalidate(self, *user_ids: str):
+        """Drop cached sets after a follow or a first conversation changes them."""
+        with self._lock:
+            for user_id in user_ids:
+                self._data.pop(str(user_id), None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+            }
+
+
+interests = InterestCache()
+
+
+class PresenceFanout:
+    """
+    Debounces presence changes and sends each one as a single
+    'user_presence_update' addressed to the online members of the
+    subject's interest set.
+    """
+
+    def __init__(self, app, socket_io, presence, delay: float = PRESENCE_DEBOUNCE, cache: InterestCache = None):
+        self.app = app
+        self.socketio = socket_io
+        self.presence = presence
+        self.delay = delay
+        self.cache = cache or interests
+        # user_id -> latest payload within the current window
+        self._pending = {}
+        # user_id -> is_online last sent, to drop changes that cancelled out (LRU)
+        self._last_sent = OrderedDict()
+        self._timer = None
+        self._lock = threading.Lock()
+        self.published = 0
+        self.emitted = 0
+        self.coalesced = 0
+        self.failed = 0
+
+    def _schedule(self, delay: float):
+        """Arm the flush timer unless one is pending (caller holds the lock)."""
+        if self._timer is None:
+            self._timer = threading.Timer(delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def publish(self, user_id: str, is_online: bool, last_seen_iso: Optional[str] = None):
+        payload = {'user_id': str(user_id), 'is_online': is_online}
+        if last_seen_iso is not None:
+            payload['last_seen'] = last_seen_iso
+        with self._lock:
+            self.published += 1
+            if str(user_id) in self._pending:
+                self.coalesced += 1
+            self._pending[str(user_id)] = payload
+            if self.delay <= 0:
+                flush_now = True
+            else:
+                flush_now = False
+                self._schedule(self.delay)
+        if flush_now:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._timer = None
+            changed = {}
+            for user_id, payload in pending.items():
+                if self._last_sent.get(user_id) == payload['is_online']:
+                    self.coalesced += 1
+                    continue
+                changed[user_id] = payload
+        if not changed:
+            return
+
+        with self.app.app_context():
+            try:
+                interested = {user_id: self.cache.get(user_id) for user_id in changed}
+                online = self.presence.sockets.online_among(set().union(*interested.values()))
+                recipients = {user_id: interested[user_id] & online for user_id in changed}
+            except Exception as e:
+                print(f"Error resolving presence recipients: {e}")
+                self._requeue(changed)
+                return
+            finally:
+                db.session.remove()
+
+        with self._lock:
+            for user_id, payload in changed.items():
+                self._last_sent[user_id] = payload['is_online']
+                self._last_sent.move_to_end(user_id)
+            while len(self._last_sent) > PRESENCE_LAST_SENT_SIZE:
+                self._last_sent.popitem(last=False)
+
+        for user_id, payload in changed.items():
+            rooms = [f'user_{uid}' for uid in sorted(recipients[user_id])]
+            if rooms:
+                self.socketio.emit('user_presence_update', payload, room=rooms)
+                self.emitted += 1
+
+    def _requeue(self, changed: Dict[str, Dict[str, Any]]):
+        """Put changes that could not be sent back in the queue (newer ones win) and retry later."""
+        with self._lock:
+            self.failed += 1
+            for user_id, payload in changed.items():
+                self._pending.setdefault(user_id, payload)
+            self._schedule(max(self.delay, PRESENCE_RETRY_DELAY))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'published': self.published,
+                'emitted': self.emitted,
+                'coalesced': self.coalesced,
+                'failed': self.failed,
+                'debounce': self.delay,
+                'interest_cache': self.cache.stats(),
+            }
@@ -0,0 +1,161 @@
+"""
+Profile Service - Cursor-paginated profile grids and cached header counts
+A profile's posts, saved and liked tabs are served a page at a time:
+posts are keyset-paginated on (created_at, id), saved and liked posts on
+the id of the save/like row (most recent first), so deep pages cost the
+same as the first. The header counts (posts, followers, following) are
+computed in one query and cached per user until a post or follow changes
+them or the TTL expires.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, func, or_
+
+from database import db
+from models import Follower, Post, PostLike, PostSave
+
+# Posts per profile grid page by default / at most
+PROFILE_PAGE_SIZE = int(os.environ.get('PROFILE_PAGE_SIZE', 24))
+PROFILE_MAX_PAGE_SIZE = 60
+
+# Seconds cached header counts are reused (bounds staleness of edits made outside the routes)
+PROFILE_COUNTS_TTL = float(os.environ.get('PROFILE_COUNTS_TTL', 300))
+
+# Users whose header counts are kept in memory
+PROFILE_COUNTS_CACHE_SIZE = int(os.environ.get('PROFILE_COUNTS_CACHE_SIZE', 10000))
+
+POSTS = 'posts'
+SAVED = 'saved'
+LIKED = 'liked'
+
+# Grid -> row model whose id orders it
+_MARKED = {SAVED: PostSave, LIKED: PostLike}
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _decode_posts_cursor(cursor: str) -> Tuple[datetime, int]:
+    """'<created_at iso>|<id>' of the last post on the previous page."""
+    parts = cursor.split('|')
+    if len(parts) != 2:
+        raise InvalidCursor(cursor)
+    try:
+        return datetime.fromisoformat(parts[0]), int(parts[1])
+    except ValueError:
+        raise InvalidCursor(cursor)
+
+
+def grid_page(grid: str, user_id: str, cursor: Optional[str] = None,
+              limit: int = PROFILE_PAGE_SIZE) -> Tuple[List[Post], Optional[str]]:
+    """
+    One page of a profile grid (POSTS, SAVED or LIKED), newest first.
+
+    Returns:
+        (posts, next_cursor); next_cursor is None on the last page.
+    """
+    limit = max(1, min(limit, PROFILE_MAX_PAGE_SIZE))
+
+    if grid == POSTS:
+        query = Post.query.filter(Post.user_id == user_id)
+        if cursor:
+            created_at, post_id = _decode_posts_cursor(cursor)
+            query = query.filter(or_(
+                Post.created_at < created_at,
+                and_(Post.created_at == created_at, Post.id < post_id)
+            ))
+        posts = query.order_by(Post.created_at.desc(), Post.id.desc()).limit(limit + 1).all()
+        if len(posts) <= limit:
+            return posts, None
+        posts = posts[:limit]
+        return posts, f"{posts[-1].created_at.isoformat()}|{posts[-1].id}"
+
+    model = _MARKED[grid]
+    query = (
+        db.session.query(model.id, Post)
+        .join(Post, Post.id == model.post_id)
+        .filter(model.user_id == user_id)
+    )
+    if cursor:
+        try:
+            query = query.filter(model.id < int(cursor))
+        except ValueError:
+            raise InvalidCursor(cursor)
+    rows = query.order_by(model.id.desc()).limit(limit + 1).all()
+    next_cursor = str(rows[limit - 1][0]) if len(rows) > limit else None
+    return [post for _, post in rows[:limit]], next_cursor
+
+
+def load_counts(user_id: str) -> Dict[str, int]:
+    """Posts, followers and following of a user, in one query."""
+    posts = Post.__table__
+    followers = Follower.__table__
+    row = db.session.execute(db.select([
+        db.select([func.count()]).where(posts.c.user_id == user_id).as_scalar(),
+        db.select([func.count()]).where(followers.c.user_id == user_id).as_scalar(),
+        db.select([func.count()]).where(followers.c.follower_id == user_id).as_scalar(),
+    ])).fetchone()
+    return {'posts': row[0] or 0, 'followers': row[1] or 0, 'following': row[2] or 0}
+
+
+class ProfileCounts:
+    """Thread-safe LRU of user id -> header counts with a TTL."""
+
+    def __init__(self, maxsize: int = PROFILE_COUNTS_CACHE_SIZE, ttl: float = PROFILE_COUNTS_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # user id -> (expires, counts)
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, user_id: str) -> Dict[str, int]:
+        user_id = str(user_id)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._data.get(user_id)
+            if cached is not None and cached[0] > now:
+                self._data.move_to_end(user_id)
+                self.hits += 1
+                return dict(cached[1])
+            self.misses += 1
+
+        counts = load_counts(user_id)
+        with self._lock:
+            self._data[user_id] = (now + self.ttl, counts)
+            self._data.move_to_end(user_id)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return dict(counts)
+
+    def invalidate(self, *user_ids: str):
+        """Drop users' counts, e.g. after they post or a follow between them changes."""
+        with self._lock:
+            for user_id in user_ids:
+                if self._data.pop(str(user_id), None) is not None:
+                    self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+                'invalidations': self.invalidations,
+            }
+
+
+profile_counts = ProfileCounts()
@@ -0,0 +1,150 @@
+"""
+Read Receipts - Bulk seen/delivered processing for chat messages
+Marking messages read is a single UPDATE (with RETURNING where the
+database supports it) that also settles the denormalized unread counters.
+Delivery acks are collected for a short window and sent to each sender as
+one coalesced 'message_status' event.
+"""
+
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import and_, case
+
+from database import db
+from models import Conversation, Message
+import unread_counters
+
+# Seconds delivery acks are held before being flushed as one event per sender
+DELIVERY_ACK_DELAY = 0.25
+
+
+def _supports_returning() -> bool:
+    return bool(getattr(db.session.get_bind().dialect, 'implicit_returning', False))
+
+
+def mark_read(receiver_id: str, message_ids: Optional[Iterable[int]] = None,
+              conversation_id: Optional[int] = None) -> Dict[str, List[int]]:
+    """
+    Mark unread messages addressed to receiver_id as read in one UPDATE.
+
+    Limits the update to message_ids and/or conversation_id when given, and
+    decrements the conversation and per-user unread counters by the rows
+    actually changed. The caller commits.
+
+    Returns:
+        Dict of sender_id -> ids that went from unread to read.
+    """
+    table = Message.__table__
+    conditions = [table.c.receiver_id == str(receiver_id), table.c.is_read == False]  # noqa: E712
+    if message_ids is not None:
+        message_ids = [int(mid) for mid in message_ids]
+        if not message_ids:
+            return {}
+        conditions.append(table.c.id.in_(message_ids))
+    if conversation_id is not None:
+        conditions.append(table.c.conversation_id == conversation_id)
+    where = and_(*conditions)
+
+    if _supports_returning():
+        rows = db.session.execute(
+            table.update().where(where).values(is_read=True)
+            .returning(table.c.id, table.c.sender_id, table.c.conversation_id)
+        ).fetchall()
+    else:
+        rows = db.session.execute(
+            db.select([table.c.id, table.c.sender_id, table.c.conversation_id]).where(where)
+        ).fetchall()
+        if rows:
+            db.session.execute(
+                table.update().where(and_(where, table.c.id.in_([r[0] for r in rows]))).values(is_read=True)
+            )
+    if not rows:
+        return {}
+
+    by_sender = defaultdict(list)
+    by_conversation = defaultdict(int)
+    for message_id, sender_id, conv_id in rows:
+        by_sender[str(sender_id)].append(message_id)
+        if conv_id is not None:
+            by_conversation[conv_id] += 1
+
+    conversations = Conversation.__table__
+    for conv_id, count in by_conversation.items():
+        # Pin updated_at: the list is ordered and paginated on it, and reading
+        # a chat must not move it (the column's onupdate would bump it)
+        values = {'updated_at': conversations.c.updated_at}
+        for side, column in (('user1_id', 'user1_unread'), ('user2_id', 'user2_unread')):
+            col = conversations.c[column]
+            values[column] = case(
+                [(conversations.c[side] != str(receiver_id), col), (col > count, col - count)],
+                else_=0
+            )
+        db.session.execute(conversations.update().where(conversations.c.id == conv_id).values(**values))
+
+    unread_counters.adjust(receiver_id, unread_messages=-len(rows))
+    return dict(by_sender)
+
+
+def emit_seen(socket_io, seen_by_sender: Dict[str, List[int]]):
+    """Send one 'seen' message_status event to each sender."""
+    for sender_id, ids in seen_by_sender.items():
+        socket_io.emit('message_status', {
+            'message_ids': ids,
+            'status': 'seen'
+        }, room=f'user_{sender_id}')
+
+
+class DeliveryAckBatcher:
+    """
+    Buffers 'message_delivered' acks and flushes them every
+    DELIVERY_ACK_DELAY seconds: one query validates the whole batch and each
+    sender gets a single event listing all delivered ids.
+    """
+
+    def __init__(self, app, socket_io, delay: float = DELIVERY_ACK_DELAY):
+        self.app = app
+        self.socketio = socket_io
+        self.delay = delay
+        self._pending = set()
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def add(self, receiver_id: str, message_id: int):
+        with self._lock:
+            self._pending.add((str(receiver_id), int(message_id)))
+            if self._timer is None:
+                self._timer = threading.Timer(self.delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, set()
+            self._timer = None
+        if not pending:
+            return
+
+        with self.app.app_context():
+            try:
+                rows = db.session.query(Message.id, Message.sender_id, Message.receiver_id).filter(
+                    Message.id.in_({message_id for _, message_id in pending})
+                ).all()
+            except Exception as e:
+                print(f"Error flushing delivery acks: {e}")
+                return
+            finally:
+                db.session.remove()
+
+        # Only the message's receiver may ack it
+        by_sender = defaultdict(list)
+        for message_id, sender_id, receiver_id in rows:
+            if (str(receiver_id), message_id) in pending:
+                by_sender[str(sender_id)].append(message_id)
+
+        for sender_id, ids in by_sender.items():
+            self.socketio.emit('message_status', {
+                'message_ids': sorted(ids),
+                'status': 'delivered'
+            }, room=f'user_{sender_id}')
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Retention - Move old rows out of the hot notification/message/history tables
+Rows past their retention age are copied into archived_records as
+zlib-compressed JSON and deleted from the source table. Work is done in
+small id-ordered batches, each in its own transaction with a short pause in
+between, so the job can run against live traffic; rows are locked while a
+batch handles them (skipped if another worker holds them) and archived at
+most once per (source, id).
+
+Only rows no longer in use are eligible: read notifications, read messages
+that are not a conversation's latest message, and code history entries.
+A retention of 0 days keeps that table forever. Rows that only describe an
+archived row (a notification's actors) are deleted in the same batch.
+Archived code history is still listed by /api/history/list (load_archived).
+
+Usage: python retention.py [--dry-run] [--source notifications|messages|code_history ...]
+"""
+
+import json
+import os
+import threading
+import time
+import zlib
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import exists, func
+from sqlalchemy.exc import IntegrityError
+
+from database import db
+from models import ArchivedRecord, CodeHistory, Conversation, Message, Notification, NotificationActor
+
+# Days a read notification stays in the notifications table (0 keeps forever)
+NOTIFICATION_RETENTION_DAYS = int(os.environ.get('NOTIFICATION_RETENTION_DAYS', 90))
+# Days a read message stays in the messages table; off by default because
+# archived messages no longer appear in chat history
+MESSAGE_RETENTION_DAYS = int(os.environ.get('MESSAGE_RETENTION_DAYS', 0))
+# Days a code history entry stays in the code_history table (archived entries
+# are still listed in the user's history)
+CODE_HISTORY_RETENTION_DAYS = int(os.environ.get('CODE_HISTORY_RETENTION_DAYS', 180))
+
+# Rows archived per transaction
+RETENTION_BATCH_SIZE = int(os.environ.get('RETENTION_BATCH_SIZE', 500))
+# Seconds to sleep between batches so live queries get the database
+RETENTION_BATCH_PAUSE = float(os.environ.get('RETENTION_BATCH_PAUSE', 0.2))
+# Seconds between background retention passes (0 disables the background job)
+RETENTION_INTERVAL = int(os.environ.get('RETENTION_INTERVAL', 86400))
+
+# table: source model table; owner: column stored as archived_records.user_id;
+# eligible(table, cutoff): rows that may be archived; dependents: (table, column)
+# pairs whose rows point at an archived row and are deleted with it (explicitly,
+# since SQLite does not enforce ON DELETE CASCADE without PRAGMA foreign_keys)
+Source = namedtuple('Source', 'table owner days eligible dependents')
+
+
+def _read_notifications(table, cutoff):
+    return (table.c.read_status == True) & (table.c.created_at < cutoff)  # noqa: E712
+
+
+def _read_messages(table, cutoff):
+    conversations = Conversation.__table__
+    is_latest = exists().where(conversations.c.last_message_id == table.c.id)
+    return (table.c.is_read == True) & (table.c.created_at < cutoff) & ~is_latest  # noqa: E712
+
+
+def _code_history(table, cutoff):
+    return table.c.created_at < cutoff
+
+
+SOURCES = {
+    'notifications': Source(
+        Notification.__table__, 'user_id', NOTIFICATION_RETENTION_DAYS, _read_notifications,
+        ((NotificationActor.__table__, 'notification_id'),),
+    ),
+    'messages': Source(Message.__table__, 'sender_id', MESSAGE_RETENTION_DAYS, _read_messages, ()),
+    'code_history': Source(CodeHistory.__table__, 'user_id', CODE_HISTORY_RETENTION_DAYS, _code_history, ()),
+}
+
+_state_lock = threading.Lock()
+_running = False
+_started = False
+_last_run: Dict[str, Any] = {}
+_totals = {name: 0 for name in SOURCES}
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def pack(row) -> bytes:
+    """Compressed JSON of a result row."""
+    return zlib.compress(json.dumps(dict(row), default=_json_default).encode('utf-8'))
+
+
+def unpack(payload: bytes) -> Dict[str, Any]:
+    return json.loads(zlib.decompress(payload).decode('utf-8'))
+
+
+def archive_batch(name: str, cutoff: datetime, after_id: int = 0,
+                  batch_size: int = RETENTION_BATCH_SIZE) -> List[int]:
+    """
+    Archive and delete up to batch_size eligible rows of one source with
+    id > after_id, in one transaction.
+
+    Returns:
+        Ids of the rows handled (empty when nothing is left).
+    """
+    source = SOURCES[name]
+    table = source.table
+    rows = db.session.execute(
+        db.select([table])
+        .where((table.c.id > after_id) & source.eligible(table, cutoff))
+        .order_by(table.c.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ).fetchall()
+    if not rows:
+        return []
+
+    now = datetime.now()
+    ids = [row.id for row in rows]
+    db.session.execute(ArchivedRecord.__table__.insert(), [
+        {
+            'source': name,
+            'source_id': row.id,
+            'user_id': row[source.owner],
+            'created_at': row.created_at,
+            'archived_at': now,
+            'payload': pack(row),
+        }
+        for row in rows
+    ])
+    for dependent, column in source.dependents:
+        db.session.execute(dependent.delete().where(dependent.c[column].in_(ids)))
+    db.session.execute(table.delete().where(table.c.id.in_(ids)))
+    db.session.commit()
+    return ids
+
+
+def count_eligible(name: str, cutoff: datetime) -> int:
+    source = SOURCES[name]
+    return db.session.execute(
+        db.select([func.count()]).select_from(source.table).where(source.eligible(source.table, cutoff))
+    ).scalar()
+
+
+def run(sources: Optional[Iterable[str]] = None, batch_size: int = RETENTION_BATCH_SIZE,
+        pause: float = RETENTION_BATCH_PAUSE, dry_run: bool = False,
+        progress: Optional[Callable[[str, int], None]] = None) -> Dict[str, int]:
+    """
+    One retention pass over the given sources (default: all with a
+    retention period). progress(source, archived_so_far) is called after
+    every batch.
+
+    Returns:
+        Rows archived per source (rows eligible, when dry_run).
+    """
+    global _running
+    with _state_lock:
+        if _running:
+            return {}
+        _running = True
+    started = datetime.now()
+    result = {}
+    try:
+        for name in sources or SOURCES:
+            source = SOURCES[name]
+            if source.days <= 0:
+                continue
+            cutoff = datetime.now() - timedelta(days=source.days)
+            if dry_run:
+                result[name] = count_eligible(name, cutoff)
+                continue
+
+            archived = 0
+            last_id = 0
+            while True:
+                try:
+                    ids = archive_batch(name, cutoff, last_id, batch_size)
+                except IntegrityError:
+                    # Another worker archived this batch first
+                    db.session.rollback()
+                    break
+                if not ids:
+                    break
+                last_id = ids[-1]
+                archived += len(ids)
+                with _state_lock:
+                    _totals[name] += len(ids)
+                if progress:
+                    progress(name, archived)
+                if pause > 0:
+                    time.sleep(pause)
+            result[name] = archived
+    finally:
+        with _state_lock:
+            _running = False
+            if not dry_run:
+                _last_run.update({
+                    'started_at': started.isoformat(),
+                    'finished_at': datetime.now().isoformat(),
+                    'archived': result,
+                })
+    return result
+
+
+def load_archived(name: str, user_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+    """A user's archived rows of one source, newest first, as dicts."""
+    records = ArchivedRecord.query.filter_by(source=name, user_id=str(user_id)) \
+        .order_by(ArchivedRecord.created_at.desc()).limit(limit).all()
+    return [unpack(record.payload) for record in records]
+
+
+def stats() -> Dict[str, Any]:
+    with _state_lock:
+        return {
+            'running': _running,
+            'retention_days': {name: source.days for name, source in SOURCES.items()},
+            'archived_total': dict(_totals),
+            'last_run': dict(_last_run),
+            'interval': RETENTION_INTERVAL,
+        }
+
+
+def _print_progress(name: str, archived: int):
+    print(f"[Retention] {name}: {archived} rows archived")
+
+
+def _retention_loop(app, interval):
+    while True:
+        time.sleep(interval)
+        with app.app_context():
+            try:
+                result = run(progress=_print_progress)
+                if any(result.values()):
+                    print(f"[Retention] Pass complete: {result}")
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error running retention: {e}")
+            finally:
+                db.session.remove()
+
+
+def init_app(app, interval: int = RETENTION_INTERVAL):
+    """Start the background retention job (once per process)."""
+    global _started
+    with _state_lock:
+        if interval <= 0 or _started:
+            return
+        _started = True
+    threading.Thread(target=_retention_loop, args=(app, interval), daemon=True).start()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Archive old notifications, messages and code history')
+    parser.add_argument('--dry-run', action='store_true', help='only count eligible rows')
+    parser.add_argument('--source', action='append', choices=sorted(SOURCES))
+    parser.add_argument('--batch-size', type=int, default=RETENTION_BATCH_SIZE)
+    args = parser.parse_args()
+
+    os.environ.setdefault('RETENTION_INTERVAL', '0')
+    from app import app
+
+    with app.app_context():
+        result = run(args.source, batch_size=args.batch_size, dry_run=args.dry_run, progress=_print_progress)
+    label = 'eligible' if args.dry_run else 'archived'
+    for name, count in result.items():
+        print(f"{name}: {count} rows {label}")
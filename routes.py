@@ -4,6 +4,7 @@ import uuid
 from flask_login import current_user, login_user, logout_user
 from flask_socketio import emit, join_room
 from database import db
+from sqlalchemy import and_, or_, case
 from models import (
     User,
     Friendship,
@@ -43,32 +44,119 @@ running_processes = {}
 # Per-session metadata for idle timeout (last_activity from output or input)
 running_process_meta = {}
 
+# Messages returned per page of chat history (client may ask for up to the max)
+MESSAGES_PAGE_SIZE = 50
+MESSAGES_MAX_PAGE_SIZE = 200
+# Conversations returned per page of the chat list
+CONVERSATIONS_PAGE_SIZE = 30
+CONVERSATIONS_MAX_PAGE_SIZE = 100
+
+# Notifications returned per page of the notifications list
+NOTIFICATIONS_PAGE_SIZE = 30
+NOTIFICATIONS_MAX_PAGE_SIZE = 100
+
 # Global Runner instance
 code_runner_instance = None
 from code_runner import CodeRunner
 
+# Global OCR job queue (process pool is started on first upload)
+ocr_job_queue = None
+from ocr_jobs import OcrJobQueue
+
+# On-disk cache of OCR/PDF extraction results keyed by upload digest
+extraction_cache = None
+from extraction_cache import ExtractionCache
+
+import unread_counters
+
+# Coalesces message_delivered acks into one event per sender
+delivery_ack_batcher = None
+from read_receipts import DeliveryAckBatcher
+import read_receipts
+import chat_service
+
+# Online state from socket counts; last_seen written in batches
+presence = None
+from presence import PresenceService
+
+# Sends presence changes only to interested, online users
+presence_fanout = None
+from presence_fanout import PresenceFanout, interests as presence_interests
+
+# Background "new post" notifications to followers
+notification_fanout = None
+from notification_fanout import NotificationFanoutQueue
+
+# Throttled pushes for grouped like/comment notifications
+notification_pushes = None
+import notification_aggregation
+
+import retention
+
+# Paginated explore feed with a per-viewer page cache
+import feed_service
+import post_serializer
+# Paginated profile grids and cached profile header counts
+import profile_service
+# Threaded comments with paginated replies
+import comment_threads
+# In-memory follow relationships for per-item follow checks
+import follow_graph
+import post_counters
+
+# Collapses rapid like/unlike toggles into batched writes
+like_buffer = None
+from like_buffer import LikeBuffer
+
 
 def init_app(flask_app, flask_socketio):
     """Initialize the routes with the Flask app and SocketIO instances"""
-    global app, socketio, code_runner_instance
+    global app, socketio, code_runner_instance, ocr_job_queue, extraction_cache, delivery_ack_batcher, presence, presence_fanout, notification_fanout, notification_pushes, like_buffer
     app = flask_app
     socketio = flask_socketio
     code_runner_instance = CodeRunner(socketio)
+    extraction_cache = ExtractionCache()
+    ocr_job_queue = OcrJobQueue(socketio, cache=extraction_cache)
+    unread_counters.init_app(app)
+    retention.init_app(app)
+    post_counters.init_app(app)
+    delivery_ack_batcher = DeliveryAckBatcher(app, socketio)
+    presence = PresenceService(app)
+    presence.start()
+    presence_fanout = PresenceFanout(app, socketio, presence)
+    notification_fanout = NotificationFanoutQueue(app, socketio, presence)
+    notification_pushes = notification_aggregation.NotificationPushThrottle(socketio)
+    like_buffer = LikeBuffer(app, socketio, notification_pushes)
     register_routes()
     register_socketio_events()
 
 def get_or_create_conversation(user1_id, user2_id):
     """Helper to get or create a conversation between two users"""
     # Sort IDs to ensure consistency
-    ids = sorted([user1_id, user2_id])
-    u1, u2 = ids[0], ids[1]
+    u1, u2 = chat_service.ConversationIdCache.key_for(user1_id, user2_id)
     
-    conversation = Conversation.query.filter_by(user1_id=u1, user2_id=u2).first()
-    if not conversation:
-        conversation = Conversation(user1_id=u1, user2_id=u2)
-        db.session.add(conversation)
+    conv_id, created = chat_service.resolve_conversation_id(u1, u2)
+    if created:
         db.session.commit()
-    return conversation
+        chat_service.conversation_ids.put((u1, u2), conv_id)
+        presence_interests.invalidate(u1, u2)
+    return Conversation.query.get(conv_id)
+
+def emit_unread_count(user_id):
+    """Helper to emit unread count update for a user"""
+    try:
+        total_unread = unread_counters.get_counts(user_id)['messages']
+        # For chat interface unread counts
+        socketio.emit('unread_count_update', {
+            'unread_count': total_unread
+        }, room=f'user_{user_id}')
+        # For general navbar badge update
+        socketio.emit('unread_badge_update', {
+            'count': total_unread
+        }, room=f'user_{user_id}')
+    except Exception as e:
+        print(f"Error emitting unread count: {e}")
+
 
 def require_login(f):
     @wraps(f)
@@ -104,28 +192,13 @@ def register_routes():
                 .all()
             )
 
+            # Following / pending request status of every result from the follow graph
+            statuses = follow_graph.graph.statuses(current_user.id, [user.id for user in users])
+
             user_list = []
             for user in users:
-                # Check if current user already follows this user
-                is_following = (
-                    Follower.query.filter_by(
-                        user_id=user.id, follower_id=current_user.id
-                    ).first()
-                    is not None
-                )
-                # Check if there's a pending follow request from current user to this user
-                pending_request = FollowRequest.query.filter_by(
-                    from_user_id=current_user.id,
-                    to_user_id=user.id,
-                    status='pending'
-                ).first()
-
-                if is_following:
-                    follow_status = 'following'
-                elif pending_request:
-                    follow_status = 'pending'
-                else:
-                    follow_status = 'none'
+                follow_status = statuses[user.id]
+                is_following = follow_status == 'following'
 
                 user_list.append(
                     {
@@ -153,37 +226,23 @@ def register_routes():
             return "User not found", 404
         
         # Check if current user is following this user
-        is_following = Follower.query.filter_by(
-            user_id=user_id,
-            follower_id=current_user.id
-        ).first() is not None
+        is_following = follow_graph.graph.follows(current_user.id, user_id)
 
         # Check if target user is following current user (for follow back functionality)
-        is_following_me = Follower.query.filter_by(
-            user_id=current_user.id,
-            follower_id=user_id
-        ).first() is not None
+        is_following_me = follow_graph.graph.follows(user_id, current_user.id)
 
         # Check if there is a pending follow request from current user to target user
-        has_pending_request = FollowRequest.query.filter_by(
-            from_user_id=current_user.id,
-            to_user_id=user_id,
-            status='pending'
-        ).first() is not None
+        has_pending_request = follow_graph.graph.requested(current_user.id, user_id)
 
         # Check if current user is viewing their own profile
         is_current_user = (current_user.id == user_id)
         
-        # Calculate post count
-        post_count = Post.query.filter_by(user_id=user_id).count()
-        posts = Post.query.filter_by(user_id=user_id).order_by(Post.created_at.desc()).all()
-        
-        # Calculate follower and following counts
-        follower_count = Follower.query.filter_by(user_id=user_id).count()
-        following_count = Follower.query.filter_by(follower_id=user_id).count()
+        # Header counts are cached; only the first page of posts is rendered,
+        # the rest is fetched by infinite scroll from /api/user/<id>/posts
+        counts = profile_service.profile_counts.get(user_id)
+        posts, next_cursor = profile_service.grid_page(profile_service.POSTS, user_id)
+        posts = post_serializer.serialize_posts(posts, current_user.id, pending=like_buffer)
         
-        # For now, pass default values for the other required variables
-        # In a full implementation, these would be fetched from the database
         return render_template('user_profile.html', 
                              user=current_user,  # Current logged-in user
                              target_user=user,   # User whose profile is being viewed
@@ -191,10 +250,11 @@ def register_routes():
                              is_following_me=is_following_me,  # Whether target user is following current user
                              has_pending_request=has_pending_request,
                              is_current_user=is_current_user,
-                             post_count=post_count,
-                             follower_count=follower_count,
-                             following_count=following_count,
-                             posts=posts)
+                             post_count=counts['posts'],
+                             follower_count=counts['followers'],
+                             following_count=counts['following'],
+                             posts=posts,
+                             next_cursor=next_cursor)
 
     @app.route('/api/follow-user', methods=['POST'])
     @require_login
@@ -278,8 +338,7 @@ def register_routes():
                 return jsonify({'success': False, 'error': 'User not found'}), 404
             
             # Check if already following
-            existing_follower = Follower.query.filter_by(user_id=to_user_id, follower_id=current_user.id).first()
-            if existing_follower:
+            if follow_graph.graph.follows(current_user.id, to_user_id):
                 return jsonify({'success': False, 'error': 'You are already following this user'}), 400
             
             # Check if follow request already exists
@@ -307,6 +366,8 @@ def register_routes():
                 db.session.add(new_request)
                 db.session.commit()
 
+            follow_graph.graph.invalidate(current_user.id)
+
             # Create notification for the target user
             try:
                 follow_req = (
@@ -387,13 +448,14 @@ def register_routes():
 
             user_list = []
             for user in users:
-                last_seen = getattr(user, 'last_seen', None)
+                status = presence.status(user)
+                last_seen = status['last_seen']
                 user_list.append({
                     'id': user.id,
                     'name': getattr(user, 'full_name', None) or user.username or 'User',
                     'username': user.username,
                     'image': user.profile_image_url,
-                    'is_online': getattr(user, 'is_online', False),
+                    'is_online': status['is_online'],
                     'last_seen': last_seen.isoformat() if last_seen else None
                 })
 
@@ -419,43 +481,16 @@ def register_routes():
 
         try:
 
-            # Get all users that the current user is following (using Follower model)
-
-            followed_users = db.session.query(User).join(
-
-                Follower, 
-
-                (Follower.user_id == User.id) & (Follower.follower_id == current_user.id)
-
-            ).all()
-
-            
-
-            # Also get users who are following the current user (for mutual follows)
-
-            followers = db.session.query(User).join(
+            # Users the current user follows plus users following them (for
+            # mutual follows), from the follow graph; one query for the rows
 
-                Follower,
+            friend_ids = follow_graph.graph.following(current_user.id) | follow_graph.graph.followers(current_user.id)
 
-                (Follower.follower_id == User.id) & (Follower.user_id == current_user.id)
-
-            ).all()
-
-            
-
-            # Combine both lists and remove duplicates
-
-            all_users = {}
-
-            for user in followed_users:
-
-                all_users[user.id] = user
-
-                
+            all_users = {
 
-            for user in followers:
+                user.id: user for user in User.query.filter(User.id.in_(friend_ids)).all()
 
-                all_users[user.id] = user
+            } if friend_ids else {}
 
             
 
@@ -465,6 +500,8 @@ def register_routes():
 
             for user in all_users.values():
 
+                status = presence.status(user)
+
                 user_list.append({
 
                     'id': user.id,
@@ -475,9 +512,9 @@ def register_routes():
 
                     'image': user.profile_image_url,
 
-                    'is_online': getattr(user, 'is_online', False),
+                    'is_online': status['is_online'],
 
-                    'last_seen': user.last_seen.isoformat() if getattr(user, 'last_seen', None) else None
+                    'last_seen': status['last_seen'].isoformat() if status['last_seen'] else None
 
                 })
 
@@ -499,108 +536,28 @@ def register_routes():
 
     def like_post(post_id):
 
-        """API endpoint to like a post"""
+        """API endpoint to like/unlike a post (written behind by like_buffer)"""
 
         try:
 
             # Get the post
 
-            post = Post.query.get(post_id)
-
-            if not post:
+            if not db.session.query(Post.id).filter(Post.id == post_id).first():
 
                 return jsonify({'success': False, 'error': 'Post not found'}), 404
 
             
 
-            # Check if user has already liked this post
-
-            existing_like = PostLike.query.filter_by(post_id=post_id, user_id=current_user.id).first()
-
-            if existing_like:
-
-                # Unlike the post
-
-                db.session.delete(existing_like)
-                
-                # Update post likes count
-                post.likes = PostLike.query.filter_by(post_id=post_id).count()
-                db.session.commit()
-
-                # Emit real-time like update for clients (e.g., profile liked tab)
-                socketio.emit(
-                    'post_liked',
-                    {
-                        'post_id': post_id,
-                        'user_id': current_user.id,
-                        'liked': False,
-                        'likes': post.likes,
-                    },
-                    room=f'user_{current_user.id}',
-                )
-                
-                return jsonify({'success': True, 'message': 'Post unliked', 'liked': False, 'likes': post.likes})
-
-            
-
-            # Like the post
-
-            like = PostLike()
-
-            like.post_id = post_id
-
-            like.user_id = current_user.id
-
-            db.session.add(like)
-
-            
-
-            # Create notification for post owner (like)
+            # Flip the like in memory; the net change, the owner's notification
+            # and the post_liked event follow with the next buffer flush
+            liked, likes = like_buffer.toggle(current_user.id, post_id)
 
-            if post.user_id != current_user.id:
-
-                notification = Notification()
-                notification.user_id = post.user_id
-                notification.message = f"{current_user.full_name} liked your post"
-                notification.type = 'like'
-                notification.from_user_id = current_user.id
-                notification.post_id = post_id
-                db.session.add(notification)
-
-                # Emit notification to post owner with post ID
-                socketio.emit(
-                    'new_notification',
-                    {
-                        'user_id': post.user_id,
-                        'message': f"{current_user.full_name} liked your post",
-                        'type': 'like',
-                        'post_id': post_id,
-                        'link': f'/post/{post_id}'
-                    },
-                    room=f'user_{post.user_id}',
-                )
-
-            
-
-            db.session.commit()
-            
-            # Update post likes count after commit to be sure
-            post.likes = PostLike.query.filter_by(post_id=post_id).count()
-            db.session.commit()
-
-            # Emit real-time like update for clients (e.g., profile liked tab)
-            socketio.emit(
-                'post_liked',
-                {
-                    'post_id': post_id,
-                    'user_id': current_user.id,
-                    'liked': True,
-                    'likes': post.likes,
-                },
-                room=f'user_{current_user.id}',
-            )
-            
-            return jsonify({'success': True, 'message': 'Post liked', 'liked': True, 'likes': post.likes})
+            return jsonify({
+                'success': True,
+                'message': 'Post liked' if liked else 'Post unliked',
+                'liked': liked,
+                'likes': likes,
+            })
 
                 
 
@@ -646,53 +603,27 @@ def register_routes():
 
             
 
-            # Create comment
-
-            comment = Comment()
-
-            comment.post_id = post_id
-
-            comment.user_id = current_user.id
-
-            comment.content = content
+            # Create top-level comment
 
-            db.session.add(comment)
+            comment = comment_threads.add_comment(post_id, current_user.id, content)
 
             
 
-            # Create notification for post owner (comment)
-
+            # Create or extend the post owner's comment notification
+            notification = None
             if post.user_id != current_user.id:
-
-                notification = Notification()
-                notification.user_id = post.user_id
-                notification.message = f"{current_user.full_name} commented on your post: '{content[:50]}{'...' if len(content) > 50 else ''}'"
-                notification.type = 'comment'
-                notification.from_user_id = current_user.id
-                notification.post_id = post_id
-                db.session.add(notification)
-
-                # Emit notification to post owner with post ID
-                socketio.emit(
-                    'new_notification',
-                    {
-                        'user_id': post.user_id,
-                        'message': f"{current_user.full_name} commented on your post: '{content[:50]}{'...' if len(content) > 50 else ''}'",
-                        'type': 'comment',
-                        'post_id': post_id,
-                        'link': f'/post/{post_id}'
-                    },
-                    room=f'user_{post.user_id}',
-                )
+                notification = notification_aggregation.record(post.user_id, current_user, post_id, 'comment', content)
 
             
 
             db.session.commit()
+            if notification is not None:
+                notification_pushes.push(notification_aggregation.push_payload(notification, current_user))
             
-            # Get updated comment count
-            comments_count = Comment.query.filter_by(post_id=post_id).count()
+            # Updated by post_counters in the same transaction
+            comments_count = post.comments_count
             
-            return jsonify({'success': True, 'message': 'Comment added', 'comments_count': comments_count})
+            return jsonify({'success': True, 'message': 'Comment added', 'comment_id': comment.id, 'comments_count': comments_count})
 
                 
 
@@ -748,17 +679,9 @@ def register_routes():
 
             
 
-            # Create reply (as a new comment)
-
-            reply = Comment()
-
-            reply.post_id = comment.post_id
+            # Create reply threaded under the comment
 
-            reply.user_id = current_user.id
-
-            reply.content = content
-
-            db.session.add(reply)
+            reply = comment_threads.add_comment(comment.post_id, current_user.id, content, parent=comment)
 
             
 
@@ -800,7 +723,11 @@ def register_routes():
 
             
 
-            return jsonify({'success': True, 'message': 'Reply added'})
+            return jsonify({
+                'success': True,
+                'message': 'Reply added',
+                'comment': comment_threads.serialize_comments([reply])[0],
+            })
 
                 
 
@@ -817,32 +744,36 @@ def register_routes():
     @app.route('/api/chat/conversations')
     @require_login
     def api_get_conversations():
-        """Get all conversations for the current user with latest message and unread count"""
+        """Get a page of the current user's conversations with latest message and unread count"""
         try:
-            # Get all conversations where the user is a participant
-            conversations = Conversation.query.filter(
+            before_id = request.args.get('before_id', type=int)
+            limit = request.args.get('limit', CONVERSATIONS_PAGE_SIZE, type=int)
+            limit = max(1, min(limit, CONVERSATIONS_MAX_PAGE_SIZE))
+            
+            # Conversation and other participant in one joined query; last
+            # message and unread counts are denormalized on the conversation
+            other_user_id = case(
+                [(Conversation.user1_id == current_user.id, Conversation.user2_id)],
+                else_=Conversation.user1_id
+            )
+            query = db.session.query(Conversation, User).join(User, User.id == other_user_id).filter(
                 (Conversation.user1_id == current_user.id) | 
                 (Conversation.user2_id == current_user.id)
-            ).order_by(Conversation.updated_at.desc()).all()
+            )
+            if before_id:
+                cursor = Conversation.query.get(before_id)
+                if not cursor:
+                    return jsonify({'success': False, 'error': 'Invalid cursor'}), 400
+                query = query.filter(or_(
+                    Conversation.updated_at < cursor.updated_at,
+                    and_(Conversation.updated_at == cursor.updated_at, Conversation.id < cursor.id)
+                ))
+            rows = query.order_by(Conversation.updated_at.desc(), Conversation.id.desc()).limit(limit + 1).all()
+            has_more = len(rows) > limit
             
             result = []
-            for conv in conversations:
-                other_user_id = conv.user2_id if conv.user1_id == current_user.id else conv.user1_id
-                other_user = User.query.get(other_user_id)
-                
-                if not other_user:
-                    continue
-                
-                # Get latest message
-                latest_msg = Message.query.filter_by(conversation_id=conv.id).order_by(Message.created_at.desc()).first()
-                
-                # Get unread count
-                unread_count = Message.query.filter_by(
-                    conversation_id=conv.id, 
-                    receiver_id=current_user.id, 
-                    is_read=False
-                ).count()
-                
+            for conv, other_user in rows[:limit]:
+                status = presence.status(other_user)
                 result.append({
                     'id': conv.id,
                     'other_user': {
@@ -850,57 +781,73 @@ def register_routes():
                         'name': other_user.full_name,
                         'username': other_user.username,
                         'image': other_user.profile_image_url,
-                        'is_online': other_user.is_online,
-                        'last_seen': other_user.last_seen.isoformat() if other_user.last_seen else None
+                        'is_online': status['is_online'],
+                        'last_seen': status['last_seen'].isoformat() if status['last_seen'] else None
                     },
                     'last_message': {
-                        'content': latest_msg.content if latest_msg else '',
-                        'type': latest_msg.message_type if latest_msg else 'text',
-                        'timestamp': latest_msg.created_at.isoformat() if latest_msg else None
+                        'content': conv.last_message_preview or '',
+                        'type': conv.last_message_type or 'text',
+                        'timestamp': conv.last_message_at.isoformat() if conv.last_message_at else None
                     },
-                    'unread_count': unread_count,
+                    'unread_count': conv.unread_for(current_user.id),
                     'updated_at': conv.updated_at.isoformat()
                 })
             
-            return jsonify(result)
+            return jsonify({
+                'success': True,
+                'conversations': result,
+                'has_more': has_more,
+                'next_before_id': result[-1]['id'] if has_more else None
+            })
         except Exception as e:
             print(f"Error getting conversations: {e}")
-            return jsonify([]), 500
+            return jsonify({'success': False, 'error': str(e)}), 500
 
     @app.route('/api/messages/<user_id>')
     @require_login
     def api_get_messages(user_id):
-        """API endpoint to get messages with a specific user"""
+        """API endpoint to get a page of messages with a specific user (newest last)"""
         try:
-            conv = get_or_create_conversation(current_user.id, user_id)
+            before_id = request.args.get('before_id', type=int)
+            limit = request.args.get('limit', MESSAGES_PAGE_SIZE, type=int)
+            limit = max(1, min(limit, MESSAGES_MAX_PAGE_SIZE))
             
-            # Mark messages as read and get ids for seen notification
-            to_mark = Message.query.filter_by(
-                conversation_id=conv.id, 
-                receiver_id=current_user.id, 
-                is_read=False
-            ).all()
-            seen_ids = [m.id for m in to_mark]
-            other_user_id = conv.user2_id if str(conv.user1_id) == str(current_user.id) else conv.user1_id
-            for m in to_mark:
-                m.is_read = True
-            db.session.commit()
+            conv = get_or_create_conversation(current_user.id, user_id)
             
-            # Emit unread count update for the user
-            emit_unread_count(current_user.id)
-            # Notify sender that messages were seen
-            if seen_ids and other_user_id:
-                socketio.emit('message_status', {
-                    'message_ids': seen_ids,
-                    'status': 'seen'
-                }, room=f'user_{other_user_id}')
+            # Opening the chat (first page) marks incoming messages as read
+            if not before_id:
+                # One bulk UPDATE; returns the ids that changed, per sender
+                seen = read_receipts.mark_read(current_user.id, conversation_id=conv.id)
+                db.session.commit()
             
-            messages = Message.query.filter_by(conversation_id=conv.id).order_by(Message.created_at.asc()).all()
+                if seen:
+                    # Emit unread count update for the user
+                    emit_unread_count(current_user.id)
+                    # Notify sender that messages were seen
+                    read_receipts.emit_seen(socketio, seen)
+            
+            # Newest page first; older pages are fetched with ?before_id=<oldest id seen>
+            query = Message.query.filter_by(conversation_id=conv.id)
+            if before_id:
+                cursor = Message.query.filter_by(id=before_id, conversation_id=conv.id).first()
+                if not cursor:
+                    return jsonify({'success': False, 'error': 'Invalid cursor'}), 400
+                query = query.filter(or_(
+                    Message.created_at < cursor.created_at,
+                    and_(Message.created_at == cursor.created_at, Message.id < cursor.id)
+                ))
+            page = query.order_by(Message.created_at.desc(), Message.id.desc()).limit(limit + 1).all()
+            has_more = len(page) > limit
+            messages = list(reversed(page[:limit]))
+            
+            # Resolve sender images once per page
+            sender_ids = {m.sender_id for m in messages}
+            sender_images = dict(
+                db.session.query(User.id, User.profile_image_url).filter(User.id.in_(sender_ids)).all()
+            ) if sender_ids else {}
             
             message_list = []
             for message in messages:
-                # Use cached sender info if possible
-                sender = User.query.get(message.sender_id)
                 message_list.append({
                     'id': message.id,
                     'sender_id': message.sender_id,
@@ -912,13 +859,18 @@ def register_routes():
                     'file_type': message.file_type,
                     'is_read': message.is_read,
                     'created_at': message.created_at.isoformat(),
-                    'sender_image': sender.profile_image_url if sender else None
+                    'sender_image': sender_images.get(message.sender_id)
                 })
             
-            return jsonify(message_list)
+            return jsonify({
+                'success': True,
+                'messages': message_list,
+                'has_more': has_more,
+                'next_before_id': message_list[0]['id'] if has_more else None
+            })
         except Exception as e:
             print(f"Error getting messages: {e}")
-            return jsonify([]), 500
+            return jsonify({'success': False, 'error': str(e)}), 500
 
 
 
@@ -935,6 +887,7 @@ def register_routes():
                 code_snippet = data.get('code_snippet')
                 file_attachment = data.get('file_attachment')
                 file_type = data.get('file_type')
+                temp_id = data.get('temp_id')
             else:
                 receiver_id = request.form.get('receiver_id')
                 content = request.form.get('content', '').strip()
@@ -942,87 +895,32 @@ def register_routes():
                 code_snippet = request.form.get('code_snippet')
                 file_attachment = request.form.get('file_attachment')
                 file_type = request.form.get('file_type')
+                temp_id = request.form.get('temp_id')
             
             if not receiver_id:
                 return jsonify({'success': False, 'error': 'Receiver is required'}), 400
             
-            receiver = User.query.get(receiver_id)
-            if not receiver:
+            try:
+                message_data = chat_service.send_message(
+                    current_user, receiver_id,
+                    content=content,
+                    message_type=message_type,
+                    code_snippet=code_snippet,
+                    file_attachment=file_attachment,
+                    file_type=file_type,
+                )
+            except chat_service.RecipientNotFound:
                 return jsonify({'success': False, 'error': 'Receiver not found'}), 404
-
-            # Get conversation
-            conv = get_or_create_conversation(current_user.id, receiver_id)
-            conv.updated_at = datetime.now()
-            
-            # Create and persist new message
-            message = Message()
-            message.conversation_id = conv.id
-            message.sender_id = current_user.id
-            message.receiver_id = receiver_id
-            message.content = content
-            message.message_type = message_type
-            message.code_snippet = code_snippet
-            message.file_attachment = file_attachment
-            message.file_type = file_type
-            message.is_read = False
-
-            db.session.add(message)
-            db.session.commit()
-
-            # Prepare message data for Socket.IO
-            message_data = {
-                'id': message.id,
-                'conversation_id': conv.id,
-                'sender_id': current_user.id,
-                'receiver_id': receiver_id,
-                'content': content,
-                'message': content,
-                'message_type': message_type,
-                'code_snippet': code_snippet,
-                'file_attachment': file_attachment,
-                'file_type': file_type,
-                'timestamp': message.created_at.isoformat(),
-                'created_at': message.created_at.isoformat(),
-                'sender_name': current_user.full_name,
-                'sender_image': current_user.profile_image_url,
-            }
-
-            # Emit to both sender and receiver rooms (new_message kept for backward‑compat)
-            socketio.emit('new_message', message_data, room=f'user_{receiver_id}')
-            socketio.emit('new_message', message_data, room=f'user_{current_user.id}')
-            # Also emit explicit receive_message event as requested
-            socketio.emit('receive_message', message_data, room=f'user_{receiver_id}')
-            socketio.emit('receive_message', message_data, room=f'user_{current_user.id}')
             
-            # Sync unread counts
-            emit_unread_count(receiver_id)
+            # One receive_message per room (carries the receiver's unread count)
+            chat_service.emit_message(socketio, message_data, temp_id=temp_id)
             
-            return jsonify({'success': True, 'message_id': message.id, 'conversation_id': conv.id})
+            return jsonify({'success': True, 'message_id': message_data['id'], 'conversation_id': message_data['conversation_id']})
         except Exception as e:
             db.session.rollback()
             print(f"Error sending message: {e}")
             return jsonify({'success': False, 'error': str(e)}), 500
 
-    def emit_unread_count(user_id):
-        """Helper to emit unread count update for a user"""
-        try:
-            total_unread = Message.query.filter_by(
-                receiver_id=user_id,
-                is_read=False
-            ).count()
-            # For chat interface unread counts
-            socketio.emit('unread_count_update', {
-                'unread_count': total_unread
-            }, room=f'user_{user_id}')
-            # For general navbar badge update
-            socketio.emit('unread_badge_update', {
-                'count': total_unread
-            }, room=f'user_{user_id}')
-        except Exception as e:
-            print(f"Error emitting unread count: {e}")
-
-
-
     @app.route('/api/upload-file', methods=['POST'])
     @require_login
     def api_upload_file():
@@ -1087,18 +985,17 @@ def register_routes():
                 return jsonify({'success': False, 'error': 'User not found'}), 404
             
             # Return UTC time with 'Z' suffix so client handles timezone conversion
+            status = presence.status(user)
             last_seen_iso = None
-            if user.last_seen:
+            if status['last_seen']:
                 # Ensure it's treated as UTC
-                last_seen_iso = user.last_seen.isoformat()
+                last_seen_iso = status['last_seen'].isoformat()
                 if not last_seen_iso.endswith('Z') and not '+' in last_seen_iso:
                     last_seen_iso += 'Z'
             
-            print(f"API User Status for {user.id}: online={user.is_online}, last_seen={last_seen_iso}")
-
             return jsonify({
                 'success': True,
-                'is_online': user.is_online,
+                'is_online': status['is_online'],
                 'last_seen': last_seen_iso,
                 'last_seen_formatted': None # Client handles formatting
             })
@@ -1159,17 +1056,36 @@ def register_routes():
             print(f"Error in detection: {e}")
             return jsonify({'success': False, 'result': str(e)}), 500
 
+    @app.route('/api/metrics', methods=['GET'])
+    @require_login
+    def api_metrics():
+        """Runtime cache metrics (hit rates) for monitoring"""
+        from code_detector import get_cache_stats
+        from ai_models import language_cache
+        return jsonify({
+            'success': True,
+            'code_detection_cache': get_cache_stats(),
+            'language_detection_cache': language_cache.stats(),
+            'ocr_jobs': ocr_job_queue.stats(),
+            'extraction_cache': extraction_cache.stats(),
+            'conversation_id_cache': chat_service.conversation_ids.stats(),
+            'presence': presence.stats(),
+            'presence_fanout': presence_fanout.stats(),
+            'notification_fanout': notification_fanout.stats(),
+            'notification_pushes': notification_pushes.stats(),
+            'retention': retention.stats(),
+            'feed_cache': feed_service.feed_cache.stats(),
+            'like_buffer': like_buffer.stats(),
+            'profile_counts': profile_service.profile_counts.stats(),
+            'follow_graph': follow_graph.graph.stats(),
+        })
+
     @app.route('/api/extract-code-from-image', methods=['POST'])
     @require_login
     def api_extract_code_from_image():
-        """Extract code from uploaded image using OCR with smart code detection"""
+        """Queue an uploaded image for OCR; returns a job id immediately"""
         try:
-            import pytesseract
-            from PIL import Image
-            import io
-            import cv2
-            import numpy as np
-            from code_detector import is_code, detect_primary_language, calculate_code_score
+            from ocr_jobs import QueueFullError
             
             if 'image' not in request.files:
                 return jsonify({'success': False, 'error': 'No image file provided'}), 400
@@ -1178,72 +1094,56 @@ def register_routes():
             if file.filename == '':
                 return jsonify({'success': False, 'error': 'No file selected'}), 400
             
-            # Read and process image
             image_bytes = file.read()
-            nparr = np.frombuffer(image_bytes, np.uint8)
-            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            
-            if img is None:
+            if not image_bytes:
                 return jsonify({'success': False, 'error': 'Invalid image format'}), 400
             
-            # IMPROVED PREPROCESSING for OCR
-            # Convert to grayscale
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            # Increase contrast/Denoise
-            gray = cv2.threshold(cv2.medianBlur(gray, 3), 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
-            
-            # Perform OCR on processed image
-            extracted_text = pytesseract.image_to_string(gray)
-            
-            if not extracted_text or not extracted_text.strip():
-                return jsonify({
-                    'success': False, 
-                    'error': 'No text could be extracted from the image. Please use a clearer image.'
-                }), 400
-            
-            extracted_text = extracted_text.strip()
-            
-            # LOWER THRESHOLD for OCR (0.45) as OCR is often "noisy"
-            is_valid_code, confidence = is_code(extracted_text, threshold=0.45)
-            
-            if not is_valid_code:
-                # Log score for debugging
-                score, breakdown = calculate_code_score(extracted_text)
-                print(f"OCR Detection Fail. Text: {extracted_text[:100]}... Score: {score:.2f}, Breakdown: {breakdown}")
-                return jsonify({
-                    'success': False,
-                    'error': 'Recognizable code was not found in this image. Ensure the code is clear and not blurry.',
-                    'confidence': confidence
-                }), 400
-            
-            # Detect language
-            language = detect_primary_language(extracted_text)
+            try:
+                job = ocr_job_queue.submit(current_user.id, image_bytes)
+            except QueueFullError as e:
+                return jsonify({'success': False, 'error': str(e)}), 503
             
-            return jsonify({
+            payload = {
                 'success': True,
-                'code': extracted_text,
-                'language': language,
-                'confidence': confidence
-            })
+                'job_id': job['job_id'],
+                'status': job['status'],
+                'status_url': url_for('api_ocr_job_status', job_id=job['job_id'])
+            }
+            # Cache hit: the result is already available, no need to poll
+            if job['status'] == 'done':
+                payload['result'] = job['result']
+                return jsonify(payload), 200
+            return jsonify(payload), 202
             
-        except ImportError as e:
-            print(f"Import error in OCR: {e}")
-            return jsonify({
-                'success': False, 
-                'error': 'OCR dependencies not installed. Please install pytesseract and Pillow.'
-            }), 500
         except Exception as e:
-            print(f"Error extracting code from image: {e}")
+            print(f"Error queueing image for OCR: {e}")
             return jsonify({'success': False, 'error': str(e)}), 500
 
+    @app.route('/api/ocr-jobs/<job_id>', methods=['GET'])
+    @require_login
+    def api_ocr_job_status(job_id):
+        """Poll the status/result of an OCR job"""
+        job = ocr_job_queue.get(job_id, current_user.id)
+        if not job:
+            return jsonify({'success': False, 'error': 'Job not found'}), 404
+        return jsonify({'success': True, 'job': job})
+
+    @app.route('/api/ocr-jobs/<job_id>/cancel', methods=['POST'])
+    @require_login
+    def api_ocr_job_cancel(job_id):
+        """Cancel a queued or running OCR job"""
+        job = ocr_job_queue.cancel(job_id, current_user.id)
+        if not job:
+            return jsonify({'success': False, 'error': 'Job not found'}), 404
+        return jsonify({'success': True, 'job': job})
+
     @app.route('/api/extract-code-from-pdf', methods=['POST'])
     @require_login
     def api_extract_code_from_pdf():
         """Extract code from uploaded PDF with smart code detection"""
+        pdf_path = None
         try:
-            import pdfplumber
-            import io
-            from code_detector import is_code, detect_primary_language, calculate_code_score
+            from pdf_extract import spool_upload, extract_code, PDF_PIPELINE_VERSION
             
             if 'pdf' not in request.files:
                 return jsonify({'success': False, 'error': 'No PDF file provided'}), 400
@@ -1252,45 +1152,41 @@ def register_routes():
             if file.filename == '':
                 return jsonify({'success': False, 'error': 'No file selected'}), 400
             
-            # Read and process PDF
-            pdf_bytes = file.read()
-            
-            extracted_text = ""
-            with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
-                for page in pdf.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        extracted_text += page_text + "\n"
-            
-            if not extracted_text or not extracted_text.strip():
+            # Spool to disk (hashing as we go); a PDF seen before is served
+            # from the extraction cache, otherwise pages are extracted in
+            # parallel, stopping early once enough code has been found
+            pdf_path, digest = spool_upload(file)
+            result = extraction_cache.get(PDF_PIPELINE_VERSION, digest)
+            if result is None:
+                # extract_code removes the file once its page workers are done with it
+                path, pdf_path = pdf_path, None
+                result = extract_code(path)
+                extraction_cache.put(PDF_PIPELINE_VERSION, digest, result)
+            
+            if not result['text']:
                 return jsonify({
                     'success': False, 
                     'error': 'No text could be extracted from the PDF'
                 }), 400
             
-            extracted_text = extracted_text.strip()
-            
             # Check if extracted text is code (using 60% threshold)
-            is_valid_code, confidence = is_code(extracted_text, threshold=0.6)
-            
-            if not is_valid_code:
-                # Get score for debugging
-                score, breakdown = calculate_code_score(extracted_text)
-                print(f"Code detection failed for PDF. Score: {score:.2f}, Breakdown: {breakdown}")
+            confidence = result['confidence']
+            if confidence < 0.6:
+                # Log score for debugging
+                print(f"Code detection failed for PDF. Score: {confidence:.2f}, Breakdown: {result['breakdown']}")
                 return jsonify({
                     'success': False,
                     'error': 'The PDF does not contain recognizable programming code',
                     'confidence': confidence
                 }), 400
             
-            # Detect language
-            language = detect_primary_language(extracted_text)
-            
             return jsonify({
                 'success': True,
-                'code': extracted_text,
-                'language': language,
-                'confidence': confidence
+                'code': result['text'],
+                'language': result['language'],
+                'confidence': confidence,
+                'pages_read': result['pages_read'],
+                'page_count': result['page_count']
             })
             
         except ImportError as e:
@@ -1302,13 +1198,19 @@ def register_routes():
         except Exception as e:
             print(f"Error extracting code from PDF: {e}")
             return jsonify({'success': False, 'error': str(e)}), 500
+        finally:
+            if pdf_path:
+                try:
+                    os.remove(pdf_path)
+                except OSError:
+                    pass
 
     @app.route('/api/validate-code', methods=['POST'])
     @require_login
     def api_validate_code():
         """Validate if text content is programming code"""
         try:
-            from code_detector import is_code, detect_primary_language, calculate_code_score
+            from code_detector import analyze_code
             
             data = request.get_json()
             code = data.get('code', '')
@@ -1321,17 +1223,19 @@ def register_routes():
                     'error': 'No content provided'
                 }), 400
             
-            is_valid_code, confidence = is_code(code, threshold=threshold)
-            score, breakdown = calculate_code_score(code)
-            language = detect_primary_language(code) if is_valid_code else 'text'
+            # One cached pass gives score, breakdown and language together
+            analysis = analyze_code(code)
+            score = analysis['score']
+            is_valid_code = score >= threshold
+            language = analysis['language'] if is_valid_code else 'text'
             
             return jsonify({
                 'success': True,
                 'is_code': is_valid_code,
-                'confidence': confidence,
+                'confidence': score,
                 'score': score,
                 'language': language,
-                'breakdown': breakdown
+                'breakdown': analysis['breakdown']
             })
             
         except Exception as e:
@@ -1534,10 +1438,10 @@ def register_routes():
             record.total_seconds += seconds
             record.minutes = record.total_seconds // 60
 
-            # --- Update user presence ---
+            # --- Update user presence (online state is kept by the presence service) ---
             user = current_user._get_current_object()
             user.last_active = datetime.now()
-            user.is_online = True
+            presence.touch(user.id)
 
             # --- Update streak (only once per day) ---
             if user.last_streak_date != today:
@@ -1857,15 +1761,9 @@ def register_routes():
             except Exception:
                 pass
 
-# Map socket sid -> user_id for disconnect (session may be gone)
-_socket_user_map = {}
-
 def _emit_presence(user_id, is_online, last_seen_iso=None):
-    """Broadcast presence so all clients can update their chat list."""
-    payload = {'user_id': user_id, 'is_online': is_online}
-    if last_seen_iso is not None:
-        payload['last_seen'] = last_seen_iso
-    socketio.emit('user_presence_update', payload)
+    """Queue a presence change for the users who have user_id in their chat list."""
+    presence_fanout.publish(user_id, is_online, last_seen_iso)
 
 def register_socketio_events():
     """Register Socket.IO event handlers"""
@@ -1876,28 +1774,17 @@ def register_socketio_events():
         if current_user.is_authenticated:
             room = f"user_{current_user.id}"
             join_room(room)
-            _socket_user_map[request.sid] = str(current_user.id)
-            current_user.is_online = True
-            db.session.commit()
-            _emit_presence(current_user.id, True, datetime.utcnow().isoformat())
+            if presence.connect(request.sid, current_user.id):
+                _emit_presence(current_user.id, True, datetime.utcnow().isoformat())
             print(f"Socket Connected: User {current_user.id} joined {room}")
 
     @socketio.on('disconnect')
     def on_disconnect():
-        """Handle user disconnection - use sid map if session gone"""
-        user_id = _socket_user_map.pop(request.sid, None)
-        if user_id is None and current_user.is_authenticated:
-            user_id = str(current_user.id)
-        if user_id:
-            try:
-                u = User.query.get(user_id)
-                if u:
-                    u.is_online = False
-                    u.last_seen = datetime.utcnow()
-                    db.session.commit()
-            except Exception:
-                db.session.rollback()
-            _emit_presence(user_id, False, datetime.utcnow().isoformat())
+        """Handle user disconnection - offline only once the user's last socket closes"""
+        fallback_id = str(current_user.id) if current_user.is_authenticated else None
+        user_id, went_offline, last_seen = presence.disconnect(request.sid, fallback_id)
+        if went_offline:
+            _emit_presence(user_id, False, last_seen.isoformat())
             print(f"Socket Disconnected: User {user_id}")
 
     @socketio.on('join')
@@ -1910,23 +1797,19 @@ def register_socketio_events():
     
     @socketio.on('chat_window_opened')
     def on_chat_window_opened(data):
+        """Online state follows socket connections; just refresh last_seen"""
         if current_user.is_authenticated:
-            current_user.is_online = True
-            db.session.commit()
-            _emit_presence(current_user.id, True, datetime.utcnow().isoformat())
+            presence.touch(current_user.id)
 
     @socketio.on('chat_window_closed')
     def on_chat_window_closed(data):
-        """User left chat page - mark offline and set last_seen"""
+        """User left chat page - refresh last_seen (offline once the last socket closes)"""
         if current_user.is_authenticated:
-            current_user.is_online = False
-            current_user.last_seen = datetime.utcnow()
-            db.session.commit()
-            _emit_presence(current_user.id, False, current_user.last_seen.isoformat())
+            presence.touch(current_user.id)
 
     @socketio.on('send_message')
     def on_send_message(data):
-        """Real-time message send: save to DB, then emit receive_message/new_message"""
+        """Real-time message send: save to DB, then emit one receive_message per room"""
         if not current_user.is_authenticated:
             return
         try:
@@ -1940,49 +1823,17 @@ def register_socketio_events():
             if not receiver_id or not content:
                 return
 
-            receiver = User.query.get(receiver_id)
-            if not receiver:
-                return
-
-            conv = get_or_create_conversation(current_user.id, receiver_id)
-            conv.updated_at = datetime.now()
-
-            message = Message()
-            message.conversation_id = conv.id
-            message.sender_id = current_user.id
-            message.receiver_id = receiver_id
-            message.content = content
-            message.message_type = message_type
-            message.code_snippet = code_snippet
-            message.file_attachment = file_attachment
-            message.file_type = file_type
-            message.is_read = False
-
-            db.session.add(message)
-            db.session.commit()
-
-            message_data = {
-                'id': message.id,
-                'conversation_id': conv.id,
-                'sender_id': current_user.id,
-                'receiver_id': receiver_id,
-                'content': content,
-                'message': content,
-                'message_type': message_type,
-                'code_snippet': code_snippet,
-                'file_attachment': file_attachment,
-                'file_type': file_type,
-                'timestamp': message.created_at.isoformat(),
-                'created_at': message.created_at.isoformat(),
-                'sender_name': current_user.full_name,
-                'sender_image': current_user.profile_image_url,
-            }
-
-            socketio.emit('new_message', message_data, room=f'user_{receiver_id}')
-            socketio.emit('new_message', message_data, room=f'user_{current_user.id}')
-            socketio.emit('receive_message', message_data, room=f'user_{receiver_id}')
-            socketio.emit('receive_message', message_data, room=f'user_{current_user.id}')
-            emit_unread_count(receiver_id)
+            message_data = chat_service.send_message(
+                current_user, receiver_id,
+                content=content,
+                message_type=message_type,
+                code_snippet=code_snippet,
+                file_attachment=file_attachment,
+                file_type=file_type,
+            )
+            chat_service.emit_message(socketio, message_data, temp_id=data.get('temp_id'))
+        except chat_service.RecipientNotFound:
+            return
         except Exception as e:
             db.session.rollback()
             print(f"Error in send_message socket handler: {e}")
@@ -2008,12 +1859,11 @@ def register_socketio_events():
         """Receiver confirms message received - notify sender"""
         message_id = data.get('message_id')
         if message_id and current_user.is_authenticated:
-            msg = Message.query.get(message_id)
-            if msg and str(msg.receiver_id) == str(current_user.id):
-                socketio.emit('message_status', {
-                    'message_id': message_id,
-                    'status': 'delivered'
-                }, room=f'user_{msg.sender_id}')
+            # Validated and sent to the sender in batches
+            try:
+                delivery_ack_batcher.add(current_user.id, message_id)
+            except (TypeError, ValueError):
+                pass
 
     @socketio.on('message_seen')
     def on_message_seen(data):
@@ -2022,13 +1872,16 @@ def register_socketio_events():
         message_ids = [mid for mid in message_ids if mid]
         if not message_ids or not current_user.is_authenticated:
             return
-        for message_id in message_ids:
-            msg = Message.query.get(message_id)
-            if msg and str(msg.receiver_id) == str(current_user.id):
-                socketio.emit('message_status', {
-                    'message_id': message_id,
-                    'status': 'seen'
-                }, room=f'user_{msg.sender_id}')
+        try:
+            seen = read_receipts.mark_read(current_user.id, message_ids=message_ids)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error marking messages seen: {e}")
+            return
+        if seen:
+            read_receipts.emit_seen(socketio, seen)
+            emit_unread_count(current_user.id)
 
     # ---- Call signaling (WebRTC) ----
     @socketio.on('call_request')
@@ -2233,27 +2086,36 @@ def register_socketio_events():
     @app.route('/api/history/list', methods=['GET'])
     @require_login
     def api_history_list():
-        """Get user's code history"""
+        """Get user's code history (entries moved to the archive by retention come last)"""
         try:
-            history = CodeHistory.query.filter_by(user_id=current_user.id).order_by(CodeHistory.created_at.desc()).limit(50).all()
-            
+            history = [
+                {column.name: getattr(item, column.name) for column in CodeHistory.__table__.columns}
+                for item in CodeHistory.query.filter_by(user_id=current_user.id)
+                .order_by(CodeHistory.created_at.desc()).limit(50).all()
+            ]
+            if len(history) < 50:
+                # Archived entries are all older than the ones still in code_history
+                for item in retention.load_archived('code_history', current_user.id, limit=50 - len(history)):
+                    item['created_at'] = datetime.fromisoformat(item['created_at'])
+                    history.append(item)
+
             history_list = []
             for item in history:
                 # Format actions for display
-                actions = item.action.split(',')
-                display_action = item.action
+                actions = item['action'].split(',')
+                display_action = item['action']
                 if len(actions) > 1:
                     display_action = f"{actions[0].strip()} and more..."
                 
                 history_list.append({
-                    'id': item.id,
-                    'title': item.title or "Untitled",
-                    'code': item.code,
-                    'language': item.language,
+                    'id': item['id'],
+                    'title': item.get('title') or "Untitled",
+                    'code': item['code'],
+                    'language': item['language'],
                     'action': display_action,
-                    'full_action': item.action,
-                    'date': item.created_at.strftime('%d:%m:%Y (%I:%M%p)'),
-                    'result': item.result
+                    'full_action': item['action'],
+                    'date': item['created_at'].strftime('%d:%m:%Y (%I:%M%p)'),
+                    'result': item['result']
                 })
             
             return jsonify({'success': True, 'history': history_list})
@@ -2314,45 +2176,10 @@ def register_socketio_events():
                     room=f'user_{current_user.id}',
                 )
 
-                # Notify followers about new post
-                try:
-                    followers = Follower.query.filter_by(user_id=current_user.id).all()
-                    for f in followers:
-                        notif = Notification(
-                            user_id=f.follower_id,
-                            from_user_id=current_user.id,
-                            message=f"{current_user.full_name} created a new post",
-                            type='post',
-                            post_id=post.id
-                        )
-                        db.session.add(notif)
-                        db.session.flush()
-                        # Real-time notification
-                        socketio.emit(
-                            'new_notification',
-                            {
-                                'id': notif.id,
-                                'user_id': notif.user_id,
-                                'from_user': {
-                                    'id': current_user.id,
-                                    'first_name': current_user.first_name,
-                                    'last_name': current_user.last_name,
-                                    'username': current_user.username,
-                                    'profile_image_url': current_user.profile_image_url,
-                                },
-                                'message': notif.message,
-                                'type': notif.type,
-                                'link': f'/post/{post.id}',
-                                'created_at': notif.created_at.isoformat(),
-                                'read_status': notif.read_status,
-                            },
-                            room=f'user_{notif.user_id}',
-                        )
-                    db.session.commit()
-                except Exception as e:
-                    # Don't fail post creation if notification fan-out has issues
-                    db.session.rollback()
-                    print(f"Error sending post notifications: {e}")
+                # Notify followers in the background; the post is already committed
+                notification_fanout.submit(post.id)
+                feed_service.feed_cache.invalidate_author(current_user.id)
+                profile_service.profile_counts.invalidate(current_user.id)
 
                 return jsonify({'success': True, 'post_id': post.id})
 
@@ -2363,24 +2190,7 @@ def register_socketio_events():
                 .all()
             )
 
-            result = []
-            for p in posts:
-                result.append(
-                    {
-                        'id': p.id,
-                        'user_id': p.user_id,
-                        'author_name': p.author.full_name if p.author else 'Unknown',
-                        'author_image': (
-                            p.author.profile_image_url if p.author else None
-                        ),
-                        'code': p.code,
-                        'language': p.language,
-                        'description': p.description or '',
-                        'likes': p.likes or 0,
-                        'comments_count': len(p.comments or []),
-                        'created_at': p.created_at.isoformat(),
-                    }
-                )
+            result = post_serializer.serialize_posts(posts, current_user.id, pending=like_buffer)
 
             return jsonify(result)
         except Exception as e:
@@ -2403,32 +2213,44 @@ def register_socketio_events():
     @app.route('/api/posts/<int:post_id>/comments', methods=['GET'])
     @require_login
     def api_posts_get_comments(post_id):
-        """Return comments for a post in the format expected by templates."""
+        """Return a page of a post's top-level comments, oldest first (?cursor=&limit=)."""
         try:
-            post = Post.query.get(post_id)
-            if not post:
-                return jsonify([])
-
-            result = []
-            for c in post.comments:
-                author = c.user
-                result.append(
-                    {
-                        'id': c.id,
-                        'user_id': c.user_id,
-                        'author_name': author.full_name if author else 'User',
-                        'user_image': (
-                            author.profile_image_url if author else None
-                        ),
-                        'content': c.content,
-                        'created_at': c.created_at.isoformat(),
-                    }
-                )
-
-            return jsonify(result)
+            limit = request.args.get('limit', comment_threads.COMMENT_PAGE_SIZE, type=int)
+            comments, next_cursor = comment_threads.page(
+                post_id=post_id, cursor=request.args.get('cursor'), limit=limit
+            )
+            return jsonify({
+                'success': True,
+                'comments': comment_threads.serialize_comments(comments),
+                'next_cursor': next_cursor,
+                'has_more': next_cursor is not None,
+            })
+        except comment_threads.InvalidCursor:
+            return jsonify({'success': False, 'comments': [], 'error': 'Invalid cursor'}), 400
         except Exception as e:
             print(f"Error fetching comments for post {post_id}: {e}")
-            return jsonify([]), 500
+            return jsonify({'success': False, 'comments': []}), 500
+
+    @app.route('/api/comments/<int:comment_id>/replies', methods=['GET'])
+    @require_login
+    def api_comment_replies(comment_id):
+        """Return a page of a comment's direct replies, oldest first (?cursor=&limit=)."""
+        try:
+            limit = request.args.get('limit', comment_threads.COMMENT_PAGE_SIZE, type=int)
+            replies, next_cursor = comment_threads.page(
+                parent_id=comment_id, cursor=request.args.get('cursor'), limit=limit
+            )
+            return jsonify({
+                'success': True,
+                'comments': comment_threads.serialize_comments(replies),
+                'next_cursor': next_cursor,
+                'has_more': next_cursor is not None,
+            })
+        except comment_threads.InvalidCursor:
+            return jsonify({'success': False, 'comments': [], 'error': 'Invalid cursor'}), 400
+        except Exception as e:
+            print(f"Error fetching replies for comment {comment_id}: {e}")
+            return jsonify({'success': False, 'comments': []}), 500
 
     @app.route('/api/posts/<int:post_id>/save', methods=['POST'])
     @require_login
@@ -2484,75 +2306,15 @@ def register_socketio_events():
     @app.route('/api/explore-posts', methods=['GET'])
     @require_login
     def api_explore_posts():
-        """Return explore feed: followed users' posts first, then suggested posts."""
+        """Return a page of the explore feed: followed users' posts first, then suggested posts."""
         try:
-            # Users the current user follows
-            following = Follower.query.filter_by(
-                follower_id=current_user.id
-            ).all()
-            following_ids = [f.user_id for f in following]
-            if current_user.id not in following_ids:
-                following_ids.append(current_user.id)
-
-            # Posts from followed users
-            followed_posts = (
-                Post.query.filter(Post.user_id.in_(following_ids))
-                .order_by(Post.created_at.desc())
-                .all()
+            limit = request.args.get('limit', feed_service.FEED_PAGE_SIZE, type=int)
+            payload = feed_service.get_explore_page(
+                current_user.id, request.args.get('cursor'), limit, pending=like_buffer
             )
-
-            # Suggested posts from others
-            if following_ids:
-                suggested_posts = (
-                    Post.query.filter(~Post.user_id.in_(following_ids))
-                    .order_by(Post.created_at.desc())
-                    .limit(50)
-                    .all()
-                )
-            else:
-                suggested_posts = (
-                    Post.query.order_by(Post.created_at.desc()).limit(50).all()
-                )
-
-            def serialize_post(post, is_friend_post):
-                author = post.author
-                # Check if current user already follows this author
-                is_following_author = post.user_id in following_ids
-                
-                # Check if current user liked this post
-                liked = PostLike.query.filter_by(post_id=post.id, user_id=current_user.id).first() is not None
-                # Check if current user saved this post
-                saved = PostSave.query.filter_by(post_id=post.id, user_id=current_user.id).first() is not None
-
-                return {
-                    'id': post.id,
-                    'user_id': post.user_id,
-                    'author_name': author.full_name if author else 'User',
-                    'author_image': (
-                        author.profile_image_url if author else None
-                    ),
-                    'code': post.code,
-                    'language': post.language,
-                    'description': post.description or '',
-                    'likes': post.likes or 0,
-                    'comments_count': len(post.comments or []),
-                    'created_at': post.created_at.isoformat(),
-                    'is_friend_post': is_friend_post,
-                    'liked': liked,
-                    'saved': saved,
-                    'is_following_author': is_following_author,
-                }
-
-            payload = {
-                'following_posts': [
-                    serialize_post(p, True) for p in followed_posts
-                ],
-                'suggested_posts': [
-                    serialize_post(p, False) for p in suggested_posts
-                ],
-            }
-
             return jsonify(payload)
+        except feed_service.InvalidCursor:
+            return jsonify({'following_posts': [], 'suggested_posts': [], 'error': 'Invalid cursor'}), 400
         except Exception as e:
             print(f"Error building explore feed: {e}")
             return jsonify({'following_posts': [], 'suggested_posts': []}), 500
@@ -2613,6 +2375,10 @@ def register_socketio_events():
             db.session.add(notif)
 
             db.session.commit()
+            presence_interests.invalidate(current_user.id, follow_req.from_user_id)
+            feed_service.feed_cache.invalidate_user(follow_req.from_user_id)
+            profile_service.profile_counts.invalidate(current_user.id, follow_req.from_user_id)
+            follow_graph.graph.invalidate(current_user.id, follow_req.from_user_id)
 
             # Emit real-time notification
             socketio.emit(
@@ -2684,6 +2450,7 @@ def register_socketio_events():
                 db.session.delete(notif)
 
             db.session.commit()
+            follow_graph.graph.invalidate(follow_req.from_user_id)
             return jsonify({'success': True})
         except Exception as e:
             db.session.rollback()
@@ -2697,17 +2464,49 @@ def register_socketio_events():
     @app.route('/api/notifications', methods=['GET'])
     @require_login
     def api_notifications():
-        """Return all notifications for the current user."""
+        """Return a page of notifications, newest first (unread first with ?unread_first=1)."""
         try:
-            notifications = (
-                Notification.query.filter_by(user_id=current_user.id)
-                .order_by(Notification.created_at.desc())
-                .all()
-            )
+            before_id = request.args.get('before_id', type=int)
+            limit = request.args.get('limit', NOTIFICATIONS_PAGE_SIZE, type=int)
+            limit = max(1, min(limit, NOTIFICATIONS_MAX_PAGE_SIZE))
+            unread_first = request.args.get('unread_first', 0, type=int) == 1
+
+            # Served by ix_notifications_user_updated_id, or by
+            # ix_notifications_user_read_updated_id when unread come first
+            query = Notification.query.filter_by(user_id=current_user.id)
+            if before_id:
+                cursor = Notification.query.filter_by(id=before_id, user_id=current_user.id).first()
+                if not cursor:
+                    return jsonify({'success': False, 'error': 'Invalid cursor'}), 400
+                older = or_(
+                    Notification.updated_at < cursor.updated_at,
+                    and_(Notification.updated_at == cursor.updated_at, Notification.id < cursor.id)
+                )
+                if unread_first:
+                    # Unread sorts before read: after an unread cursor come the
+                    # older unread ones, then every read one
+                    older = and_(Notification.read_status == bool(cursor.read_status), older)
+                    if not cursor.read_status:
+                        older = or_(Notification.read_status == True, older)  # noqa: E712
+                query = query.filter(older)
+            order = [Notification.updated_at.desc(), Notification.id.desc()]
+            if unread_first:
+                order.insert(0, Notification.read_status.asc())
+            page = query.order_by(*order).limit(limit + 1).all()
+            has_more = len(page) > limit
+            notifications = page[:limit]
+
+            # Resolve senders once per page
+            sender_ids = {n.from_user_id for n in notifications if n.from_user_id}
+            senders = {
+                row.id: row for row in db.session.query(
+                    User.id, User.first_name, User.last_name, User.username, User.profile_image_url
+                ).filter(User.id.in_(sender_ids)).all()
+            } if sender_ids else {}
 
             result = []
             for n in notifications:
-                from_user = n.from_user
+                from_user = senders.get(n.from_user_id)
                 result.append(
                     {
                         'id': n.id,
@@ -2715,24 +2514,29 @@ def register_socketio_events():
                         'message': n.message,
                         'type': n.type,
                         'created_at': n.created_at.isoformat(),
+                        'updated_at': n.updated_at.isoformat() if n.updated_at else None,
                         'read_status': n.read_status,
                         'follow_request_id': n.follow_request_id,
                         'post_id': n.post_id,
+                        'actor_count': n.actor_count,
                         'from_user': {
-                            'id': from_user.id if from_user else None,
-                            'first_name': getattr(from_user, 'first_name', None),
-                            'last_name': getattr(from_user, 'last_name', None),
-                            'username': getattr(from_user, 'username', None),
-                            'profile_image_url': getattr(
-                                from_user, 'profile_image_url', None
-                            ),
+                            'id': from_user.id,
+                            'first_name': from_user.first_name,
+                            'last_name': from_user.last_name,
+                            'username': from_user.username,
+                            'profile_image_url': from_user.profile_image_url,
                         }
                         if from_user
                         else None,
                     }
                 )
 
-            return jsonify({'success': True, 'notifications': result})
+            return jsonify({
+                'success': True,
+                'notifications': result,
+                'has_more': has_more,
+                'next_before_id': result[-1]['id'] if has_more else None
+            })
         except Exception as e:
             print(f"Error listing notifications: {e}")
             return jsonify({'success': False, 'error': 'Failed to load notifications'}), 500
@@ -2742,9 +2546,7 @@ def register_socketio_events():
     def api_notifications_unread_count():
         """Return unread notification count for badge updates."""
         try:
-            count = Notification.query.filter_by(
-                user_id=current_user.id, read_status=False
-            ).count()
+            count = unread_counters.get_counts(current_user.id)['notifications']
             return jsonify({'count': count})
         except Exception as e:
             print(f"Error getting unread notification count: {e}")
@@ -2758,6 +2560,8 @@ def register_socketio_events():
             Notification.query.filter_by(
                 user_id=current_user.id, read_status=False
             ).update({'read_status': True})
+            # Bulk UPDATE bypasses the flush hook; zero the counter explicitly
+            unread_counters.reset_notifications(current_user.id)
             db.session.commit()
             return jsonify({'success': True})
         except Exception as e:
@@ -2870,39 +2674,30 @@ def register_socketio_events():
             print(f"Error loading time-tracker contributions: {e}")
             return jsonify({'days': []}), 500
 
+    def grid_response(grid, user_id):
+        """One page of a profile grid as {'success', 'posts', 'next_cursor', 'has_more'}."""
+        limit = request.args.get('limit', profile_service.PROFILE_PAGE_SIZE, type=int)
+        posts, next_cursor = profile_service.grid_page(grid, user_id, request.args.get('cursor'), limit)
+        return jsonify({
+            'success': True,
+            'posts': post_serializer.serialize_posts(posts, current_user.id, pending=like_buffer),
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None,
+        })
+
     @app.route('/api/user/<user_id>/posts', methods=['GET'])
     @require_login
     def api_user_posts(user_id):
-        """Get posts by a specific user"""
+        """Get a page of posts by a specific user (?cursor=&limit=)"""
         try:
             # Verify the user exists
             target_user = User.query.get(user_id)
             if not target_user:
                 return jsonify({'success': False, 'error': 'User not found'}), 404
             
-            posts = Post.query.filter_by(user_id=user_id).order_by(Post.created_at.desc()).all()
-            
-            posts_data = []
-            for post in posts:
-                author = post.author
-                # Check if current user liked this post
-                liked = PostLike.query.filter_by(post_id=post.id, user_id=current_user.id).first() is not None
-                
-                posts_data.append({
-                    'id': post.id,
-                    'user_id': post.user_id,
-                    'author_name': author.full_name if author else 'Unknown',
-                    'author_image': author.profile_image_url if author else None,
-                    'code': post.code,
-                    'language': post.language,
-                    'description': post.description or '',
-                    'likes': post.likes or 0,
-                    'comments_count': len(post.comments or []),
-                    'created_at': post.created_at.isoformat(),
-                    'liked': liked
-                })
-            
-            return jsonify({'success': True, 'posts': posts_data})
+            return grid_response(profile_service.POSTS, user_id)
+        except profile_service.InvalidCursor:
+            return jsonify({'success': False, 'error': 'Invalid cursor'}), 400
         except Exception as e:
             print(f"Error getting user posts: {e}")
             return jsonify({'success': False, 'error': 'Failed to get posts'}), 500
@@ -2910,37 +2705,15 @@ def register_socketio_events():
     @app.route('/api/user/<user_id>/saved-posts', methods=['GET'])
     @require_login
     def api_user_saved_posts(user_id):
-        """Get saved posts by a specific user"""
+        """Get a page of saved posts by a specific user, most recently saved first"""
         try:
             # Verify the user exists and it's the current user
             if user_id != current_user.id:
                 return jsonify({'success': False, 'error': 'Access denied'}), 403
             
-            saved_posts = PostSave.query.filter_by(user_id=user_id).all()
-            
-            posts_data = []
-            for saved in saved_posts:
-                post = saved.post
-                if post:
-                    author = post.author
-                    # Check if current user liked this post
-                    liked = PostLike.query.filter_by(post_id=post.id, user_id=current_user.id).first() is not None
-                    
-                    posts_data.append({
-                        'id': post.id,
-                        'user_id': post.user_id,
-                        'author_name': author.full_name if author else 'Unknown',
-                        'author_image': author.profile_image_url if author else None,
-                        'code': post.code,
-                        'language': post.language,
-                        'description': post.description or '',
-                        'likes': post.likes or 0,
-                        'comments_count': len(post.comments or []),
-                        'created_at': post.created_at.isoformat(),
-                        'liked': liked
-                    })
-            
-            return jsonify({'success': True, 'posts': posts_data})
+            return grid_response(profile_service.SAVED, user_id)
+        except profile_service.InvalidCursor:
+            return jsonify({'success': False, 'error': 'Invalid cursor'}), 400
         except Exception as e:
             print(f"Error getting saved posts: {e}")
             return jsonify({'success': False, 'error': 'Failed to get saved posts'}), 500
@@ -2948,41 +2721,30 @@ def register_socketio_events():
     @app.route('/api/user/<user_id>/liked-posts', methods=['GET'])
     @require_login
     def api_user_liked_posts(user_id):
-        """Get liked posts by a specific user"""
+        """Get a page of liked posts by a specific user, most recently liked first"""
         try:
             # Verify the user exists and it's the current user
             if user_id != current_user.id:
                 return jsonify({'success': False, 'error': 'Access denied'}), 403
             
-            liked_posts = PostLike.query.filter_by(user_id=user_id).all()
-            
-            posts_data = []
-            for liked in liked_posts:
-                post = liked.post
-                if post:
-                    author = post.author
-                    # Check if current user liked this post (should be true, but just in case)
-                    liked_status = PostLike.query.filter_by(post_id=post.id, user_id=current_user.id).first() is not None
-                    
-                    posts_data.append({
-                        'id': post.id,
-                        'user_id': post.user_id,
-                        'author_name': author.full_name if author else 'Unknown',
-                        'author_image': author.profile_image_url if author else None,
-                        'code': post.code,
-                        'language': post.language,
-                        'description': post.description or '',
-                        'likes': post.likes or 0,
-                        'comments_count': len(post.comments or []),
-                        'created_at': post.created_at.isoformat(),
-                        'liked': liked_status
-                    })
-            
-            return jsonify({'success': True, 'posts': posts_data})
+            return grid_response(profile_service.LIKED, user_id)
+        except profile_service.InvalidCursor:
+            return jsonify({'success': False, 'error': 'Invalid cursor'}), 400
         except Exception as e:
             print(f"Error getting liked posts: {e}")
             return jsonify({'success': False, 'error': 'Failed to get liked posts'}), 500
 
+    @app.route('/api/user/<user_id>/stats', methods=['GET'])
+    @require_login
+    def api_user_profile_stats(user_id):
+        """Header counts (posts, followers, following) of a user's profile"""
+        counts = profile_service.profile_counts.get(user_id)
+        return jsonify({
+            'post_count': counts['posts'],
+            'follower_count': counts['followers'],
+            'following_count': counts['following'],
+        })
+
     @app.route('/api/user/<user_id>/followers', methods=['GET'])
     @require_login
     def api_user_followers(user_id):
@@ -3048,12 +2810,8 @@ def register_socketio_events():
     def api_user_stats():
         """Get current user stats including time tracking"""
         try:
-            # Post count
-            post_count = Post.query.filter_by(user_id=current_user.id).count()
-            
-            # Follower/Following counts
-            follower_count = Follower.query.filter_by(user_id=current_user.id).count()
-            following_count = Follower.query.filter_by(follower_id=current_user.id).count()
+            # Post and follower/following counts (cached)
+            counts = profile_service.profile_counts.get(current_user.id)
             
             # Time tracking stats
             today = date.today()
@@ -3102,9 +2860,9 @@ def register_socketio_events():
                 return f"{m}m"
 
             return jsonify({
-                'post_count': post_count,
-                'follower_count': follower_count,
-                'following_count': following_count,
+                'post_count': counts['posts'],
+                'follower_count': counts['followers'],
+                'following_count': counts['following'],
                 'today_minutes': today_minutes,
                 'today_time_display': format_minutes(today_minutes),
                 'last_7_days': last_7_days,
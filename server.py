@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Production server entry point
+Serves the app on an event loop (gevent or eventlet) so every websocket
+and long-poll connection costs a greenlet instead of an OS thread. The
+standard library is monkey-patched before app is imported; see
+cooperative.py for what that covers and what is offloaded to threads.
+
+Usage: python server.py [--mode gevent|eventlet|threading] [--host 0.0.0.0] [--port 5000]
+       gunicorn -k geventwebsocket.gunicorn.workers.GeventWebSocketWorker -w 1 server:app
+       (set SOCKETIO_ASYNC_MODE=gevent; more than one worker needs SOCKETIO_MESSAGE_QUEUE)
+
+gevent mode needs `pip install gevent gevent-websocket`; eventlet mode
+needs `pip install eventlet`.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import cooperative
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Run SmartFixer on an event-loop server')
+    parser.add_argument('--mode', choices=('gevent', 'eventlet', 'threading'),
+                        default=os.environ.get('SOCKETIO_ASYNC_MODE') or cooperative.default_mode())
+    parser.add_argument('--host', default=os.environ.get('HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 5000)))
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    mode = args.mode
+else:
+    # Imported by gunicorn: the worker class has already patched
+    mode = os.environ.get('SOCKETIO_ASYNC_MODE') or cooperative.default_mode()
+
+try:
+    cooperative.monkey_patch(mode)
+except ImportError:
+    print(f"{mode} is not installed (pip install {mode}); falling back to threading mode")
+    mode = 'threading'
+    cooperative.monkey_patch(mode)
+
+from app import app, socketio  # noqa: E402  (must follow monkey patching)
+
+
+if __name__ == '__main__':
+    print(f"SmartFixer serving on http://{args.host}:{args.port} ({mode} mode, pid {os.getpid()})")
+    if mode == 'threading':
+        print("Warning: threading mode holds one OS thread per connection; install gevent for production")
+        socketio.run(app, host=args.host, port=args.port, log_output=False, allow_unsafe_werkzeug=True)
+    else:
+        socketio.run(app, host=args.host, port=args.port, log_output=False)
@@ -326,7 +326,7 @@ document.addEventListener('DOMContentLoaded', function () {
 
     // Listen for new notifications
     socket.on('new_notification', function (data) {
-        if (data.user_id === '{{ user.id }}') {
+        if (!data.user_id || data.user_id === '{{ user.id }}') {
             // Update notification badge
             updateNotificationBadge();
 
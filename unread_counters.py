@@ -0,0 +1,321 @@
+"""
+Unread Counters - Materialized per-user unread message/notification counts
+Counts live in the user_counters table and are adjusted inside the same
+flush (and therefore transaction) that inserts, reads or deletes a Message
+or Notification, so badge lookups are a primary-key read instead of a
+COUNT over the inbox. A periodic reconciliation job repairs any drift,
+e.g. from bulk UPDATEs that bypass the ORM.
+"""
+
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict
+
+from sqlalchemy import case, event, func, inspect, literal
+from sqlalchemy.exc import IntegrityError
+
+from database import db
+from models import Message, Notification, UserCounter
+
+# Seconds between reconciliation passes (0 disables the background job)
+UNREAD_RECONCILE_INTERVAL = int(os.environ.get('UNREAD_RECONCILE_INTERVAL', 3600))
+# Users recounted per reconciliation query
+UNREAD_RECONCILE_BATCH = 500
+
+_reconciler_started = False
+_reconciler_lock = threading.Lock()
+
+
+def _flag_changed(obj, attr):
+    """Return +1 if attr went read->unread, -1 if unread->read, else 0."""
+    history = inspect(obj).attrs[attr].history
+    if not history.has_changes():
+        return 0
+    was_read = bool(history.deleted[0]) if history.deleted else False
+    is_read = bool(history.added[0]) if history.added else False
+    if was_read == is_read:
+        return 0
+    return -1 if is_read else 1
+
+
+def _collect_deltas(session):
+    """Per-user counter deltas implied by the objects in this flush."""
+    deltas = defaultdict(lambda: {'unread_messages': 0, 'unread_notifications': 0})
+
+    for obj in session.new:
+        if isinstance(obj, Message) and obj.receiver_id and not obj.is_read:
+            deltas[str(obj.receiver_id)]['unread_messages'] += 1
+        elif isinstance(obj, Notification) and not obj.read_status:
+            deltas[str(obj.user_id)]['unread_notifications'] += 1
+
+    for obj in session.dirty:
+        if isinstance(obj, Message) and obj.receiver_id:
+            deltas[str(obj.receiver_id)]['unread_messages'] += _flag_changed(obj, 'is_read')
+        elif isinstance(obj, Notification):
+            deltas[str(obj.user_id)]['unread_notifications'] += _flag_changed(obj, 'read_status')
+
+    for obj in session.deleted:
+        if isinstance(obj, Message) and obj.receiver_id and not obj.is_read:
+            deltas[str(obj.receiver_id)]['unread_messages'] -= 1
+        elif isinstance(obj, Notification) and not obj.read_status:
+            deltas[str(obj.user_id)]['unread_notifications'] -= 1
+
+    return {
+        user_id: d for user_id, d in deltas.items()
+        if d['unread_messages'] or d['unread_notifications']
+    }
+
+
+def _count_unread(connection, user_id: str) -> Dict[str, int]:
+    messages = connection.execute(
+        db.select([func.count()]).select_from(Message.__table__).where(
+            (Message.__table__.c.receiver_id == user_id) & (Message.__table__.c.is_read == False)  # noqa: E712
+        )
+    ).scalar()
+    notifications = connection.execute(
+        db.select([func.count()]).select_from(Notification.__table__).where(
+            (Notification.__table__.c.user_id == user_id) & (Notification.__table__.c.read_status == False)  # noqa: E712
+        )
+    ).scalar()
+    return {'unread_messages': messages or 0, 'unread_notifications': notifications or 0}
+
+
+def _apply_delta(connection, user_id: str, delta: Dict[str, int]):
+    table = UserCounter.__table__
+    values = {'updated_at': datetime.now()}
+    for column, amount in delta.items():
+        if amount:
+            col = table.c[column]
+            # Never let a counter go negative
+            values[column] = case([(col + amount < 0, 0)], else_=col + amount)
+
+    result = connection.execute(table.update().where(table.c.user_id == user_id).values(**values))
+    if result.rowcount:
+        return
+
+    # No row yet: seed it from a real count, which already includes this flush
+    counts = _count_unread(connection, user_id)
+    try:
+        with connection.begin_nested():
+            connection.execute(table.insert().values(user_id=user_id, updated_at=datetime.now(), **counts))
+    except IntegrityError:
+        # Another transaction created the row first; apply our delta to it
+        connection.execute(table.update().where(table.c.user_id == user_id).values(**values))
+
+
+def _noop_set(target, value, oldvalue, initiator):
+    return value
+
+
+def _after_flush(session, flush_context):
+    deltas = _collect_deltas(session)
+    if not deltas:
+        return
+    connection = session.connection()
+    for user_id, delta in deltas.items():
+        _apply_delta(connection, user_id, delta)
+
+
+def get_counts(user_id: str) -> Dict[str, int]:
+    """
+    Unread message and notification counts for a user.
+
+    Reads the counter row; a user without one (created before counters
+    existed) gets it seeded from a full count.
+    """
+    row = UserCounter.query.get(str(user_id))
+    if row is not None:
+        return {'messages': row.unread_messages, 'notifications': row.unread_notifications}
+
+    counts = _count_unread(db.session.connection(), str(user_id))
+    try:
+        db.session.add(UserCounter(user_id=str(user_id), **counts))
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+    return {'messages': counts['unread_messages'], 'notifications': counts['unread_notifications']}
+
+
+def adjust(user_id: str, unread_messages: int = 0, unread_notifications: int = 0):
+    """
+    Apply a counter delta in the current transaction, for bulk Core UPDATEs
+    that the flush hook can't see. Caller commits.
+    """
+    delta = {'unread_messages': unread_messages, 'unread_notifications': unread_notifications}
+    if unread_messages or unread_notifications:
+        _apply_delta(db.session.connection(), str(user_id), delta)
+
+
+def _seed_counters(connection, user_ids):
+    """
+    Create counter rows for user_ids from full counts, with one INSERT ...
+    SELECT. The counts see the current transaction's own writes.
+    """
+    from models import User
+
+    users = User.__table__
+    messages = Message.__table__
+    notifications = Notification.__table__
+    table = UserCounter.__table__
+    unread_messages = db.select([func.count()]).where(
+        (messages.c.receiver_id == users.c.id) & (messages.c.is_read == False)  # noqa: E712
+    ).as_scalar()
+    unread_notifications = db.select([func.count()]).where(
+        (notifications.c.user_id == users.c.id) & (notifications.c.read_status == False)  # noqa: E712
+    ).as_scalar()
+    connection.execute(table.insert().from_select(
+        ['user_id', 'unread_messages', 'unread_notifications', 'updated_at'],
+        db.select([users.c.id, unread_messages, unread_notifications, literal(datetime.now())])
+        .where(users.c.id.in_(user_ids))
+    ))
+
+
+def bump_notifications(user_ids, amount: int = 1):
+    """
+    Add amount to the notification counter of every user in user_ids, for
+    bulk Core INSERTs the flush hook can't see. Existing rows are updated
+    with one statement; missing ones are seeded from counts (which already
+    include the new notifications) with another. Caller commits.
+    """
+    user_ids = {str(user_id) for user_id in user_ids}
+    if not user_ids or not amount:
+        return
+    table = UserCounter.__table__
+    connection = db.session.connection()
+    existing = {
+        row[0] for row in connection.execute(
+            db.select([table.c.user_id]).where(table.c.user_id.in_(user_ids))
+        )
+    }
+    if existing:
+        connection.execute(
+            table.update().where(table.c.user_id.in_(existing)).values(
+                unread_notifications=table.c.unread_notifications + amount, updated_at=datetime.now()
+            )
+        )
+    missing = user_ids - existing
+    if not missing:
+        return
+    try:
+        with connection.begin_nested():
+            _seed_counters(connection, missing)
+    except IntegrityError:
+        # Some rows were created concurrently; settle each user on its own
+        for user_id in missing:
+            _apply_delta(connection, user_id, {'unread_notifications': amount})
+
+
+def reset_notifications(user_id: str):
+    """Zero the notification counter (for bulk 'mark all read' UPDATEs). Caller commits."""
+    table = UserCounter.__table__
+    db.session.execute(
+        table.update().where(table.c.user_id == str(user_id)).values(unread_notifications=0, updated_at=datetime.now())
+    )
+
+
+def reconcile(batch_size: int = UNREAD_RECONCILE_BATCH) -> Dict[str, int]:
+    """
+    Recount unread messages/notifications for every user and fix counters
+    that drifted. Works through users in id order, one batch per
+    transaction, so it is safe to run against live traffic: a batch's
+    counter rows are locked (SELECT ... FOR UPDATE) before its messages
+    and notifications are counted, so a concurrent send or read either
+    commits before the count (and is included in it) or waits for the
+    batch to commit and applies its delta on top of the fixed value.
+
+    Returns:
+        Dict with 'users' checked and 'fixed' counters.
+    """
+    from models import User
+
+    messages_t = Message.__table__
+    notifications_t = Notification.__table__
+    counters_t = UserCounter.__table__
+    checked = fixed = 0
+    last_id = ''
+
+    while True:
+        user_ids = [
+            row[0] for row in db.session.query(User.id).filter(User.id > last_id)
+            .order_by(User.id).limit(batch_size).all()
+        ]
+        if not user_ids:
+            break
+        last_id = user_ids[-1]
+
+        current = {
+            row.user_id: row for row in db.session.execute(
+                counters_t.select().where(counters_t.c.user_id.in_(user_ids)).with_for_update()
+            ).fetchall()
+        }
+        message_counts = dict(db.session.execute(
+            db.select([messages_t.c.receiver_id, func.count()])
+            .where(messages_t.c.receiver_id.in_(user_ids) & (messages_t.c.is_read == False))  # noqa: E712
+            .group_by(messages_t.c.receiver_id)
+        ).fetchall())
+        notification_counts = dict(db.session.execute(
+            db.select([notifications_t.c.user_id, func.count()])
+            .where(notifications_t.c.user_id.in_(user_ids) & (notifications_t.c.read_status == False))  # noqa: E712
+            .group_by(notifications_t.c.user_id)
+        ).fetchall())
+
+        for user_id in user_ids:
+            expected = {
+                'unread_messages': message_counts.get(user_id, 0),
+                'unread_notifications': notification_counts.get(user_id, 0),
+            }
+            row = current.get(user_id)
+            if row is None:
+                try:
+                    with db.session.begin_nested():
+                        db.session.execute(
+                            counters_t.insert().values(user_id=user_id, updated_at=datetime.now(), **expected)
+                        )
+                    fixed += 1
+                except IntegrityError:
+                    # Seeded concurrently from a full count; nothing to fix
+                    pass
+            elif (row.unread_messages, row.unread_notifications) != tuple(expected.values()):
+                db.session.execute(
+                    counters_t.update().where(counters_t.c.user_id == user_id)
+                    .values(updated_at=datetime.now(), **expected)
+                )
+                fixed += 1
+        db.session.commit()
+        checked += len(user_ids)
+
+    return {'users': checked, 'fixed': fixed}
+
+
+def _reconcile_loop(app, interval):
+    while True:
+        time.sleep(interval)
+        with app.app_context():
+            try:
+                result = reconcile()
+                if result['fixed']:
+                    print(f"[Unread counters] Reconciled {result['fixed']} of {result['users']} users")
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error reconciling unread counters: {e}")
+            finally:
+                db.session.remove()
+
+
+def init_app(app, interval: int = UNREAD_RECONCILE_INTERVAL):
+    """Hook counter maintenance into the session and start the reconciler."""
+    global _reconciler_started
+    if not event.contains(db.session, 'after_flush', _after_flush):
+        event.listen(db.session, 'after_flush', _after_flush)
+        # Load the previous read flag even when an expired object is modified,
+        # so the flush can tell whether it actually changed
+        for attribute in (Message.is_read, Notification.read_status):
+            event.listen(attribute, 'set', _noop_set, active_history=True)
+
+    with _reconciler_lock:
+        if interval > 0 and not _reconciler_started:
+            _reconciler_started = True
+            threading.Thread(target=_reconcile_loop, args=(app, interval), daemon=True).start()
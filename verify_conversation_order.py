@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Regression check: reading a conversation must not reorder the chat list.
+
+A viewer receives one message from each of three partners, oldest first.
+Opening the middle chat marks its messages read; the conversation list
+(ordered and keyset-paginated on updated_at) must keep the same order,
+page by page, with only that conversation's unread count cleared.
+
+By default it runs against a throwaway SQLite database; set DATABASE_URL to
+check a real server's database (users and messages are added, nothing is
+dropped).
+
+Usage: python verify_conversation_order.py
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+if 'DATABASE_URL' not in os.environ:
+    _db_fd, _db_path = tempfile.mkstemp(suffix='.db', prefix='verify_conversations_')
+    os.close(_db_fd)
+    os.environ['DATABASE_URL'] = f'sqlite:///{_db_path}'
+for _name in ('UNREAD_RECONCILE_INTERVAL', 'POST_COUNTER_RECONCILE_INTERVAL', 'RETENTION_INTERVAL'):
+    os.environ.setdefault(_name, '0')
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import app as app_module
+
+import chat_service
+from database import db
+from models import User
+
+app = app_module.app
+failures = []
+
+
+def setup():
+    """A viewer and three partners, each of whom has sent the viewer one message (oldest first)."""
+    run_id = uuid.uuid4().hex[:8]
+    with app.app_context():
+        db.create_all()
+        viewer = User(username=f'viewer_{run_id}', email=f'viewer_{run_id}@example.com', first_name='Viewer')
+        partners = [
+            User(username=f'partner_{run_id}_{i}', email=f'partner_{run_id}_{i}@example.com', first_name=f'Partner{i}')
+            for i in range(3)
+        ]
+        db.session.add_all([viewer] + partners)
+        db.session.commit()
+        viewer_id, partner_ids = viewer.id, [p.id for p in partners]
+        for partner in partners:
+            chat_service.send_message(partner, viewer_id, content=f'hi from {partner.first_name}')
+            time.sleep(0.01)
+        db.session.remove()
+    return viewer_id, partner_ids
+
+
+def client_for(user_id):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = user_id
+        session['_fresh'] = True
+    return client
+
+
+def conversation_list(client, limit=None):
+    """[(other user id, unread count)] in list order, following the pagination cursor if limit is set."""
+    rows = []
+    url = '/api/chat/conversations' + (f'?limit={limit}' if limit else '')
+    while url:
+        body = client.get(url).get_json()
+        rows += [(c['other_user']['id'], c['unread_count']) for c in body['conversations']]
+        url = f"/api/chat/conversations?limit={limit}&before_id={body['next_before_id']}" if body['has_more'] else None
+    return rows
+
+
+def check(label, ok, detail):
+    print(f"[{'OK' if ok else 'FAIL'}] {label}: {detail}")
+    if not ok:
+        failures.append(label)
+
+
+def main():
+    viewer_id, partner_ids = setup()
+    client = client_for(viewer_id)
+
+    before = conversation_list(client)
+    expected = [(partner_id, 1) for partner_id in reversed(partner_ids)]
+    check('initial order', before == expected, f'{len(before)} conversations, newest first')
+
+    time.sleep(0.01)
+    response = client.get(f'/api/messages/{partner_ids[1]}')
+    check('open chat', response.status_code == 200, f'status {response.status_code}')
+
+    after = conversation_list(client)
+    expected_after = [(partner_id, 0 if partner_id == partner_ids[1] else 1) for partner_id in reversed(partner_ids)]
+    check('order after read', after == expected_after,
+          'unchanged, read chat cleared' if after == expected_after else f'{after}')
+
+    paged = conversation_list(client, limit=1)
+    check('paginated order after read', paged == expected_after, f'{len(paged)} conversations over {len(paged)} pages')
+
+    print(f"\n{'All conversation order checks passed' if not failures else 'FAILED: ' + ', '.join(failures)}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
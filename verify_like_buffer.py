@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Behaviour checks for the like write-behind buffer (like_buffer.py).
+
+Drives a LikeBuffer with a long window and explicit flushes:
+- toggles within a window collapse to their net effect (an even number of
+  toggles writes nothing)
+- post listings show unwritten likes in the counts and the viewer's state
+- a flush that fails puts its batch back and the next flush writes it
+- a toggle made while its key is being flushed starts from the in-flight
+  state and ends up written correctly
+- a batch in which every liker of a post unlikes it (emptying the owner's
+  like notification group) is written, pushed and emitted without error
+- a crash between a toggle and its flush loses the toggle but leaves
+  likes and the counter consistent; with window 0 (write-through, the
+  multi-worker default) nothing is lost
+
+By default it runs against a throwaway SQLite database; set DATABASE_URL to
+check a real server's database (users and posts are added, nothing is
+dropped).
+
+Usage: python verify_like_buffer.py
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import threading
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+if 'DATABASE_URL' not in os.environ:
+    _db_fd, _db_path = tempfile.mkstemp(suffix='.db', prefix='verify_like_buffer_')
+    os.close(_db_fd)
+    os.environ['DATABASE_URL'] = f'sqlite:///{_db_path}'
+for _name in ('UNREAD_RECONCILE_INTERVAL', 'POST_COUNTER_RECONCILE_INTERVAL', 'RETENTION_INTERVAL'):
+    os.environ.setdefault(_name, '0')
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import app as app_module
+
+import post_counters
+import post_serializer
+from database import db
+from like_buffer import LikeBuffer
+from models import Post, PostLike, User
+
+app = app_module.app
+failures = []
+
+
+class Sockets:
+    """Stands in for Flask-SocketIO; records emits."""
+
+    def __init__(self):
+        self.events = []
+
+    def emit(self, event, payload, room=None):
+        self.events.append((event, payload, room))
+
+
+def setup(user_count):
+    run_id = uuid.uuid4().hex[:8]
+    with app.app_context():
+        db.create_all()
+        author = User(username=f'buffer_author_{run_id}', email=f'buffer_author_{run_id}@example.com', first_name='Author')
+        users = [
+            User(username=f'buffer_{run_id}_{i}', email=f'buffer_{run_id}_{i}@example.com', first_name=f'User{i}')
+            for i in range(user_count)
+        ]
+        db.session.add_all([author] + users)
+        db.session.flush()
+        post = Post(user_id=author.id, code='print("buffered")', language='python')
+        db.session.add(post)
+        db.session.commit()
+        return post.id, [user.id for user in users]
+
+
+def new_post(author_id):
+    with app.app_context():
+        post = Post(user_id=author_id, code='print(1)', language='python')
+        db.session.add(post)
+        db.session.commit()
+        post_id = post.id
+        db.session.remove()
+    return post_id
+
+
+def toggle(buffer, user_id, post_id, times=1):
+    with app.app_context():
+        for _ in range(times):
+            result = buffer.toggle(user_id, post_id)
+        db.session.remove()
+    return result
+
+
+def stored(post_id):
+    """(likes column, like rows) of a post."""
+    with app.app_context():
+        likes = db.session.query(Post.likes).filter(Post.id == post_id).scalar() or 0
+        rows = PostLike.query.filter_by(post_id=post_id).count()
+        db.session.remove()
+    return likes, rows
+
+
+def check(label, ok, detail):
+    print(f"[{'OK' if ok else 'FAIL'}] {label}: {detail}")
+    if not ok:
+        failures.append(label)
+
+
+def main():
+    post_id, user_ids = setup(4)
+    buffer = LikeBuffer(app, Sockets(), window=3600)
+
+    # Toggle collapsing: like/unlike/like -> one like; like/unlike -> nothing
+    toggle(buffer, user_ids[0], post_id, times=3)
+    toggle(buffer, user_ids[1], post_id, times=2)
+    buffer.flush()
+    stats = buffer.stats()
+    check('toggles collapse', stored(post_id) == (1, 1) and stats['rows_written'] == 1 and stats['cancelled'] == 1,
+          f'stored {stored(post_id)}, {stats}')
+
+    # Pending likes show up in listings before they are written
+    toggle(buffer, user_ids[1], post_id)
+    toggle(buffer, user_ids[2], post_id)
+    with app.app_context():
+        viewer = post_serializer.serialize_posts([Post.query.get(post_id)], user_ids[2], pending=buffer)[0]
+        other = post_serializer.serialize_posts([Post.query.get(post_id)], user_ids[3], pending=buffer)[0]
+        db.session.remove()
+    check('pending likes in listings', (viewer['likes'], viewer['liked'], other['likes'], other['liked']) == (3, True, 3, False),
+          f"viewer {viewer['likes']}/{viewer['liked']}, other user {other['likes']}/{other['liked']}")
+    buffer.flush()
+    check('pending likes written', stored(post_id) == (3, 3), f'stored {stored(post_id)}')
+
+    # A failed flush keeps its batch; the next one writes it
+    write = buffer._write
+
+    def failing_write(desired):
+        raise RuntimeError('database unavailable')
+
+    buffer._write = failing_write
+    toggle(buffer, user_ids[3], post_id)
+    with contextlib.redirect_stdout(io.StringIO()):
+        buffer.flush()
+    buffer._write = write
+    failed = (stored(post_id), buffer.stats()['pending'], buffer.stats()['failed'])
+    buffer.flush()
+    check('requeue after failed flush', failed == ((3, 3), 1, 1) and stored(post_id) == (4, 4),
+          f'after failure {failed}, after retry {stored(post_id)}')
+
+    # Toggling a key while its flush is writing starts from the in-flight state
+    entered, release = threading.Event(), threading.Event()
+
+    def slow_write(desired):
+        entered.set()
+        release.wait(10)
+        return write(desired)
+
+    buffer._write = slow_write
+    toggle(buffer, user_ids[0], post_id)  # unlike, flushed below
+    flusher = threading.Thread(target=buffer.flush)
+    flusher.start()
+    entered.wait(10)
+    liked, _ = toggle(buffer, user_ids[0], post_id)  # like again while the unlike is being written
+    release.set()
+    flusher.join()
+    buffer._write = write
+    buffer.flush()
+    with app.app_context():
+        has_like = PostLike.query.filter_by(post_id=post_id, user_id=user_ids[0]).first() is not None
+        db.session.remove()
+    check('toggle during in-flight flush', liked and has_like and stored(post_id) == (4, 4),
+          f'liked {liked}, row {has_like}, stored {stored(post_id)}')
+
+    # Every liker unlikes in one batch: the owner's like group is deleted mid-batch
+    with app.app_context():
+        author_id = Post.query.get(post_id).user_id
+        db.session.remove()
+    group_post = new_post(author_id)
+    sockets = Sockets()
+    grouped = LikeBuffer(app, sockets, window=3600)
+    toggle(grouped, user_ids[0], group_post)
+    toggle(grouped, user_ids[1], group_post)
+    grouped.flush()
+    toggle(grouped, user_ids[0], group_post)
+    toggle(grouped, user_ids[1], group_post)
+    with contextlib.redirect_stdout(io.StringIO()):
+        grouped.flush()
+    emitted = [event for event, _, _ in sockets.events if event == 'post_liked']
+    check('unlikes emptying a notification group', grouped.stats()['failed'] == 0 and len(emitted) == 4
+          and stored(group_post) == (0, 0),
+          f"failed {grouped.stats()['failed']}, {len(emitted)} post_liked events, stored {stored(group_post)}")
+
+    # Crash between buffering and flushing: the toggle is lost, nothing is half-written
+    crash_post = new_post(author_id)
+    crashed = LikeBuffer(app, Sockets(), window=3600)
+    toggle(crashed, user_ids[0], crash_post)
+    toggle(crashed, user_ids[1], crash_post)
+    del crashed  # process died before the window closed
+    with app.app_context():
+        result = post_counters.reconcile()
+        db.session.remove()
+    check('crash before flush', stored(crash_post) == (0, 0) and result['fixed'] == 0,
+          f'stored {stored(crash_post)}, reconcile {result}')
+
+    write_through = LikeBuffer(app, Sockets(), window=0)
+    toggle(write_through, user_ids[0], crash_post)
+    toggle(write_through, user_ids[1], crash_post)
+    del write_through
+    check('crash with write-through', stored(crash_post) == (2, 2), f'stored {stored(crash_post)}')
+
+    print(f"\n{'All like buffer checks passed' if not failures else 'FAILED: ' + ', '.join(failures)}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
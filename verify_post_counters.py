@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Concurrency check for the post like/comment/save counters.
+
+Hammers one post from many threads (each a logged-in test client): every
+user likes it at once, then users toggle their like repeatedly, two
+threads of the same user race each other, and everyone comments and saves
+concurrently. The like buffer runs write-through (LIKE_BUFFER_WINDOW=0), so
+every toggle is its own flush racing the others; one phase then turns the
+window on and toggles while another thread flushes continuously. After each
+phase the denormalized counters on the post must equal the real row
+counts, and reconcile() must find nothing to fix; it is then shown to
+repair a counter corrupted behind the ORM's back.
+
+By default it runs against a throwaway SQLite database; set DATABASE_URL to
+check a real server's database (users and the post are added, nothing is
+dropped).
+
+Usage: python verify_post_counters.py [users] [toggles]
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import threading
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+if 'DATABASE_URL' not in os.environ:
+    _db_fd, _db_path = tempfile.mkstemp(suffix='.db', prefix='verify_counters_')
+    os.close(_db_fd)
+    os.environ['DATABASE_URL'] = f'sqlite:///{_db_path}'
+for _name in ('UNREAD_RECONCILE_INTERVAL', 'POST_COUNTER_RECONCILE_INTERVAL', 'RETENTION_INTERVAL',
+              'LIKE_BUFFER_WINDOW'):
+    os.environ.setdefault(_name, '0')
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import app as app_module
+
+import post_counters
+import routes
+from database import db
+from models import Comment, Post, PostLike, PostSave, User
+
+app = app_module.app
+failures = []
+
+
+def setup(user_count):
+    run_id = uuid.uuid4().hex[:8]
+    with app.app_context():
+        db.create_all()
+        author = User(username=f'counter_author_{run_id}', email=f'author_{run_id}@example.com', first_name='Author')
+        users = [
+            User(username=f'counter_{run_id}_{i}', email=f'counter_{run_id}_{i}@example.com', first_name=f'User{i}')
+            for i in range(user_count)
+        ]
+        db.session.add_all([author] + users)
+        db.session.flush()
+        post = Post(user_id=author.id, code='print("hot post")', language='python')
+        db.session.add(post)
+        db.session.commit()
+        return post.id, [user.id for user in users]
+
+
+def client_for(user_id):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = user_id
+        session['_fresh'] = True
+    return client
+
+
+def hammer(jobs):
+    """Run every job (a callable) on its own thread, released together."""
+    barrier = threading.Barrier(len(jobs))
+    errors = []
+
+    def run(job):
+        barrier.wait()
+        try:
+            job()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(job,)) for job in jobs]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
+
+def check(label, post_id):
+    with app.app_context():
+        post = Post.query.get(post_id)
+        actual = {
+            'likes': PostLike.query.filter_by(post_id=post_id).count(),
+            'comments_count': Comment.query.filter_by(post_id=post_id).count(),
+            'saves_count': PostSave.query.filter_by(post_id=post_id).count(),
+        }
+        stored = {column: getattr(post, column) for column in actual}
+        db.session.remove()
+    ok = stored == actual
+    print(f"[{'OK' if ok else 'FAIL'}] {label}: stored {stored}, actual {actual}")
+    if not ok:
+        failures.append(label)
+    return actual
+
+
+def main():
+    user_count = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    toggles = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    post_id, user_ids = setup(user_count)
+    clients = [client_for(user_id) for user_id in user_ids]
+    like_url = f'/api/post/{post_id}/like'
+
+    errors = hammer([lambda c=c: c.post(like_url) for c in clients])
+    actual = check(f'{user_count} concurrent likes', post_id)
+    if actual['likes'] != user_count:
+        failures.append('likes lost')
+        print(f"[FAIL] expected {user_count} likes ({len(errors)} request errors)")
+
+    hammer([lambda c=c: [c.post(like_url) for _ in range(toggles)] for c in clients])
+    check(f'{user_count} users x {toggles} like toggles', post_id)
+
+    # Two threads per user: a like and an unlike racing on the same row
+    hammer([lambda c=c: c.post(like_url) for c in clients for _ in range(2)])
+    check('same-user races', post_id)
+
+    # Buffered toggles while another thread keeps flushing
+    buffer = routes.like_buffer
+    buffer.window = 0.05
+    done = threading.Event()
+
+    def flush_loop():
+        while not done.is_set():
+            buffer.flush()
+
+    flusher = threading.Thread(target=flush_loop)
+    flusher.start()
+    errors = hammer([lambda c=c: [c.post(like_url) for _ in range(toggles)] for c in clients])
+    done.set()
+    flusher.join()
+    buffer.flush()
+    buffer.window = 0
+    stats = buffer.stats()
+    ok = not stats['pending'] and not stats['failed'] and not errors
+    print(f"[{'OK' if ok else 'FAIL'}] buffered toggles under flush contention: "
+          f"{stats['flushes']} flushes, {stats['failed']} failed, {len(errors)} request errors")
+    if not ok:
+        failures.append('buffered toggles')
+    check('buffered toggles', post_id)
+
+    hammer(
+        [lambda c=c: c.post(f'/api/post/{post_id}/comment', json={'content': 'nice'}) for c in clients]
+        + [lambda c=c: c.post(f'/api/posts/{post_id}/save') for c in clients]
+    )
+    check('concurrent comments and saves', post_id)
+
+    with app.app_context():
+        result = post_counters.reconcile()
+        print(f"[{'OK' if result['fixed'] == 0 else 'FAIL'}] reconcile after load: {result}")
+        if result['fixed']:
+            failures.append('reconcile found drift')
+
+        posts = Post.__table__
+        db.session.execute(posts.update().where(posts.c.id == post_id).values(likes=posts.c.likes + 7))
+        db.session.commit()
+        result = post_counters.reconcile()
+        db.session.remove()
+    print(f"[{'OK' if result['fixed'] == 1 else 'FAIL'}] reconcile repairs a corrupted counter: {result}")
+    if result['fixed'] != 1:
+        failures.append('reconcile did not repair')
+    check('after repair', post_id)
+
+    print(f"\n{'All counter checks passed' if not failures else 'FAILED: ' + ', '.join(failures)}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Query-count regression check for the post listing endpoints.
+
+Builds two viewers: one whose posts, likes, saves and follows cover a
+handful of posts, one with many times more. Every post listing endpoint
+must issue the same number of SQL statements for both, i.e. the cost of a
+listing does not grow with the number of posts (no N+1 lookups of authors,
+likes, saves or comment counts).
+
+By default it runs against a throwaway SQLite database; set DATABASE_URL to
+check a real server's database (users and posts are added, nothing is
+dropped).
+
+Usage: python verify_post_queries.py [small] [large]
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+if 'DATABASE_URL' not in os.environ:
+    _db_fd, _db_path = tempfile.mkstemp(suffix='.db', prefix='verify_queries_')
+    os.close(_db_fd)
+    os.environ['DATABASE_URL'] = f'sqlite:///{_db_path}'
+for _name in ('UNREAD_RECONCILE_INTERVAL', 'POST_COUNTER_RECONCILE_INTERVAL', 'RETENTION_INTERVAL'):
+    os.environ.setdefault(_name, '0')
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import app as app_module
+
+from sqlalchemy import event
+
+from database import db
+from models import Comment, Follower, Post, PostLike, PostSave, User
+
+app = app_module.app
+failures = []
+statements = []
+
+
+def setup(post_count):
+    """A viewer with post_count own posts plus post_count posts by distinct followed authors,
+    all of them liked, saved and commented on by the viewer."""
+    run_id = uuid.uuid4().hex[:8]
+    with app.app_context():
+        db.create_all()
+        viewer = User(username=f'viewer_{run_id}', email=f'viewer_{run_id}@example.com', first_name='Viewer')
+        authors = [
+            User(username=f'author_{run_id}_{i}', email=f'author_{run_id}_{i}@example.com', first_name=f'Author{i}')
+            for i in range(post_count)
+        ]
+        db.session.add_all([viewer] + authors)
+        db.session.flush()
+        posts = [Post(user_id=viewer.id, code=f'print({i})', language='python') for i in range(post_count)]
+        posts += [Post(user_id=author.id, code='print("hi")', language='python') for author in authors]
+        db.session.add_all(posts)
+        db.session.flush()
+        for author in authors:
+            db.session.add(Follower(user_id=author.id, follower_id=viewer.id))
+        for post in posts:
+            db.session.add(PostLike(post_id=post.id, user_id=viewer.id))
+            db.session.add(PostSave(post_id=post.id, user_id=viewer.id))
+            db.session.add(Comment(post_id=post.id, user_id=viewer.id, content='nice'))
+        db.session.commit()
+        viewer_id = viewer.id
+        db.session.remove()
+    return viewer_id
+
+
+def client_for(user_id):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = user_id
+        session['_fresh'] = True
+    return client
+
+
+def count_queries(client, url):
+    """(statements executed, JSON body) for one GET."""
+    del statements[:]
+    response = client.get(url)
+    if response.status_code != 200:
+        raise RuntimeError(f'{url} returned {response.status_code}')
+    return len(statements), response.get_json()
+
+
+def listed(body):
+    """The viewer's own/followed posts in a response (suggested posts belong to other runs)."""
+    if isinstance(body, list):
+        return body
+    return body['posts'] if 'posts' in body else body['following_posts']
+
+
+def main():
+    small = int(sys.argv[1]) if len(sys.argv) > 1 else 2
+    large = int(sys.argv[2]) if len(sys.argv) > 2 else 25
+    viewers = {size: setup(size) for size in (small, large)}
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+
+    endpoints = (
+        ('own posts', lambda user_id: '/api/posts'),
+        ('user posts', lambda user_id: f'/api/user/{user_id}/posts'),
+        ('saved posts', lambda user_id: f'/api/user/{user_id}/saved-posts'),
+        ('liked posts', lambda user_id: f'/api/user/{user_id}/liked-posts'),
+        ('explore', lambda user_id: '/api/explore-posts?limit=50'),
+    )
+    for label, url_for in endpoints:
+        counts = {}
+        for size, user_id in viewers.items():
+            queries, body = count_queries(client_for(user_id), url_for(user_id))
+            posts = listed(body)
+            if not posts or not all(post['liked'] and post['saved'] and post['comments_count'] == 1 for post in posts):
+                failures.append(f'{label} payload')
+                print(f'[FAIL] {label}: unexpected payload for {size} posts')
+            counts[size] = (queries, len(posts))
+        ok = counts[small][0] == counts[large][0]
+        print(f"[{'OK' if ok else 'FAIL'}] {label}: "
+              + ', '.join(f'{n} posts -> {q} queries' for q, n in counts.values()))
+        if not ok:
+            failures.append(label)
+
+    print(f"\n{'All query-count checks passed' if not failures else 'FAILED: ' + ', '.join(failures)}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())